@@ -0,0 +1,186 @@
+# benchmarks/bench_async_alpaca.py
+# Precarga de historial contra un servidor HTTP local que imita a Alpaca
+# (FakeAlpacaServer sobre el SyntheticMarket en otro proceso, con la cuota
+# por minuto de la API real: lo que se pase recibe 429). Compara:
+#   sync_sequential  AlpacaRealClient, una llamada bloqueante tras otra por
+#                    cada (par, timeframe), como el camino actual
+#   async_warm       AsyncAlpacaClient.warm: peticiones de varios símbolos en
+#                    paralelo sobre una sesión con pool, al ritmo del limitador
+#   live_during_backfill  latencia de precios pedidos con prioridad LIVE y
+#                    BACKFILL mientras una precarga agota una cuota menor
+# y comprueba que las cachés de ambos caminos son idénticas y que no hubo 429.
+# Uso: python benchmarks/bench_async_alpaca.py --pairs 28 --days 30
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.alpaca_client import AlpacaRealClient, to_symbol
+from modules.async_alpaca import BACKFILL, AlpacaHTTP, AlpacaREST, AsyncAlpacaClient
+from modules.bar_cache import BarCache
+from modules.config import TIMEFRAMES
+from modules.fake_alpaca import FakeAlpacaServer, FakeREST, SyntheticMarket, synthetic_pairs
+
+
+def _serve(conn, pairs, minutes, seed, rpm, period, latency, error_rate):
+    market = SyntheticMarket(pairs, minutes=minutes, seed=seed)
+    for pair in pairs:
+        market.series(pair)
+    server = FakeAlpacaServer(FakeREST(market=market), rpm=rpm, latency=latency, error_rate=error_rate,
+                              seed=seed, period=period)
+    server.prime([to_symbol(pair) for pair in pairs], ["1Min"])
+    server.start()
+    conn.send(server.url)
+    conn.recv()
+    conn.send(server.stats())
+    server.stop()
+
+
+class Server:
+    """FakeAlpacaServer en otro proceso (su CPU no compite con el cliente
+    medido) y con su propia ventana de cuota"""
+    def __init__(self, pairs, minutes, args, rpm=None, period=60.0):
+        self.config = (pairs, minutes, args.seed, rpm or args.rpm, period, args.latency, args.error_rate)
+        self.stats = None
+
+    def __enter__(self):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child, *self.config), daemon=True)
+        self._process.start()
+        self.url = self._conn.recv()
+        return self
+
+    def __exit__(self, *exc):
+        self._conn.send("stop")
+        self.stats = self._conn.recv()
+        self._process.join(10)
+        return False
+
+
+def transport(server, args, rpm=None, period=60.0):
+    return AlpacaHTTP(trading_url=server.url, data_url=server.url, rpm=rpm or args.rpm, period=period,
+                      seed=args.seed)
+
+
+def sync_sequential(server, clock, pairs, args):
+    http = transport(server, args)
+    client = AlpacaRealClient(api=AlpacaREST(http), cache=BarCache(tempfile.mkdtemp(prefix="bench-sync-")),
+                              clock=clock)
+    start = time.perf_counter()
+    for pair in pairs:
+        for tf in TIMEFRAMES:
+            client.get_historical_data(pair, tf, days=args.days)
+    seconds = time.perf_counter() - start
+    client.close()
+    return client.cache, {"seconds": seconds, **http.stats()}
+
+
+def async_warm(server, clock, pairs, args):
+    http = transport(server, args)
+    client = AsyncAlpacaClient(http=http, cache=BarCache(tempfile.mkdtemp(prefix="bench-async-")),
+                               clock=clock)
+    summary = http.run(client.warm(pairs, TIMEFRAMES, days=args.days))
+    http.close()
+    return client.cache, {**summary, **http.stats()}
+
+
+def live_during_backfill(server, clock, pairs, args):
+    """Latencia de precios LIVE y BACKFILL pedidos cada `poll` segundos
+    mientras una precarga agota una cuota menor (contention_rpm peticiones
+    por ventana de contention_window segundos, para no esperar minutos)"""
+    http = transport(server, args, rpm=args.contention_rpm, period=args.contention_window)
+    client = AsyncAlpacaClient(http=http, cache=BarCache(tempfile.mkdtemp(prefix="bench-live-")),
+                               clock=clock)
+    warm = http.submit(client.warm(pairs, TIMEFRAMES, days=args.days))
+    symbols = [to_symbol(pair) for pair in pairs]
+    latency = {"live": [], "backfill": []}
+
+    def poll(name, api):
+        while not warm.done():
+            start = time.perf_counter()
+            api.get_latest_bars(symbols)
+            latency[name].append(time.perf_counter() - start)
+            time.sleep(args.poll)
+
+    threads = [threading.Thread(target=poll, args=("live", AlpacaREST(http))),
+               threading.Thread(target=poll, args=("backfill", AlpacaREST(http, priority=BACKFILL)))]
+    for thread in threads:
+        thread.start()
+    summary = warm.result()
+    for thread in threads:
+        thread.join()
+    http.close()
+    return {
+        "rpm": args.contention_rpm,
+        "window": args.contention_window,
+        "warm_seconds": summary["seconds"],
+        "requests": summary["requests"],
+        **{f"{name}_quote_seconds": {"p50": float(np.median(samples)), "max": float(np.max(samples)),
+                                     "count": len(samples)}
+           for name, samples in latency.items() if samples},
+        "limiter": http.limiter.stats()
+    }
+
+
+def same_caches(a, b, pairs):
+    return all(np.array_equal(a.read(pair, tf), b.read(pair, tf)) for pair in pairs for tf in TIMEFRAMES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precarga de historial: síncrona frente a asíncrona")
+    parser.add_argument("--pairs", type=int, default=28)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--rpm", type=int, default=200, help="cuota por minuto del servidor y del cliente")
+    parser.add_argument("--latency", type=float, default=0.1,
+                        help="segundos de red y servidor por petición (simulados)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 503")
+    parser.add_argument("--contention-rpm", type=int, default=60,
+                        help="cuota con la que se mide la prioridad (la precarga la agota)")
+    parser.add_argument("--contention-window", type=float, default=6.0,
+                        help="segundos de la ventana de esa cuota")
+    parser.add_argument("--poll", type=float, default=0.2, help="segundos entre precios durante la precarga")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-sync", action="store_true", help="sin el camino síncrono (el lento)")
+    args = parser.parse_args()
+
+    pairs = synthetic_pairs(args.pairs)
+    minutes = int(args.days * 1440) + 1440
+    end_ms = SyntheticMarket(pairs, minutes=minutes, seed=args.seed).end_ms
+    clock = lambda: end_ms / 1000
+
+    report = {"benchmark": "async_alpaca",
+              "config": {"pairs": args.pairs, "timeframes": len(TIMEFRAMES), "days": args.days,
+                         "rpm": args.rpm, "latency": args.latency, "error_rate": args.error_rate}}
+    throttled = 0
+    with Server(pairs, minutes, args) as server:
+        async_cache, report["async_warm"] = async_warm(server, clock, pairs, args)
+    report["async_warm"]["server"] = server.stats
+    throttled += server.stats["throttled"]
+
+    with Server(pairs, minutes, args, rpm=args.contention_rpm, period=args.contention_window) as server:
+        report["live_during_backfill"] = live_during_backfill(server, clock, pairs, args)
+    throttled += server.stats["throttled"]
+
+    if not args.skip_sync:
+        with Server(pairs, minutes, args) as server:
+            sync_cache, report["sync_sequential"] = sync_sequential(server, clock, pairs, args)
+        report["sync_sequential"]["server"] = server.stats
+        throttled += server.stats["throttled"]
+        report["identical"] = same_caches(sync_cache, async_cache, pairs)
+        report["speedup"] = report["sync_sequential"]["seconds"] / report["async_warm"]["seconds"]
+    report["throttled"] = throttled
+    print(json.dumps(report, indent=2))
+    return 1 if throttled or not report.get("identical", True) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
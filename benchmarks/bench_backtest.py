@@ -0,0 +1,67 @@
+# benchmarks/bench_backtest.py
+# Coste de reproducir una serie de M1 con los agentes: el bucle vela a vela
+# con predict (medido sobre una muestra y extrapolado) frente a
+# modules.backtest.replay sobre la serie completa.
+# Uso: python benchmarks/bench_backtest.py --days 365
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.backtest import HISTORY_DAYS, replay, signal_stats, horizon_bars
+from modules.coordinator import MasterCoordinator
+from modules.system import AGENT_CLASSES, AGENT_WEIGHTS
+from modules.training import _data_client
+
+
+def per_bar(bars, sample):
+    """Segundos por vela del bucle con predict de cada agente y combine"""
+    coordinator = MasterCoordinator("EURUSD")
+    for agent_class in AGENT_CLASSES:
+        coordinator.add_agent(agent_class("EURUSD", "M1"), weight=AGENT_WEIGHTS[agent_class.__name__])
+    window = HISTORY_DAYS * 1440
+    # Velas seguidas, para que los indicadores se actualicen de forma incremental
+    index = range(window, min(window + sample, len(bars)))
+    coordinator.get_consensus_prediction(float(bars.c[window - 1]), bars[:window])
+    start = time.perf_counter()
+    for i in index:
+        coordinator.get_consensus_prediction(float(bars.c[i]), bars[i - window:i + 1])
+    return (time.perf_counter() - start) / len(index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del backtesting")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--sample", type=int, default=200, help="velas del bucle vela a vela")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        bars = _data_client(True, cache_dir).read_history("EURUSD", "M1", args.days)
+        seconds_per_bar = per_bar(bars, args.sample)
+
+        start = time.perf_counter()
+        directions, consensus = replay("EURUSD", "M1", bars, models={})
+        replay_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        h, l, c = bars.h, bars.l, bars.c
+        stats = {name: signal_stats(h, l, c, d, horizon_bars("M1")) for name, d in directions.items()}
+        simulate_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        "benchmark": "backtest",
+        "bars": len(bars),
+        "results": [
+            {"case": "vela_a_vela_estimado", "seconds": seconds_per_bar * len(bars)},
+            {"case": "replay_vectorizado", "seconds": replay_seconds},
+            {"case": "salidas_objetivo_stop", "seconds": simulate_seconds}
+        ],
+        "signals": {name: s["signals"] for name, s in stats.items()}
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
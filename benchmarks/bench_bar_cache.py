@@ -0,0 +1,84 @@
+# benchmarks/bench_bar_cache.py
+# Mide AlpacaRealClient.get_historical_data sin caché, con caché en frío, con
+# caché caliente (recarga incremental) y solo desde caché (refresh=False)
+# contra FakeREST, con una latencia fija por petición que simula la API.
+# Uso: python benchmarks/bench_bar_cache.py
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.alpaca_client import AlpacaRealClient
+from modules.bar_cache import BarCache
+from modules.config import FOREX_PAIRS, TIMEFRAMES
+from modules.fake_alpaca import FakeREST
+
+
+def sweep(client, pairs, timeframes, days, refresh):
+    start = time.perf_counter()
+    bars = 0
+    for pair in pairs:
+        for tf in timeframes:
+            bars += len(client.get_historical_data(pair, tf, days=days, refresh=refresh))
+    return time.perf_counter() - start, bars
+
+
+def measure(name, client, api, pairs, timeframes, days, refresh=True):
+    calls, served = api.calls["get_bars"], api.bars_served
+    seconds, bars = sweep(client, pairs, timeframes, days, refresh)
+    return {
+        "case": name,
+        "seconds": seconds,
+        "bars_returned": bars,
+        "api_calls": api.calls["get_bars"] - calls,
+        "bars_downloaded": api.bars_served - served
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la caché de velas")
+    parser.add_argument("--pairs", type=int, default=len(FOREX_PAIRS))
+    parser.add_argument("--timeframes", default=",".join(TIMEFRAMES))
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.02, help="segundos por petición simulada")
+    parser.add_argument("--no-resample", action="store_true",
+                        help="descarga cada timeframe en vez de derivarlo de M1")
+    args = parser.parse_args()
+
+    pairs = FOREX_PAIRS[:args.pairs]
+    timeframes = args.timeframes.split(",")
+    root = tempfile.mkdtemp(prefix="bar-cache-")
+    try:
+        api = FakeREST(latency=args.latency)
+        uncached = AlpacaRealClient(api=api, cache=False)
+        resample = not args.no_resample
+        cached = AlpacaRealClient(api=api, cache=BarCache(root), resample=resample)
+        rows = [
+            measure("sin_cache", uncached, api, pairs, timeframes, args.days),
+            measure("cache_frio", cached, api, pairs, timeframes, args.days),
+            measure("cache_caliente", cached, api, pairs, timeframes, args.days)
+        ]
+        restarted = AlpacaRealClient(api=api, cache=BarCache(root), resample=resample)
+        rows.append(measure("cache_tras_reinicio", restarted, api, pairs, timeframes, args.days))
+        rows.append(measure("solo_cache", restarted, api, pairs, timeframes, args.days, refresh=False))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(json.dumps({
+        "benchmark": "bar_cache",
+        "pairs": len(pairs),
+        "timeframes": timeframes,
+        "days": args.days,
+        "latency_s": args.latency,
+        "resample": not args.no_resample,
+        "results": rows
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/bench_batch_inference.py
+# Compara ForexMultiAgentSystem.predict_all (agente por agente) con
+# predict_all_batched sobre los 28 pares, con modelos compartidos por
+# (agente, timeframe). Uso: python benchmarks/bench_batch_inference.py
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.preprocessing import StandardScaler
+
+from modules.config import FOREX_PAIRS
+from modules.system import ForexMultiAgentSystem
+from modules.feature_store import compute_feature_frame, FEATURE_COLUMNS, VOLUME_COLUMNS
+
+
+def random_walk(seed, bars):
+    rng = np.random.default_rng(seed)
+    close = np.exp(np.cumsum(rng.normal(0, 0.002, bars)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.0005, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.0005, bars)))
+    volume = rng.integers(1, 1000, bars)
+    t0 = 1_700_000_000_000
+    return [
+        {"o": float(open_[i]), "h": float(high[i]), "l": float(low[i]), "c": float(close[i]),
+         "v": int(volume[i]), "t": t0 + i * 3_600_000}
+        for i in range(bars)
+    ]
+
+
+def training_matrix(histories):
+    X, y = [], []
+    for history in histories:
+        df = compute_feature_frame(history)
+        df['target'] = df['c'].shift(-1)
+        df = df.dropna()
+        X.append(df[FEATURE_COLUMNS + VOLUME_COLUMNS].values)
+        y.append(df['target'].values)
+    return np.vstack(X), np.concatenate(y)
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, float(np.median(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pairs", type=int, default=len(FOREX_PAIRS))
+    parser.add_argument("--timeframes", default="H1,H4")
+    parser.add_argument("--bars", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    pairs = FOREX_PAIRS[:args.pairs]
+    timeframes = args.timeframes.split(",")
+    histories = {pair: random_walk(i, args.bars) for i, pair in enumerate(pairs)}
+    prices = {pair: history[-1]['c'] for pair, history in histories.items()}
+
+    system = ForexMultiAgentSystem()
+    system.initialize_all_pairs(pairs, timeframes)
+
+    X, y = training_matrix(histories.values())
+    scaler = StandardScaler().fit(X)
+    for tf in timeframes:
+        trend = RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42, n_jobs=1)
+        momentum = GradientBoostingRegressor(n_estimators=100, learning_rate=0.1, max_depth=5)
+        system.share_model("TrendAgent", tf, trend.fit(scaler.transform(X), y), scaler)
+        system.share_model("MomentumAgent", tf, momentum.fit(scaler.transform(X), y), scaler)
+
+    # Primera pasada para dejar calentada la caché de features en ambos caminos
+    system.predict_all(prices, histories)
+
+    per_agent, t_agent = timed(lambda: system.predict_all(prices, histories), args.repeats)
+    batched, t_batch = timed(lambda: system.predict_all_batched(prices, histories), args.repeats)
+
+    identical = all(
+        per_agent[pair]['direction'] == batched[pair]['direction']
+        and per_agent[pair]['scores'] == batched[pair]['scores']
+        and per_agent[pair]['individual_predictions'] == batched[pair]['individual_predictions']
+        for pair in pairs
+    )
+    model_calls = len(pairs) * len(timeframes) * 2
+    print(json.dumps({
+        "benchmark": "batch_inference",
+        "pairs": len(pairs),
+        "timeframes": timeframes,
+        "model_predictions": model_calls,
+        "per_agent_s": t_agent,
+        "batched_s": t_batch,
+        "speedup": t_agent / t_batch if t_batch else None,
+        "sweeps_per_s_per_agent": 1 / t_agent,
+        "sweeps_per_s_batched": 1 / t_batch,
+        "identical": identical
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
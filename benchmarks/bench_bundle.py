@@ -0,0 +1,119 @@
+# benchmarks/bench_bundle.py
+# Registro de modelos en un solo bundle frente a un .joblib por agente, con
+# las entradas de --pairs pares × 7 timeframes × agentes entrenables (un
+# modelo compilado y su escalador reales, repetidos con otro rendimiento):
+#   - escritura de todo el conjunto y ficheros resultantes
+#   - lectura de una entrada al azar con un registro recién abierto
+#   - precarga de un par entero (el conjunto caliente habitual)
+#   - cambio del bundle con el servidor leyendo (hot swap)
+# Uso: python benchmarks/bench_bundle.py --pairs 28
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import bundle
+from modules.config import TIMEFRAMES
+from modules.fake_alpaca import synthetic_pairs
+from modules.registry import ModelRegistry
+from modules.training import fit_model
+from modules.tree_ensemble import for_serving
+
+AGENTS = ("TrendAgent", "MomentumAgent", "VolatilityAgent", "ScalpingAgent")
+
+
+def entries(pairs, rows, features, seed):
+    """{(par, tf, agente): dict de BaseAgent.save} con un modelo por agente"""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, features))
+    y = X[:, 0] + np.sin(X[:, 1]) + rng.normal(scale=0.1, size=rows)
+    fitted = {name: for_serving(*fit_model(name, "BENCH", "H1", X, y)) for name in AGENTS}
+    return {
+        (pair, tf, name): {"model": fitted[name][0], "scaler": fitted[name][1],
+                           "performance": {"accuracy": float(rng.random())},
+                           "name": name, "pair": pair, "timeframe": tf}
+        for pair in pairs for tf in TIMEFRAMES for name in AGENTS
+    }
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bundle de modelos frente a un fichero por agente")
+    parser.add_argument("--pairs", type=int, default=28)
+    parser.add_argument("--rows", type=int, default=2000, help="filas de entrenamiento de los modelos")
+    parser.add_argument("--features", type=int, default=22)
+    parser.add_argument("--samples", type=int, default=50, help="lecturas al azar medidas")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pairs = synthetic_pairs(args.pairs)
+    data = entries(pairs, args.rows, args.features, args.seed)
+    keys = sorted(data)
+    rng = np.random.default_rng(args.seed)
+    sample = [keys[i] for i in rng.integers(0, len(keys), args.samples)]
+    hot = [key for key in keys if key[0] == pairs[0]]
+    report = {"benchmark": "bundle", "config": {"entries": len(keys), "pairs": args.pairs}}
+
+    files_dir, bundle_dir = tempfile.mkdtemp(prefix="bench-joblib-"), tempfile.mkdtemp(prefix="bench-bundle-")
+    registry = ModelRegistry(root=files_dir, max_bytes=0, bundle=os.path.join(files_dir, "none"))
+    _, files_write = timed(lambda: [registry.put(*key, data[key]) for key in keys])
+    bundle_path = os.path.join(bundle_dir, bundle.BUNDLE_NAME)
+
+    def write_bundle():
+        with bundle.BundleWriter(bundle_path) as writer:
+            for key in keys:
+                writer.add(*key, data[key])
+
+    _, bundle_write = timed(write_bundle)
+
+    def layout(root, bundle_file):
+        def open_registry():
+            return ModelRegistry(root=root, bundle=bundle_file)
+
+        def cold_get():
+            samples = []
+            for key in sample:
+                start = time.perf_counter()
+                open_registry().get(*key)
+                samples.append(time.perf_counter() - start)
+            return float(np.median(samples))
+
+        _, preload = timed(lambda: open_registry().preload(hot, background=False))
+        count = sum(len(files) for _, _, files in os.walk(root))
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+        return {"files": count, "bytes": size, "cold_get_seconds": cold_get(), "preload_pair_seconds": preload}
+
+    report["joblib_files"] = {"write_seconds": files_write,
+                              **layout(files_dir, os.path.join(files_dir, "none"))}
+    report["bundle"] = {"write_seconds": bundle_write, **layout(bundle_dir, bundle_path)}
+
+    # Hot swap: un registro sirviendo mientras se publica un lote nuevo
+    serving = ModelRegistry(root=bundle_dir)
+    before = serving.get(*keys[0])["performance"]["accuracy"]
+    batch = {key: {**data[key], "performance": {"accuracy": -1.0}} for key in keys[:20]}
+    _, update_seconds = timed(lambda: bundle.update(bundle_path, batch))
+    _, reload_seconds = timed(serving.reload)
+    after = serving.get(*keys[0])["performance"]["accuracy"]
+    _, verify_seconds = timed(bundle.ModelBundle(bundle_path).verify)
+    report["hot_swap"] = {"update_seconds": update_seconds, "reload_seconds": reload_seconds,
+                          "verify_seconds": verify_seconds, "served_new": before != after and after == -1.0}
+    shutil.rmtree(files_dir)
+    shutil.rmtree(bundle_dir)
+    print(json.dumps(report, indent=2))
+    return 0 if report["hot_swap"]["served_new"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,64 @@
+# benchmarks/bench_chart.py
+# Coste por refresco del gráfico del dashboard: figura completa (fragmento
+# HTML y JSON para Plotly.newPlot), figura servida desde la caché y delta de
+# una vela nueva. Uso: python benchmarks/bench_chart.py
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.candles import CandleStore
+from modules.chart import FigureCache, build_figure, chart_delta, generate_live_chart
+from modules.fake_alpaca import FakeREST
+
+
+def history(api, bars):
+    frame = api.get_bars("EUR/USD", "1Min", start=(api.now_ms() - bars * 60_000)).df
+    store = CandleStore()
+    return store.load("EURUSD", "M1", frame.index.as_unit("ms").asi8,
+                      frame["open"].to_numpy(), frame["high"].to_numpy(), frame["low"].to_numpy(),
+                      frame["close"].to_numpy(), frame["volume"].to_numpy().astype(np.int64))
+
+
+def timed(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return (time.perf_counter() - start) / repeats, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del gráfico")
+    parser.add_argument("--bars", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    api = FakeREST()
+    after = history(api, args.bars)
+    # El cliente tenía el gráfico hasta la penúltima vela: delta de dos velas
+    base_time = int(after.t[-2])
+    prediction = {"current_price": float(after.c[-1]), "target_price": float(after.c[-1]) * 1.001,
+                  "stop_loss": float(after.c[-1]) * 0.999}
+    cache = FigureCache()
+    cache.get("EURUSD", after, prediction)
+
+    rows = []
+    for name, fn in (
+        ("html", lambda: generate_live_chart("EURUSD", after, prediction)),
+        ("figura_json", lambda: json.dumps(build_figure("EURUSD", after, prediction))),
+        ("figura_cache", lambda: json.dumps(cache.get("EURUSD", after, prediction))),
+        ("delta", lambda: json.dumps(chart_delta("EURUSD", after, prediction, base_time)))
+    ):
+        seconds, payload = timed(fn, args.repeats)
+        rows.append({"case": name, "ms": seconds * 1e3, "bytes": len(payload)})
+
+    print(json.dumps({"benchmark": "chart", "history_bars": len(after), "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/bench_journal.py
+# Diario de señales (modules.journal) con --days días de consensos de 28 pares,
+# uno por par cada --interval segundos, a partir de un consenso real del
+# sistema de agentes con datos sintéticos:
+#   - coste de record() en el hilo de la petición frente a escribir la señal
+#     como una línea JSON con flush en ese mismo hilo
+#   - señales por segundo del hilo escritor y bytes por señal en disco
+#   - consulta "un par durante una hora" frente a recorrer el JSON lines
+# Uso: python benchmarks/bench_journal.py --days 30 --interval 600
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.config import FOREX_PAIRS, TIMEFRAMES
+from modules.formatter import to_jsonable
+from modules.journal import SignalJournal, query, summary
+from modules.system import ForexMultiAgentSystem
+from modules.training import _data_client
+
+
+def sample_consensus(cache_dir):
+    """Un consenso real (individual_predictions con todos los agentes)"""
+    client = _data_client(True, cache_dir)
+    history = client.get_historical_data(FOREX_PAIRS[0], "H1")
+    system = ForexMultiAgentSystem(prediction_cache=False)
+    system.initialize_all_pairs(FOREX_PAIRS[:1], TIMEFRAMES)
+    prediction = system.consensus(FOREX_PAIRS[0], "H1", history[-1]['c'], history)
+    system.shutdown()
+    return prediction
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1e6
+    return {"p50_us": float(np.percentile(samples, 50)), "p99_us": float(np.percentile(samples, 99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diario de señales: escritura y consultas")
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=600, help="segundos entre señales de un par")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench-journal-")
+    prediction = sample_consensus(os.path.join(work, "bars"))
+    rng = np.random.default_rng(args.seed)
+    start_ms = 1_790_000_000_000
+    step_ms = int(args.interval * 1000)
+    times = np.arange(start_ms, start_ms + int(args.days * 86_400_000), step_ms)
+    signals = [(int(t), pair, "H1", int(t) - int(t) % 3_600_000)
+               for t in times for pair in FOREX_PAIRS]
+
+    # Diario: record() en el hilo de la petición y el resto en el escritor
+    journal = SignalJournal(os.path.join(work, "journal"), queue_size=len(signals) + 1)
+    enqueue = []
+    started = time.perf_counter()
+    for t, pair, tf, bar_t in signals:
+        begin = time.perf_counter()
+        journal.record(pair, tf, {**prediction, "confidence": float(rng.random() * 100)}, bar_t, t=t)
+        enqueue.append(time.perf_counter() - begin)
+    journal.flush()
+    write_seconds = time.perf_counter() - started
+    journal.close()
+    stored = summary(journal.root)
+
+    # Referencia: una línea JSON por señal escrita en el hilo de la petición
+    jsonl = os.path.join(work, "signals.jsonl")
+    inline = []
+    with open(jsonl, "a") as f:
+        for t, pair, tf, bar_t in signals[:20000]:
+            begin = time.perf_counter()
+            document = {"t": t, "pair": pair, "timeframe": tf, "bar_t": bar_t, **prediction}
+            f.write(json.dumps(to_jsonable(document)) + "\n")
+            f.flush()
+            inline.append(time.perf_counter() - begin)
+    jsonl_bytes_per_signal = os.path.getsize(jsonl) / min(len(signals), 20000)
+
+    # Consultas: un par durante una hora al azar
+    indexed, scanned, found = [], [], 0
+    for _ in range(args.queries):
+        pair = FOREX_PAIRS[int(rng.integers(len(FOREX_PAIRS)))]
+        t1 = int(rng.integers(start_ms, int(times[-1]) - 3_600_000))
+        begin = time.perf_counter()
+        found = len(query(journal.root, pair, t1, t1 + 3_600_000))
+        indexed.append(time.perf_counter() - begin)
+        begin = time.perf_counter()
+        with open(jsonl) as f:
+            [line for line in f if pair in line and t1 <= json.loads(line)["t"] < t1 + 3_600_000]
+        scanned.append((time.perf_counter() - begin) * len(signals) / min(len(signals), 20000))
+
+    report = {
+        "benchmark": "journal",
+        "config": {"signals": len(signals), "agents_per_signal": prediction["agents_count"],
+                   "segments": len(stored["segments"])},
+        "record": percentiles(enqueue),
+        "inline_jsonl_write": percentiles(inline),
+        "writer_signals_per_second": len(signals) / write_seconds,
+        "bytes_per_signal": stored["bytes"] / stored["signals"],
+        "jsonl_bytes_per_signal": jsonl_bytes_per_signal,
+        "query_hour_seconds": float(np.median(indexed)),
+        "query_hour_signals": found,
+        # Extrapolado a todo el diario a partir de las primeras 20000 líneas
+        "jsonl_scan_seconds": float(np.median(scanned)),
+        "stored": stored["signals"] == len(signals)
+    }
+    shutil.rmtree(work)
+    print(json.dumps(report, indent=2))
+    return 0 if report["stored"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+# benchmarks/bench_memory.py
+# Memoria de los agentes por par y memoria que asigna cada barrido de
+# predict_all_batched (pico transitorio y lo que queda retenido en el
+# resultado), medidas con tracemalloc sobre el mercado sintético de la suite.
+# Uso: python benchmarks/bench_memory.py --pairs 28
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["SOYTUGUIA_MODELS_DIR"] = tempfile.mkdtemp(prefix="bench-models-")
+
+from modules.alpaca_client import AlpacaRealClient
+from modules.config import TIMEFRAME_MS, TIMEFRAMES
+from modules.fake_alpaca import FakeREST, SyntheticMarket, synthetic_pairs
+from modules.system import ForexMultiAgentSystem
+from bench_suite import share_models
+
+
+def allocated(fn):
+    """(resultado, bytes retenidos, pico de bytes) de fn"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current - before, peak - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de memoria de agentes y predicciones")
+    parser.add_argument("--pairs", type=int, default=28)
+    parser.add_argument("--timeframe", default="M5")
+    parser.add_argument("--bars", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--untrained", dest="trained", action="store_false",
+                        help="sin modelos entrenados (TrendAgent y MomentumAgent caen a NEUTRAL)")
+    args = parser.parse_args()
+
+    pairs = synthetic_pairs(args.pairs)
+    market = SyntheticMarket(pairs, minutes=(args.bars + 100) * TIMEFRAME_MS[args.timeframe] // 60_000)
+    api = FakeREST(market=market)
+    client = AlpacaRealClient(api=api, cache=False, clock=api.clock)
+    days = args.bars * TIMEFRAME_MS[args.timeframe] / 86_400_000
+    histories = {pair: client.get_historical_data(pair, args.timeframe, days=days).copy() for pair in pairs}
+    prices = {pair: float(history[-1]['c']) for pair, history in histories.items()}
+
+    # Indicadores e importaciones fuera de la medida (la caché es global)
+    warm = ForexMultiAgentSystem()
+    warm.initialize_all_pairs(pairs, TIMEFRAMES)
+    share_models(warm, histories, TIMEFRAMES)
+    warm.predict_all_batched(prices, histories)
+    trained = {(name, tf): (agent.model, agent.scaler)
+               for name in ("TrendAgent", "MomentumAgent") for tf in TIMEFRAMES
+               for agent in [warm.coordinators[pairs[0]].agents[f"{name}_{tf}"]]}
+
+    def build():
+        system = ForexMultiAgentSystem()
+        system.initialize_all_pairs(pairs, TIMEFRAMES)
+        if args.trained:
+            for (name, tf), (model, scaler) in trained.items():
+                system.share_model(name, tf, model, scaler)
+        system.predict_all_batched(prices, histories)
+        return system
+
+    system, agents_bytes, _ = allocated(build)
+    agents = sum(len(c.agents) for c in system.coordinators.values())
+    unique = sum(len({id(a) for a in c.agents.values()}) for c in system.coordinators.values())
+    predictions, retained, peak = allocated(lambda: system.predict_all_batched(prices, histories))
+    samples = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        system.predict_all_batched(prices, histories)
+        samples.append(time.perf_counter() - start)
+
+    print(json.dumps({
+        "benchmark": "memory",
+        "pairs": args.pairs,
+        "trained": args.trained,
+        "agents": agents,
+        "agent_objects": unique,
+        "system_bytes_per_pair": agents_bytes / args.pairs,
+        "sweep_retained_bytes": retained,
+        "sweep_peak_bytes": peak,
+        "sweep_seconds": float(np.median(samples))
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/bench_patterns.py
+# Etiquetar toda una serie con patrones de velas: la detección escalar de
+# antes (DataFrame de dos velas e iloc, medida sobre una muestra y
+# extrapolada) frente a modules.patterns.detect sobre la serie completa.
+# Uso: python benchmarks/bench_patterns.py --bars 1000000
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.candles import CandleView
+from modules.ml_agents import PatternAgent
+from modules.patterns import PATTERNS, detect
+
+
+def random_walk(seed, bars):
+    rng = np.random.default_rng(seed)
+    close = np.exp(np.cumsum(rng.normal(0, 0.0005, bars)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.0003, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.0003, bars)))
+    t = 1_700_000_000_000 + np.arange(bars, dtype=np.int64) * 60_000
+    return CandleView(t, open_, high, low, close, rng.integers(1, 1000, bars))
+
+
+def scalar(bars, sample):
+    """Segundos por vela del detector anterior"""
+    import pandas as pd
+    start = time.perf_counter()
+    for i in range(1, sample + 1):
+        df = pd.DataFrame(list(bars[i - 1:i + 1]))
+        body = abs(df['c'].iloc[-1] - df['o'].iloc[-1])
+        _ = body < (df['h'].iloc[-1] - df['l'].iloc[-1]) * 0.1
+        _ = min(df['c'].iloc[-1], df['o'].iloc[-1]) - df['l'].iloc[-1] > body * 2
+        _ = body > abs(df['c'].iloc[-2] - df['o'].iloc[-2]) * 1.5
+    return (time.perf_counter() - start) / sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de patrones de velas")
+    parser.add_argument("--bars", type=int, default=1_000_000)
+    parser.add_argument("--sample", type=int, default=2000)
+    args = parser.parse_args()
+
+    bars = random_walk(0, args.bars)
+    rows = [{"case": "escalar_estimado", "patterns": 4, "seconds": scalar(bars, args.sample) * args.bars}]
+    for case, names in (("vectorizado_agente", PatternAgent.patterns), ("vectorizado_todos", None)):
+        start = time.perf_counter()
+        masks = detect(bars, names)
+        rows.append({"case": case, "patterns": len(masks), "seconds": time.perf_counter() - start})
+
+    print(json.dumps({
+        "benchmark": "patterns",
+        "bars": args.bars,
+        "results": rows,
+        "matches": {name: int(mask.sum()) for name, mask in detect(bars).items()},
+        "registered": list(PATTERNS)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
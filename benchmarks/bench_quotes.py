@@ -0,0 +1,78 @@
+# benchmarks/bench_quotes.py
+# Mide un refresco de precios de los 28 pares contra FakeREST: el bucle serie
+# de antes, el lote de get_latest_bars, el reparto en paralelo cuando la API
+# no tiene lotes, y N clientes simultáneos del dashboard pidiendo lo mismo.
+# Uso: python benchmarks/bench_quotes.py
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.alpaca_client import AlpacaRealClient, to_symbol
+from modules.config import FOREX_PAIRS
+from modules.fake_alpaca import FakeREST
+
+
+class NoBatchREST(FakeREST):
+    """FakeREST sin get_latest_bars, para forzar el reparto por par"""
+    get_latest_bars = None
+
+
+def serial(api, pairs):
+    return {pair: float(api.get_latest_bar(to_symbol(pair)).c) for pair in pairs}
+
+
+def timed(name, api, fn):
+    before = sum(api.calls.values())
+    start = time.perf_counter()
+    fn()
+    return {"case": name, "seconds": time.perf_counter() - start,
+            "api_calls": sum(api.calls.values()) - before}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de precios actuales")
+    parser.add_argument("--latency", type=float, default=0.05, help="segundos por petición simulada")
+    parser.add_argument("--clients", type=int, default=50)
+    args = parser.parse_args()
+    pairs = FOREX_PAIRS
+
+    api = FakeREST(latency=args.latency)
+    rows = [timed("serie_por_par", api, lambda: serial(api, pairs))]
+
+    client = AlpacaRealClient(api=api, cache=False)
+    rows.append(timed("lote", api, lambda: client.get_current_prices(pairs)))
+
+    fanout_api = NoBatchREST(latency=args.latency)
+    fanout = AlpacaRealClient(api=fanout_api, cache=False)
+    rows.append(timed("reparto_paralelo", fanout_api, lambda: fanout.get_current_prices(pairs)))
+
+    client.quotes.clear()
+
+    def burst():
+        threads = [threading.Thread(target=client.get_current_prices, args=(pairs,))
+                   for _ in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    rows.append(timed(f"{args.clients}_clientes_simultaneos", api, burst))
+    client.close()
+    fanout.close()
+
+    print(json.dumps({
+        "benchmark": "quotes",
+        "pairs": len(pairs),
+        "latency_s": args.latency,
+        "results": rows,
+        "quote_cache": client.quotes.stats()
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
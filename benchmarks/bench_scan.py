@@ -0,0 +1,62 @@
+# benchmarks/bench_scan.py
+# Barrido de todo el mercado (28 pares x 7 timeframes) con
+# ForexMultiAgentSystem.scan: primer barrido en frío (réplica de indicadores)
+# y barridos siguientes con las features ya en caché.
+# Uso: python benchmarks/bench_scan.py --repeats 5
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.config import FOREX_PAIRS, TIMEFRAMES
+from modules.system import ForexMultiAgentSystem
+from modules.training import _data_client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del escáner de mercado")
+    parser.add_argument("--pairs", type=int, default=len(FOREX_PAIRS))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    pairs = FOREX_PAIRS[:args.pairs]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client = _data_client(True, cache_dir)
+        start = time.perf_counter()
+        histories = {(pair, tf): client.get_historical_data(pair, tf) for pair in pairs for tf in TIMEFRAMES}
+        load_seconds = time.perf_counter() - start
+        prices = {pair: histories[(pair, "M1")][-1]['c'] for pair in pairs}
+
+        system = ForexMultiAgentSystem()
+        system.initialize_all_pairs(pairs, TIMEFRAMES)
+        start = time.perf_counter()
+        system.scan(prices, histories, top=args.top)
+        cold = time.perf_counter() - start
+        warm = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            results = system.scan(prices, histories, top=args.top)
+            warm.append(time.perf_counter() - start)
+        system.shutdown()
+
+    print(json.dumps({
+        "benchmark": "scan",
+        "combinations": len(histories),
+        "results": [
+            {"case": "descarga", "seconds": load_seconds},
+            {"case": "barrido_frio", "seconds": cold},
+            {"case": "barrido_caliente_mediana", "seconds": float(np.median(warm))}
+        ],
+        "top": [f"{r['pair']}:{r['timeframe']} {r['signal']} {r['score']:.2f}" for r in results]
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
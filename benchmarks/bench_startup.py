@@ -0,0 +1,92 @@
+# benchmarks/bench_startup.py
+# Mide el coste de arranque del servidor: perfil de `python -X importtime`
+# al importar main y segundos hasta que /health responde con uvicorn.
+# Uso: python benchmarks/bench_startup.py [--report benchmarks/results/startup_importtime.txt]
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("pandas", "sklearn", "xgboost", "lightgbm", "alpaca_trade_api", "plotly", "matplotlib", "joblib")
+
+
+def import_profile(statement):
+    """Devuelve [(acumulado_us, propio_us, módulo)] de python -X importtime"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), int(own), name.rstrip()))
+    return rows
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_health(timeout=30.0):
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        return None
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque")
+    parser.add_argument("--report", help="Guarda el perfil de importación legible en este fichero")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--skip-server", action="store_true")
+    args = parser.parse_args()
+
+    rows = import_profile("import main")
+    top_level = [row for row in rows if not row[2][1:].startswith(" ")]
+    total_us = sum(row[0] for row in top_level)
+    loaded = {row[2].strip() for row in rows}
+    result = {
+        "benchmark": "startup",
+        "import_main_s": total_us / 1e6,
+        "modules_imported": len(rows),
+        "heavy_imported": sorted(m for m in HEAVY if m in loaded),
+        "time_to_health_s": None if args.skip_server else time_to_health()
+    }
+    print(json.dumps(result, indent=2))
+
+    if args.report:
+        os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+        with open(args.report, "w") as f:
+            f.write("# python -X importtime -c 'import main'\n")
+            f.write(f"# total: {total_us / 1e3:.1f} ms, {len(rows)} módulos\n")
+            f.write(f"# pesados cargados: {', '.join(result['heavy_imported']) or 'ninguno'}\n")
+            f.write(f"{'acumulado ms':>13} {'propio ms':>10}  módulo\n")
+            for cumulative, own, name in sorted(rows, reverse=True)[:args.top]:
+                f.write(f"{cumulative / 1e3:13.1f} {own / 1e3:10.1f}  {name.strip()}\n")
+
+
+if __name__ == "__main__":
+    main()
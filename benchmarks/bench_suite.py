@@ -0,0 +1,205 @@
+# benchmarks/bench_suite.py
+# Suite reproducible sin red ni claves: un SyntheticMarket (paseos aleatorios
+# con regímenes, semilla fija) servido por FakeREST con el reloj parado, y
+# los caminos calientes del sistema medidos con 1, 28 y 100 pares:
+# prepare_features, predict de cada agente, get_consensus_prediction,
+# predict_all, predict_all_batched y generate_live_chart. El resultado es un
+# JSON; con --baseline se compara con una ejecución anterior y el proceso
+# sale con código 1 si algún caso es más lento que la tolerancia.
+# Uso: python benchmarks/bench_suite.py --output benchmarks/results/suite.json
+#      python benchmarks/bench_suite.py --baseline benchmarks/results/suite.json
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Sin los modelos entrenados del repositorio: solo los que ajusta la suite
+os.environ["SOYTUGUIA_MODELS_DIR"] = tempfile.mkdtemp(prefix="bench-models-")
+
+from modules.alpaca_client import AlpacaRealClient
+from modules.config import TIMEFRAME_MS, TIMEFRAMES
+from modules.fake_alpaca import FakeREST, SyntheticMarket, synthetic_pairs
+from modules.feature_store import feature_store, compute_feature_frame, FEATURE_COLUMNS, VOLUME_COLUMNS
+from modules.indicators import indicator_engine
+from modules.system import AGENT_CLASSES, ForexMultiAgentSystem
+
+
+def timed(fn, repeats, setup=None):
+    """Mediana de segundos de fn en `repeats` ejecuciones (setup fuera del tiempo)"""
+    samples = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def cold_features():
+    feature_store.clear()
+    indicator_engine.reset()
+
+
+def share_models(system, histories, timeframes):
+    """Modelos pequeños y deterministas para TrendAgent y MomentumAgent,
+    compartidos por todos los pares (el camino de inferencia por lotes)"""
+    from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+    from sklearn.preprocessing import StandardScaler
+    X, y = [], []
+    for history in list(histories.values())[:4]:
+        df = compute_feature_frame(history)
+        df['target'] = df['c'].shift(-1)
+        df = df.dropna()
+        X.append(df[FEATURE_COLUMNS + VOLUME_COLUMNS].values)
+        y.append(df['target'].values)
+    X, y = np.vstack(X), np.concatenate(y)
+    scaler = StandardScaler().fit(X)
+    trend = RandomForestRegressor(n_estimators=20, max_depth=8, random_state=42, n_jobs=1)
+    momentum = GradientBoostingRegressor(n_estimators=20, max_depth=3, random_state=42)
+    trend.fit(scaler.transform(X), y)
+    momentum.fit(scaler.transform(X), y)
+    for tf in timeframes:
+        system.share_model("TrendAgent", tf, trend, scaler)
+        system.share_model("MomentumAgent", tf, momentum, scaler)
+
+
+def fingerprint(predictions):
+    """Huella de las direcciones y scores: cambia si cambia el comportamiento"""
+    digest = hashlib.sha256()
+    for pair in sorted(predictions):
+        p = predictions[pair]
+        scores = p.get('scores') or {}
+        digest.update(f"{pair}:{p['direction']}:{scores.get('buy', 0):.6f}:{scores.get('sell', 0):.6f};".encode())
+    return digest.hexdigest()[:16]
+
+
+def run_pairs(count, args, market):
+    from modules.chart import figure_cache, generate_live_chart
+    pairs = synthetic_pairs(count)
+    api = FakeREST(pairs, market=market)
+    client = AlpacaRealClient(api=api, cache=False, clock=api.clock)
+    days = args.bars * TIMEFRAME_MS[args.timeframe] / 86_400_000
+    start = time.perf_counter()
+    histories = {pair: client.get_historical_data(pair, args.timeframe, days=days).copy() for pair in pairs}
+    load_seconds = time.perf_counter() - start
+    prices = {pair: float(history[-1]['c']) for pair, history in histories.items()}
+
+    system = ForexMultiAgentSystem(executor=args.executor)
+    system.initialize_all_pairs(pairs, args.agent_timeframes)
+    share_models(system, histories, args.agent_timeframes)
+    coordinators = [(system.coordinators[pair], prices[pair], histories[pair]) for pair in pairs]
+
+    def agents_of(name):
+        key = f"{name}_{args.timeframe}"
+        return [(c.agents[key], price, history) for c, price, history in coordinators]
+
+    def each(calls, method):
+        return lambda: [getattr(target, method)(price, history) for target, price, history in calls]
+
+    trend_agents = agents_of("TrendAgent")
+    cases = {
+        "load_history": load_seconds,
+        "prepare_features_cold": timed(
+            lambda: [agent.prepare_features(history) for agent, _, history in trend_agents],
+            args.repeats, setup=cold_features)
+    }
+    # El resto, con los indicadores ya calculados (el caso de cada refresco)
+    system.predict_all(prices, histories)
+    for agent_class in AGENT_CLASSES:
+        name = agent_class.__name__
+        cases[f"predict:{name}"] = timed(each(agents_of(name), "predict"), args.repeats)
+    cases["get_consensus_prediction"] = timed(each(coordinators, "get_consensus_prediction"), args.repeats)
+    cases["predict_all"] = timed(lambda: system.predict_all(prices, histories), args.repeats)
+    cases["predict_all_batched"] = timed(lambda: system.predict_all_batched(prices, histories), args.repeats)
+    predictions = system.predict_all_batched(prices, histories)
+    cases["generate_live_chart"] = timed(
+        lambda: [generate_live_chart(pair, histories[pair], predictions[pair], args.timeframe) for pair in pairs],
+        args.repeats, setup=figure_cache._entries.clear)
+    system.shutdown()
+
+    rows = [{"case": case, "pairs": count, "seconds": seconds, "per_pair": seconds / count}
+            for case, seconds in cases.items()]
+    return rows, fingerprint(predictions)
+
+
+def compare(results, baseline, tolerance, min_seconds):
+    """Casos más lentos que baseline * (1 + tolerance) y al menos min_seconds
+    más lentos (los casos de microsegundos son sobre todo ruido)"""
+    before = {(row["case"], row["pairs"]): row["seconds"] for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        old = before.get((row["case"], row["pairs"]))
+        if old and row["seconds"] > old * (1 + tolerance) and row["seconds"] - old > min_seconds:
+            regressions.append({"case": row["case"], "pairs": row["pairs"], "baseline": old,
+                                "seconds": row["seconds"], "ratio": row["seconds"] / old})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks reproducible")
+    parser.add_argument("--pairs", default="1,28,100", help="tamaños del universo, separados por comas")
+    parser.add_argument("--timeframe", default="M5", help="timeframe del historial de los agentes")
+    parser.add_argument("--agent-timeframes", default=",".join(TIMEFRAMES),
+                        help="timeframes con agentes por par (42 agentes con los 7)")
+    parser.add_argument("--bars", type=int, default=2000, help="velas por historial")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--executor", default="thread", help="'thread', 'process' o 'none'")
+    parser.add_argument("--output", help="fichero donde guardar el JSON")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior con el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="lentitud tolerada (0.25 = +25%%)")
+    parser.add_argument("--min-seconds", type=float, default=0.002,
+                        help="diferencia mínima en segundos para contar como regresión")
+    args = parser.parse_args()
+    args.agent_timeframes = args.agent_timeframes.split(",")
+    args.executor = None if args.executor == "none" else args.executor
+    sizes = [int(n) for n in args.pairs.split(",")]
+
+    minutes = (args.bars + 100) * TIMEFRAME_MS[args.timeframe] // 60_000
+    market = SyntheticMarket(synthetic_pairs(max(sizes)), minutes=minutes, seed=args.seed)
+    # Paseos generados e importaciones hechas antes de medir
+    for pair in market.pairs:
+        market.series(pair)
+    FakeREST(market=market).get_bars("EUR/USD", "1Min", limit=1)
+    results, fingerprints = [], {}
+    for count in sizes:
+        rows, fingerprints[str(count)] = run_pairs(count, args, market)
+        results.extend(rows)
+
+    report = {
+        "benchmark": "suite",
+        "config": {"pairs": sizes, "timeframe": args.timeframe, "agent_timeframes": args.agent_timeframes,
+                   "bars": args.bars, "repeats": args.repeats, "seed": args.seed,
+                   "executor": args.executor},
+        "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                        "machine": platform.machine(), "cpus": os.cpu_count()},
+        "fingerprints": fingerprints,
+        "results": results
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_seconds)
+        old = baseline.get("fingerprints", {})
+        report["baseline"] = {"file": args.baseline, "tolerance": args.tolerance,
+                              "changed_fingerprints": sorted(n for n in fingerprints if old.get(n) != fingerprints[n]),
+                              "regressions": regressions}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,153 @@
+# benchmarks/bench_tree_ensemble.py
+# Modelos de TrendAgent (RandomForest), MomentumAgent (GradientBoosting),
+# VolatilityAgent (XGBoost) y ScalpingAgent (LightGBM), con los parámetros de
+# build_model y ajustados a features del SyntheticMarket, evaluados con su
+# librería y compilados con modules.tree_ensemble:
+#   - diferencia máxima entre ambas predicciones (sale con código 1 si supera
+#     la tolerancia de float32)
+#   - latencia de una fila y de un lote de --batch filas
+#   - librerías importadas por un proceso nuevo que carga del registro los
+#     modelos guardados con BaseAgent.save y predice con ellos
+# Uso: python benchmarks/bench_tree_ensemble.py --pairs 4 --bars 3000
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.config import TIMEFRAME_MS
+from modules.fake_alpaca import FakeREST, SyntheticMarket, synthetic_pairs
+from modules.feature_store import compute_feature_frame, FEATURE_COLUMNS, VOLUME_COLUMNS
+from modules.registry import ModelRegistry
+from modules.training import agent_class, fit_model
+from modules.tree_ensemble import compile_model, compile_scaler
+
+AGENTS = ("TrendAgent", "MomentumAgent", "VolatilityAgent", "ScalpingAgent")
+LIBRARIES = ("sklearn", "xgboost", "lightgbm")
+
+# Proceso de servicio: carga los modelos del registro y predice con ellos
+SERVE = """
+import json, sys
+import numpy as np
+from modules.registry import ModelRegistry
+registry = ModelRegistry(root=sys.argv[1])
+X = np.load(sys.argv[2])
+outputs = {}
+for name in sys.argv[3].split(","):
+    entry = registry.get("BENCH", sys.argv[4], name)
+    outputs[name] = entry["model"].predict(entry["scaler"].transform(X)).tolist()
+print(json.dumps({"outputs": outputs, "imported": [m for m in %r if m in sys.modules]}))
+""" % (LIBRARIES,)
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def feature_matrix(pairs, bars, timeframe, seed):
+    """Features y cierre siguiente de los pares del SyntheticMarket"""
+    api = FakeREST(pairs, market=SyntheticMarket(pairs, seed=seed))
+    from modules.alpaca_client import AlpacaRealClient
+    client = AlpacaRealClient(api=api, cache=False, clock=api.clock)
+    days = bars * TIMEFRAME_MS[timeframe] / 86_400_000
+    X, y = [], []
+    for pair in pairs:
+        df = compute_feature_frame(client.get_historical_data(pair, timeframe, days=days))
+        df['target'] = df['c'].shift(-1)
+        df = df.dropna()
+        X.append(df[FEATURE_COLUMNS + VOLUME_COLUMNS].to_numpy(dtype=float))
+        y.append(df['target'].to_numpy(dtype=float))
+    return np.vstack(X), np.concatenate(y)
+
+
+def serve(root, X, names, timeframe):
+    """Predicciones e importaciones de un proceso nuevo que sirve del registro"""
+    with tempfile.NamedTemporaryFile(suffix=".npy", delete=False) as f:
+        np.save(f, X)
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    out = subprocess.run([sys.executable, "-c", SERVE, root, f.name, ",".join(names), timeframe],
+                         capture_output=True, text=True, env=env, check=True)
+    os.unlink(f.name)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ensembles compilados a NumPy frente a su librería")
+    parser.add_argument("--pairs", type=int, default=4)
+    parser.add_argument("--bars", type=int, default=3000)
+    parser.add_argument("--timeframe", default="H1")
+    parser.add_argument("--batch", type=int, default=28, help="filas por lote (un modelo compartido por los pares)")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    X, y = feature_matrix(synthetic_pairs(args.pairs), args.bars, args.timeframe, args.seed)
+    split = int(len(X) * 0.8)
+    holdout = X[split:]
+    rng = np.random.default_rng(args.seed)
+    row = holdout[:1]
+    batch = holdout[rng.integers(0, len(holdout), args.batch)]
+
+    root = tempfile.mkdtemp(prefix="bench-compiled-")
+    registry = ModelRegistry(root=root)
+    report = {"benchmark": "tree_ensemble",
+              "config": {"rows": len(X), "features": X.shape[1], "batch": args.batch, "repeats": args.repeats},
+              "models": {}}
+    expected = {}
+    ok = True
+    for name in AGENTS:
+        started = time.perf_counter()
+        model, scaler = fit_model(name, "BENCH", args.timeframe, X[:split], y[:split])
+        fit_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        compiled, standardizer = compile_model(model), compile_scaler(scaler)
+        compile_seconds = time.perf_counter() - started
+
+        library = model.predict(scaler.transform(holdout))
+        numpy_only = compiled.predict(standardizer.transform(holdout))
+        error = float(np.max(np.abs(library - numpy_only)))
+        # XGBoost suma las hojas en float32
+        close = bool(np.allclose(numpy_only, library, rtol=1e-5, atol=1e-6))
+        ok &= close
+        expected[name] = numpy_only[:args.batch]
+
+        cases = {}
+        for label, rows in (("row", row), ("batch", batch)):
+            cases[f"library_{label}"] = timed(lambda: model.predict(scaler.transform(rows)), args.repeats)
+            cases[f"compiled_{label}"] = timed(lambda: compiled.predict(standardizer.transform(rows)),
+                                               args.repeats)
+            cases[f"speedup_{label}"] = cases[f"library_{label}"] / cases[f"compiled_{label}"]
+
+        agent = agent_class(name)("BENCH", args.timeframe)
+        agent.model, agent.scaler = model, scaler
+        agent.save(registry)
+        report["models"][name] = {
+            "source": type(model).__name__, "trees": compiled.n_estimators, "nodes": len(compiled.feature),
+            "depth": compiled.depth, "bytes": compiled.nbytes, "fit_seconds": fit_seconds,
+            "compile_seconds": compile_seconds, "max_abs_error": error, "allclose": close, **cases
+        }
+
+    served = serve(root, holdout[:args.batch], AGENTS, args.timeframe)
+    report["serving"] = {
+        "imported": served["imported"],
+        "identical": all(np.array_equal(served["outputs"][name], expected[name]) for name in AGENTS)
+    }
+    ok &= report["serving"]["identical"] and not served["imported"]
+    report["ok"] = ok
+    print(json.dumps(report, indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
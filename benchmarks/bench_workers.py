@@ -0,0 +1,154 @@
+# benchmarks/bench_workers.py
+# `python main.py serve --workers N` con datos sintéticos (SOYTUGUIA_FAKE_ALPACA=1)
+# para cada N de --workers:
+#   - peticiones por segundo a /api/predict y /api/scan con --clients clientes
+#   - memoria del árbol de procesos (cargador y workers): PSS sumado, que
+#     reparte las páginas compartidas (el estado en /dev/shm, el código) entre
+#     quienes las usan, y RSS de cada proceso
+# Con N = 1 es el servidor de un solo proceso de siempre (sin cargador).
+# Uso: python benchmarks/bench_workers.py --workers 1,2,4 --seconds 10
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAIRS = ("EURUSD", "GBPUSD", "USDJPY", "AUDUSD")
+TIMEFRAMES = ("1m", "5m", "1h", "1d")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(url, timeout=30):
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        resp.read()
+        return resp.status
+
+
+def tree(pid):
+    """pid y todos sus descendientes (de /proc/<pid>/task/*/children)"""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def memory(pid):
+    """{"pss_mb", "rss_mb"} de un proceso (smaps_rollup, en MB)"""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                field, _, rest = line.partition(":")
+                if field in ("Pss", "Rss"):
+                    values[f"{field.lower()}_mb"] = int(rest.split()[0]) / 1024
+    except OSError:
+        pass
+    return values
+
+
+def wait_ready(base, timeout):
+    """Segundos hasta que /api/predict responde 200, o None"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if get(f"{base}/api/predict/{PAIRS[0]}/{TIMEFRAMES[0]}", timeout=5) == 200:
+                return time.perf_counter() - start
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return None
+
+
+def load(base, clients, seconds):
+    """Peticiones por segundo repartidas entre predicción y escáner"""
+    urls = [f"{base}/api/predict/{pair}/{tf}" for pair in PAIRS for tf in TIMEFRAMES]
+    urls.append(f"{base}/api/scan?top=10")
+    counts, errors = [0] * clients, [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def client(index):
+        i = index
+        while time.perf_counter() < deadline:
+            try:
+                get(urls[i % len(urls)])
+                counts[index] += 1
+            except OSError:
+                errors[index] += 1
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"requests_per_second": sum(counts) / seconds, "errors": sum(errors)}
+
+
+def run(workers, args):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, SOYTUGUIA_FAKE_ALPACA="1", PYTHONPATH=ROOT,
+               SOYTUGUIA_BAR_CACHE_DIR=tempfile.mkdtemp(prefix="bench-workers-"))
+    env.pop("SOYTUGUIA_SHARED_STATE", None)
+    proc = subprocess.Popen(
+        [sys.executable, "main.py", "serve", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port),
+         "--shared-state", os.path.join(tempfile.gettempdir() if not os.path.isdir("/dev/shm") else "/dev/shm",
+                                        f"bench-workers-{port}.state")],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        ready = wait_ready(base, args.timeout)
+        if ready is None:
+            return {"workers": workers, "ready_seconds": None}
+        result = {"workers": workers, "ready_seconds": ready, **load(base, args.clients, args.seconds)}
+        processes = {pid: memory(pid) for pid in tree(proc.pid)}
+        processes = {pid: values for pid, values in processes.items() if values}
+        result["processes"] = len(processes)
+        result["pss_mb"] = sum(values["pss_mb"] for values in processes.values())
+        result["rss_mb"] = sorted(round(values["rss_mb"], 1) for values in processes.values())
+        return result
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor con uno o varios workers y estado compartido")
+    parser.add_argument("--workers", default="1,2,4", help="números de workers, separados por comas")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--timeout", type=float, default=180.0, help="segundos máximos de arranque")
+    args = parser.parse_args()
+
+    runs = [run(int(workers), args) for workers in args.workers.split(",")]
+    report = {"benchmark": "workers", "cpus": os.cpu_count(),
+              "config": {"clients": args.clients, "seconds": args.seconds}, "runs": runs}
+    print(json.dumps(report, indent=2))
+    return 0 if all(run["ready_seconds"] is not None for run in runs) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,176 +1,528 @@
-# modules/chart.py
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import pandas as pd
-import numpy as np
-
-def generate_live_chart(pair, history, prediction, timeframe="M1"):
-    """Genera gráfico interactivo con predicciones"""
-    
-    if not history or len(history) < 20:
-        return "<div style='color: cyan; text-align: center; padding: 50px;'>Esperando datos...</div>"
-    
-    # Preparar datos
-    df = pd.DataFrame(history)
-    
-    # Crear subplots
-    fig = make_subplots(
-        rows=3, cols=1,
-        shared_xaxes=True,
-        vertical_spacing=0.03,
-        subplot_titles=(f'{pair} - {timeframe}', 'RSI', 'Volumen'),
-        row_heights=[0.6, 0.2, 0.2]
-    )
-    
-    # Candlestick principal
-    fig.add_trace(
-        go.Candlestick(
-            x=df.index,
-            open=df['o'],
-            high=df['h'],
-            low=df['l'],
-            close=df['c'],
-            name='Precio',
-            increasing_line_color='#00ff00',
-            decreasing_line_color='#ff0000'
-        ),
-        row=1, col=1
-    )
-    
-    # Media móviles
-    if len(df) >= 20:
-        df['sma20'] = df['c'].rolling(20).mean()
-        df['sma50'] = df['c'].rolling(50).mean() if len(df) >= 50 else None
-        
-        fig.add_trace(
-            go.Scatter(
-                x=df.index,
-                y=df['sma20'],
-                name='SMA 20',
-                line=dict(color='yellow', width=1)
-            ),
-            row=1, col=1
-        )
-    
-    # RSI
-    if len(df) >= 14:
-        delta = df['c'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-        rs = gain / loss
-        df['rsi'] = 100 - (100 / (1 + rs))
-        
-        fig.add_trace(
-            go.Scatter(
-                x=df.index,
-                y=df['rsi'],
-                name='RSI',
-                line=dict(color='cyan', width=1),
-                fill='tozeroy',
-                fillcolor='rgba(0,255,255,0.1)'
-            ),
-            row=2, col=1
-        )
-        
-        # Líneas RSI
-        fig.add_hline(y=70, line_color="red", line_width=1, line_dash="dash", row=2, col=1)
-        fig.add_hline(y=30, line_color="green", line_width=1, line_dash="dash", row=2, col=1)
-    
-    # Volumen
-    colors = ['green' if df['c'].iloc[i] > df['o'].iloc[i] else 'red' 
-              for i in range(len(df))]
-    
-    fig.add_trace(
-        go.Bar(
-            x=df.index,
-            y=df.get('v', [0]*len(df)),
-            name='Volumen',
-            marker_color=colors
-        ),
-        row=3, col=1
-    )
-    
-    # Añadir predicción
-    if prediction and 'current_price' in prediction:
-        last_price = prediction['current_price']
-        target = prediction.get('target_price', last_price)
-        stop = prediction.get('stop_loss', last_price)
-        
-        # Líneas de predicción
-        fig.add_hline(y=last_price, line_color="blue", line_width=2, 
-                     annotation_text=f"Actual: {last_price:.5f}", row=1, col=1)
-        fig.add_hline(y=target, line_color="green", line_width=2, line_dash="dash",
-                     annotation_text=f"Target: {target:.5f}", row=1, col=1)
-        fig.add_hline(y=stop, line_color="red", line_width=2, line_dash="dash",
-                     annotation_text=f"Stop: {stop:.5f}", row=1, col=1)
-    
-    # Layout
-    fig.update_layout(
-        template='plotly_dark',
-        height=600,
-        showlegend=True,
-        xaxis_rangeslider_visible=False,
-        hovermode='x unified',
-        margin=dict(l=0, r=0, t=30, b=0),
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0.3)',
-        font=dict(color='white')
-    )
-    
-    # Configuración de ejes
-    fig.update_xaxes(showgrid=True, gridcolor='rgba(255,255,255,0.1)')
-    fig.update_yaxes(showgrid=True, gridcolor='rgba(255,255,255,0.1)')
-    
-    return fig.to_html(
-        div_id=f"chart-{pair}",
-        include_plotlyjs='cdn',
-        config={'displayModeBar': False}
-    )
-
-def plot_prediction(pair, history, prediction):
-    """Versión simplificada para matplotlib si se necesita"""
-    import matplotlib.pyplot as plt
-    import matplotlib
-    matplotlib.use('Agg')
-    
-    prices = [h['c'] for h in history[-100:]]
-    
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8), 
-                                    gridspec_kw={'height_ratios': [3, 1]})
-    
-    # Precio
-    ax1.plot(prices, label="Precio", color='cyan', linewidth=2)
-    ax1.set_facecolor('black')
-    ax1.grid(True, alpha=0.3)
-    
-    if prediction:
-        ax1.axhline(prediction['current_price'], color='blue', linestyle='--', label="Actual")
-        ax1.axhline(prediction.get('target_price', 0), color='green', linestyle='--', label="Target")
-        ax1.axhline(prediction.get('stop_loss', 0), color='red', linestyle='--', label="Stop Loss")
-    
-    ax1.legend(loc='upper left')
-    ax1.set_title(f"{pair} - {prediction.get('direction', 'ANALIZANDO')}", color='white', fontsize=14)
-    
-    # RSI
-    if len(prices) > 14:
-        df = pd.DataFrame({'c': prices})
-        delta = df['c'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        
-        ax2.plot(rsi, color='yellow', linewidth=1)
-        ax2.axhline(70, color='red', linestyle='--', alpha=0.5)
-        ax2.axhline(30, color='green', linestyle='--', alpha=0.5)
-        ax2.fill_between(range(len(rsi)), 30, 70, alpha=0.1, color='gray')
-        ax2.set_ylabel('RSI', color='white')
-        ax2.set_ylim(0, 100)
-    
-    ax2.set_facecolor('black')
-    ax2.grid(True, alpha=0.3)
-    
-    fig.patch.set_facecolor('black')
-    plt.tight_layout()
-    
-    return fig
+# main.py
+# Servidor web. La app responde (incluido /health) en cuanto uvicorn abre el
+# puerto; el cliente de Alpaca y los agentes se preparan en segundo plano y
+# los backends de ML se importan cuando cada agente los necesita.
+#
+# Con varios workers (python main.py serve --workers N) un proceso cargador
+# descarga los datos y calcula los consensos y los publica en un estado
+# compartido (modules.shared_state); los workers HTTP solo leen de él.
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, PlainTextResponse
+from fastapi.staticfiles import StaticFiles
+
+from modules.config import FOREX_PAIRS, TIMEFRAMES, TIMEFRAME_LABELS, normalize_timeframe
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXECUTOR = os.environ.get("SOYTUGUIA_EXECUTOR", "thread") or None
+LATENCY_BUDGET = float(os.environ.get("SOYTUGUIA_LATENCY_BUDGET", "2.0"))
+# "1" sirve datos sintéticos de modules.fake_alpaca en lugar de la API real;
+# "http", los mismos datos desde un FakeAlpacaServer local por el transporte HTTP
+FAKE_ALPACA = os.environ.get("SOYTUGUIA_FAKE_ALPACA", "")
+# Días de historial que se precargan de todos los pares al arrancar (0 = nada)
+BACKFILL_DAYS = float(os.environ.get("SOYTUGUIA_BACKFILL_DAYS", "30"))
+# Segundos entre pasadas del stream del dashboard (precios y velas nuevas)
+STREAM_INTERVAL = float(os.environ.get("SOYTUGUIA_STREAM_INTERVAL", "1.0"))
+# Fichero del estado compartido: si está definido, este proceso es un worker
+# que lee de él en lugar de preparar su propio cliente y agentes
+SHARED_STATE = os.environ.get("SOYTUGUIA_SHARED_STATE", "")
+# "1" expone /debug/profile (pilas de todos los hilos: no activar en público)
+DEBUG = os.environ.get("SOYTUGUIA_DEBUG", "") == "1"
+# Workers HTTP de `python main.py serve` (1 = un solo proceso, sin cargador)
+WORKERS = int(os.environ.get("SOYTUGUIA_WORKERS", "1"))
+
+
+class AppState:
+    """Cliente de datos y sistema de agentes, creados después del arranque"""
+    def __init__(self):
+        self.client = None
+        self.system = None
+        self.error = None
+        self.ready = threading.Event()
+        self.templates = None
+        self.hub = None
+        self.fake_server = None
+        self.shared = None
+        self.schedule = None
+
+
+state = AppState()
+
+
+def warm_up():
+    try:
+        from modules.alpaca_client import AlpacaRealClient, BarSchedule
+        from modules.system import ForexMultiAgentSystem
+        api = None
+        if FAKE_ALPACA == "1":
+            from modules.fake_alpaca import FakeREST
+            api = FakeREST()
+        elif FAKE_ALPACA == "http":
+            from modules.async_alpaca import AlpacaHTTP, AlpacaREST
+            from modules.fake_alpaca import FakeAlpacaServer
+            state.fake_server = FakeAlpacaServer().start()
+            api = AlpacaREST(AlpacaHTTP(trading_url=state.fake_server.url, data_url=state.fake_server.url))
+        client = AlpacaRealClient(api=api)
+        from modules.journal import get_journal
+        system = ForexMultiAgentSystem(executor=EXECUTOR, latency_budget=LATENCY_BUDGET, journal=get_journal())
+        system.initialize_all_pairs(FOREX_PAIRS, TIMEFRAMES)
+        state.client, state.system = client, system
+        state.schedule = BarSchedule(client.clock)
+        state.ready.set()
+        print("🚀 Sistema listo")
+    except Exception as e:
+        state.error = repr(e)
+        print(f"❌ Error preparando el sistema: {e}")
+        return
+    backfill(client)
+
+
+def attach():
+    """Modo worker: espera a que el cargador publique el estado compartido"""
+    from modules.shared_state import SharedMarket
+    market = SharedMarket(SHARED_STATE)
+    market.wait_ready()
+    state.client = state.shared = market
+    state.ready.set()
+    print(f"🔗 Worker {os.getpid()} enlazado a {SHARED_STATE}")
+
+
+def backfill(client):
+    """Precarga el historial de todos los pares y timeframes en la caché de
+    velas. Va con prioridad BACKFILL por el mismo transporte que el
+    dashboard, así que sus peticiones pasan delante en el limitador."""
+    from modules.async_alpaca import AlpacaREST, AsyncAlpacaClient
+    if BACKFILL_DAYS <= 0 or client.cache is None or not isinstance(client.api, AlpacaREST):
+        return
+    http = client.api.http
+    warm = AsyncAlpacaClient(http=http, cache=client.cache, clock=client.clock)
+    try:
+        summary = http.run(warm.warm(FOREX_PAIRS, TIMEFRAMES, days=BACKFILL_DAYS))
+        print(f"📦 Historial precargado: {summary['pairs']} pares × {summary['timeframes']} timeframes, "
+              f"{summary['requests']} peticiones en {summary['seconds']:.1f} s")
+    except Exception as e:
+        print(f"⚠️ Error precargando el historial: {e}")
+
+
+def cache_stats():
+    """{caché: stats} de las cachés del proceso que ya existen"""
+    from modules.chart import figure_cache
+    stats = {"figures": figure_cache.stats()}
+    if state.system is not None:
+        stats["features"] = state.system.feature_cache_stats()
+        stats["models"] = state.system.model_registry_stats()
+        stats["predictions"] = state.system.prediction_cache_stats()
+    return {name: s for name, s in stats.items() if s is not None}
+
+
+def register_gauges():
+    from modules.metrics import registry
+    for field in ("hits", "misses", "evictions"):
+        registry.gauge(f"cache_{field}", f"Acumulado de {field} de cada caché",
+                       lambda field=field: {(name,): s.get(field) for name, s in cache_stats().items()},
+                       ("cache",))
+    registry.gauge("stream_subscribers", "Conexiones abiertas del stream",
+                   lambda: state.hub.stats()["subscribers"] if state.hub is not None else None)
+    registry.gauge("stream_topics", "Pares y timeframes con suscriptores",
+                   lambda: state.hub.stats()["topics"] if state.hub is not None else None)
+    registry.gauge("ready", "1 cuando el sistema de agentes está listo", lambda: int(state.ready.is_set()))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    from modules.stream import StreamHub
+    register_gauges()
+    threading.Thread(target=attach if SHARED_STATE else warm_up, name="warm-up", daemon=True).start()
+    state.hub = StreamHub(stream_update, prices=stream_prices, interval=STREAM_INTERVAL)
+    stream_task = asyncio.create_task(state.hub.run(state.ready))
+    yield
+    stream_task.cancel()
+    if state.system is not None:
+        state.system.shutdown()
+    if state.client is not None:
+        state.client.close()
+    if state.fake_server is not None:
+        state.fake_server.stop()
+
+
+app = FastAPI(title="SOY TU GUÍA - Predictor Forex AI", lifespan=lifespan)
+app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
+
+
+def require_system():
+    if not state.ready.is_set():
+        detail = state.error or "Sistema iniciándose, inténtalo en unos segundos"
+        raise HTTPException(status_code=503, detail=detail)
+    return state.system
+
+
+def load_history(symbol, timeframe):
+    if symbol not in FOREX_PAIRS:
+        raise HTTPException(status_code=404, detail=f"Par desconocido: {symbol}")
+    history = state.client.get_historical_data(symbol, timeframe)
+    if len(history) == 0:
+        raise HTTPException(status_code=503, detail=f"Sin datos para {symbol} {timeframe}")
+    return history
+
+
+def load_market(symbol, timeframe, history=None):
+    """Historial y precio actual de un par para un timeframe"""
+    if history is None:
+        history = load_history(symbol, timeframe)
+    price = state.client.get_current_prices([symbol]).get(symbol) or history[-1]['c']
+    return history, price
+
+
+def consensus(symbol, timeframe, history=None):
+    from modules.predictor import analyze_prediction
+    if state.shared is not None:
+        history = load_history(symbol, timeframe) if history is None else history
+        prediction = state.shared.consensus(symbol, timeframe)
+        if prediction is None:
+            raise HTTPException(status_code=503, detail=f"Sin consenso publicado para {symbol} {timeframe}")
+        return history, prediction
+    history, price = load_market(symbol, timeframe, history)
+    prediction = state.system.consensus(symbol, timeframe, price, history)
+    return history, analyze_prediction({**prediction, "timeframe": timeframe})
+
+
+def stream_update(symbol, timeframe, last_time):
+    """Predicción y delta del gráfico de un tema del stream, solo si hay vela
+    nueva. Las velas se descargan solo cuando toca el cierre de la vela en
+    curso (state.schedule); entre cierres el stream solo envía precios."""
+    from modules.chart import chart_delta
+    from modules.formatter import to_jsonable
+    require_system()
+    if state.shared is None:
+        if last_time is not None and not state.schedule.due(symbol, timeframe):
+            return None
+        try:
+            history = load_history(symbol, timeframe)
+        except HTTPException:
+            state.schedule.fetched(symbol, timeframe, None)
+            raise
+        state.schedule.fetched(symbol, timeframe, int(history[-1]['t']))
+    else:
+        history = load_history(symbol, timeframe)
+    bar_time = int(history[-1]['t'])
+    if bar_time == last_time:
+        return None
+    history, prediction = consensus(symbol, timeframe, history)
+    return bar_time, {
+        "bar_time": bar_time,
+        "prediction": to_jsonable(prediction),
+        "chart_delta": chart_delta(symbol, history, prediction, last_time, timeframe)
+    }
+
+
+def stream_prices(symbols):
+    require_system()
+    return state.client.get_current_prices(symbols)
+
+
+@app.get("/health")
+def health():
+    return {
+        "status": "ok",
+        "ready": state.ready.is_set(),
+        "error": state.error,
+        "stream": state.hub.stats() if state.hub is not None else None,
+        "predictions": state.system.prediction_cache_stats() if state.system is not None else None,
+        "shared": state.shared.stats() if state.shared is not None else None,
+        "journal": state.system.journal_stats() if state.system is not None else None
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Histogramas de tiempos y contadores en formato de texto de Prometheus"""
+    from modules.metrics import render
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def debug_profile(seconds: float = 5.0, interval: float = 0.005, format: str = "json"):
+    """Muestrea las pilas de todos los hilos durante `seconds` (máx. 60);
+    format=collapsed devuelve pilas colapsadas para flamegraph o speedscope.
+    Con SOYTUGUIA_PROFILE_INTERVAL devuelve el perfil continuo acumulado.
+    Solo se registra con SOYTUGUIA_DEBUG=1."""
+    from modules import metrics as instrumentation
+    if not 0 < seconds <= 60 or not 0.001 <= interval <= 1:
+        raise HTTPException(status_code=400, detail="seconds debe estar en (0, 60] e interval en [0.001, 1]")
+    sampler = instrumentation.profiler
+    if sampler is None:
+        sampler = await asyncio.to_thread(instrumentation.profile, seconds, interval)
+    if format == "collapsed":
+        return PlainTextResponse(sampler.collapsed())
+    return sampler.report()
+
+
+if DEBUG:
+    app.get("/debug/profile")(debug_profile)
+
+
+@app.get("/", response_class=HTMLResponse)
+def index(request: Request):
+    if state.templates is None:
+        from fastapi.templating import Jinja2Templates
+        state.templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+    return state.templates.TemplateResponse(request, "index.html", {
+        "timeframes": TIMEFRAME_LABELS,
+        "forex_pairs": FOREX_PAIRS
+    })
+
+
+@app.get("/api/predict/{symbol}/{timeframe}")
+def predict(symbol: str, timeframe: str):
+    from modules.formatter import to_jsonable
+    require_system()
+    _, prediction = consensus(symbol, normalize_timeframe(timeframe))
+    return to_jsonable(prediction)
+
+
+@app.get("/api/chart/{symbol}")
+def chart(symbol: str, timeframe: str = "1m", format: str = "html", since: int = None):
+    """Gráfico como fragmento HTML o, con format=json, la figura para
+    Plotly.newPlot; con since (tiempo de la última vela que ya tiene el
+    cliente) devuelve solo el delta si es posible"""
+    from modules.chart import chart_delta, figure_cache, generate_live_chart
+    require_system()
+    tf = normalize_timeframe(timeframe)
+    history, prediction = consensus(symbol, tf)
+    if format != "json":
+        return {"chart": generate_live_chart(symbol, history, prediction, tf)}
+    if since is not None:
+        delta = chart_delta(symbol, history, prediction, since, tf)
+        if delta is not None:
+            return {"delta": delta}
+    return {"figure": figure_cache.get(symbol, history, prediction, tf)}
+
+
+def load_universe(symbols, timeframes):
+    """Historiales {(par, tf): historial} y precios de todos los pares, con un
+    hilo por par para que sus timeframes compartan la descarga de M1"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def load_pair(symbol):
+        return {(symbol, tf): state.client.get_historical_data(symbol, tf) for tf in timeframes}
+
+    histories = {}
+    with ThreadPoolExecutor(max_workers=8, thread_name_prefix="scan") as pool:
+        for loaded in pool.map(load_pair, symbols):
+            histories.update((key, history) for key, history in loaded.items() if len(history))
+    prices = dict(state.client.get_current_prices(symbols))
+    for (symbol, _), history in histories.items():
+        if prices.get(symbol) is None:
+            prices[symbol] = history[-1]['c']
+    return histories, prices
+
+
+@app.get("/api/scan")
+def scan(top: int = 10, direction: str = None, min_agents: int = 0,
+         timeframes: str = None, pairs: str = None):
+    """Consenso de todos los pares y timeframes (o los indicados, separados por
+    comas) en un barrido, ordenado por score y confianza: las top señales más
+    fuertes que cumplen los filtros"""
+    import time
+    from modules.formatter import to_jsonable
+    require_system()
+    symbols = pairs.split(",") if pairs else FOREX_PAIRS
+    tfs = [normalize_timeframe(tf) for tf in timeframes.split(",")] if timeframes else TIMEFRAMES
+    unknown = [s for s in symbols if s not in FOREX_PAIRS] + [tf for tf in tfs if tf not in TIMEFRAMES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Desconocidos: {', '.join(unknown)}")
+    direction = direction.upper() if direction else None
+    if direction not in (None, "BUY", "SELL", "HOLD"):
+        raise HTTPException(status_code=400, detail="direction debe ser BUY, SELL o HOLD")
+    started = time.perf_counter()
+    if state.shared is not None:
+        from modules.system import rank_entries
+        entries, missing = state.shared.scan_entries(symbols, tfs)
+        return to_jsonable({
+            "results": rank_entries(list(entries.values()), max(top, 0) or None, direction, min_agents),
+            "scanned": len(entries),
+            "missing": sorted(f"{pair}:{tf}" for pair, tf in missing),
+            "load_seconds": 0.0,
+            "seconds": time.perf_counter() - started
+        })
+    histories, prices = load_universe(symbols, tfs)
+    loaded = time.perf_counter()
+    results = state.system.scan(prices, histories, top=max(top, 0) or None,
+                                direction=direction, min_agents=min_agents)
+    return to_jsonable({
+        "results": results,
+        "scanned": len(histories),
+        "missing": sorted(f"{pair}:{tf}" for pair in symbols for tf in tfs if (pair, tf) not in histories),
+        "load_seconds": loaded - started,
+        "seconds": time.perf_counter() - started
+    })
+
+
+@app.get("/api/signals/{symbol}")
+def signals(symbol: str, start: str = None, end: str = None, timeframe: str = None, limit: int = 500):
+    """Señales del diario para un par con start <= t < end (ms desde epoch o
+    fechas ISO en UTC), de la más antigua a la más reciente; con limit, las
+    más recientes. En modo worker lee el diario que escribe el cargador."""
+    from modules.journal import JOURNAL_DIR, query
+    if not JOURNAL_DIR:
+        raise HTTPException(status_code=404, detail="Diario de señales desactivado")
+    if symbol not in FOREX_PAIRS:
+        raise HTTPException(status_code=404, detail=f"Par desconocido: {symbol}")
+    tf = normalize_timeframe(timeframe) if timeframe else None
+    if tf is not None and tf not in TIMEFRAMES:
+        raise HTTPException(status_code=400, detail=f"Timeframe desconocido: {timeframe}")
+    try:
+        found = query(JOURNAL_DIR, symbol, start, end, tf, max(limit, 0) or None)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start y end deben ser ms desde epoch o fechas ISO")
+    return {"pair": symbol, "signals": found, "count": len(found)}
+
+
+@app.get("/api/patterns")
+def patterns(pairs: str = None, timeframes: str = None, patterns: str = None,
+             bias: str = None, lookback: int = 1):
+    """Patrones de velas de las últimas `lookback` velas en todos los pares y
+    timeframes (o los indicados, separados por comas), los más recientes primero"""
+    import time
+    from modules.patterns import PATTERNS, scan_market
+    require_system()
+    symbols = pairs.split(",") if pairs else FOREX_PAIRS
+    tfs = [normalize_timeframe(tf) for tf in timeframes.split(",")] if timeframes else TIMEFRAMES
+    names = patterns.split(",") if patterns else None
+    unknown = [s for s in symbols if s not in FOREX_PAIRS] + [tf for tf in tfs if tf not in TIMEFRAMES]
+    unknown += [name for name in names or () if name not in PATTERNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Desconocidos: {', '.join(unknown)}")
+    if lookback < 1:
+        raise HTTPException(status_code=400, detail="lookback debe ser al menos 1")
+    started = time.perf_counter()
+    matches, missing = scan_market(state.client.get_historical_data, symbols, tfs, names,
+                                   lookback=lookback, bias=bias.upper() if bias else None)
+    return {
+        "matches": matches,
+        "scanned": len(symbols) * len(tfs),
+        "missing": [f"{pair}:{tf}" for pair, tf in missing],
+        "seconds": time.perf_counter() - started
+    }
+
+
+@app.websocket("/ws/stream")
+async def stream(websocket: WebSocket):
+    """Una conexión por navegador para todos sus pares
+
+    El cliente envía {"action": "subscribe" | "unsubscribe", "pair": "EURUSD",
+    "timeframe": "1m"} y recibe mensajes "signal" (predicción y delta del
+    gráfico, una vez por vela nueva), "price" y "error". La figura completa
+    se pide una vez a /api/chart/{par}?format=json.
+    """
+    await websocket.accept()
+    hub = state.hub
+    subscriber = hub.connect()
+
+    async def sender():
+        try:
+            while True:
+                for message in await subscriber.next_batch():
+                    await websocket.send_json(message)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+
+    send_task = asyncio.create_task(sender())
+    try:
+        while True:
+            request = await websocket.receive_json()
+            pair = str(request.get("pair", ""))
+            timeframe = normalize_timeframe(str(request.get("timeframe", "1m")))
+            if pair not in FOREX_PAIRS or timeframe not in TIMEFRAMES:
+                await websocket.send_json({"type": "error", "pair": pair, "timeframe": timeframe,
+                                           "detail": "Par o timeframe desconocido"})
+            elif request.get("action") == "subscribe":
+                hub.subscribe(subscriber, pair, timeframe)
+            elif request.get("action") == "unsubscribe":
+                hub.unsubscribe(subscriber, pair, timeframe)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        send_task.cancel()
+        hub.disconnect(subscriber)
+
+
+def run_loader(path):
+    """Proceso cargador: prepara cliente y agentes como un servidor de un
+    solo proceso y publica en path precios, velas y consensos cada
+    STREAM_INTERVAL segundos hasta recibir SIGTERM"""
+    import signal
+    from modules.shared_state import Publisher, SharedState
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    warm_up()
+    if state.error is not None:
+        return 1
+    store = SharedState.create(path, FOREX_PAIRS, TIMEFRAMES)
+    print(f"📡 Cargador {os.getpid()} publicando en {path}")
+    try:
+        Publisher(store, state.client, state.system).run(stop, STREAM_INTERVAL)
+    finally:
+        state.system.shutdown()
+        state.client.close()
+        if state.fake_server is not None:
+            state.fake_server.stop()
+        if store.current():
+            os.unlink(path)
+    return 0
+
+
+def serve(argv=None):
+    """python main.py serve [--workers N]: con N > 1, un proceso cargador y N
+    workers de uvicorn que leen de su estado compartido"""
+    import argparse
+    import subprocess
+    import sys
+    import uvicorn
+    from modules.shared_state import default_path
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Servidor web con uno o varios workers")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--shared-state", help="fichero del estado compartido (por defecto en /dev/shm)")
+    args = parser.parse_args(argv)
+    if args.workers <= 1:
+        uvicorn.run(app, host=args.host, port=args.port)
+        return 0
+    path = args.shared_state or default_path(args.port)
+    loader = subprocess.Popen([sys.executable, os.path.abspath(__file__), "loader", path], cwd=BASE_DIR)
+    os.environ["SOYTUGUIA_SHARED_STATE"] = path
+    try:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, app_dir=BASE_DIR)
+    finally:
+        loader.terminate()
+        loader.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:2] == ["train"]:
+        from modules.training import main as train_main
+        raise SystemExit(train_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["backtest"]:
+        from modules.backtest import main as backtest_main
+        raise SystemExit(backtest_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["compile"]:
+        from modules.tree_ensemble import main as compile_main
+        raise SystemExit(compile_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["bundle"]:
+        from modules.bundle import main as bundle_main
+        raise SystemExit(bundle_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["journal"]:
+        from modules.journal import main as journal_main
+        raise SystemExit(journal_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["serve"]:
+        raise SystemExit(serve(sys.argv[2:]))
+    if sys.argv[1:2] == ["loader"]:
+        raise SystemExit(run_loader(sys.argv[2]))
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8000")))
@@ -1,20 +1,54 @@
 # modules/__init__.py
 # Hace que "modules" sea un paquete importable
+#
+# Los submódulos se cargan al primer acceso a cada nombre (PEP 562): importar
+# "modules" no arrastra pandas, scikit-learn, XGBoost, LightGBM ni Alpaca.
+# La caché compartida de indicadores está en modules.feature_store.feature_store.
 
-from .ml_agents import BaseAgent, TrendAgent, MomentumAgent, VolatilityAgent, PatternAgent, ScalpingAgent, NewsAgent
-from .coordinator import MasterCoordinator
-from .system import ForexMultiAgentSystem
-from .alpaca_client import AlpacaRealClient
+import importlib
 
-__all__ = [
-    'BaseAgent',
-    'TrendAgent',
-    'MomentumAgent',
-    'VolatilityAgent',
-    'PatternAgent',
-    'ScalpingAgent',
-    'NewsAgent',
-    'MasterCoordinator',
-    'ForexMultiAgentSystem',
-    'AlpacaRealClient'
-]
+_EXPORTS = {
+    'BaseAgent': 'ml_agents',
+    'TrendAgent': 'ml_agents',
+    'MomentumAgent': 'ml_agents',
+    'VolatilityAgent': 'ml_agents',
+    'PatternAgent': 'ml_agents',
+    'ScalpingAgent': 'ml_agents',
+    'NewsAgent': 'ml_agents',
+    'MasterCoordinator': 'coordinator',
+    'ForexMultiAgentSystem': 'system',
+    'AlpacaRealClient': 'alpaca_client',
+    'AsyncAlpacaClient': 'async_alpaca',
+    'BarCache': 'bar_cache',
+    'FakeREST': 'fake_alpaca',
+    'FakeAlpacaServer': 'fake_alpaca',
+    'FeatureStore': 'feature_store',
+    'IndicatorEngine': 'indicators',
+    'IncrementalIndicators': 'indicators',
+    'indicator_engine': 'indicators',
+    'CandleBuffer': 'candles',
+    'CandleStore': 'candles',
+    'CandleView': 'candles',
+    'TreeEnsemble': 'tree_ensemble',
+    'compile_model': 'tree_ensemble',
+    'ModelBundle': 'bundle',
+    'BundleWriter': 'bundle',
+    'SignalJournal': 'journal',
+    'ModelRegistry': 'registry',
+    'model_registry': 'registry'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,81 +1,336 @@
 # modules/alpaca_client.py
-import alpaca_trade_api as tradeapi
-from datetime import datetime, timedelta
-import pandas as pd
+from datetime import datetime, timedelta, timezone
+import numpy as np
 import os
+import threading
+import time
+from .bar_cache import BarCache, as_records
+from .candles import COLUMNS, CandleStore, CandleView
+from .config import TIMEFRAME_MS
+from .metrics import upstream_seconds, upstream_errors, swallow
+from .quotes import QuoteCache
+from .resample import BASE_TIMEFRAME, derive_timeframe
+
+ALPACA_TIMEFRAMES = {
+    "M1": "1Min", "M5": "5Min", "M15": "15Min",
+    "M30": "30Min", "H1": "1Hour", "H4": "4Hour", "D1": "1Day"
+}
+# Pares que se usan si la API no devuelve la lista de activos
+FALLBACK_PAIRS = (
+    "EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "USDCAD", "USDCHF",
+    "NZDUSD", "EURGBP", "EURJPY", "GBPJPY", "AUDJPY", "AUDNZD"
+)
+# "pooled": transporte de modules.async_alpaca (conexiones reutilizadas,
+# cuota y reintentos); "tradeapi": el cliente REST de alpaca_trade_api
+TRANSPORT = os.environ.get("SOYTUGUIA_ALPACA_TRANSPORT", "pooled")
+# Espera inicial y máxima (segundos) para volver a pedir velas que aún no
+# han llegado tras el cierre de una vela (o con el mercado cerrado)
+RETRY_SECONDS = 15.0
+MAX_RETRY_SECONDS = 900.0
+
+
+def to_symbol(pair):
+    return f"{pair[:3]}/{pair[3:]}" if len(pair) == 6 else pair
+
+
+def _upstream(call, fn, *args, **kwargs):
+    """Llamada a la API con su duración y sus errores en las métricas"""
+    try:
+        with upstream_seconds.time(call):
+            return fn(*args, **kwargs)
+    except Exception:
+        upstream_errors.inc(call)
+        raise
+
+
+def _bar_ms(bar):
+    """Tiempo (ms) de una vela de la API, si lo trae"""
+    t = getattr(bar, "t", None)
+    if t is None:
+        return None
+    if isinstance(t, (int, float)):
+        return int(t)
+    try:
+        import pandas as pd
+        return int(pd.Timestamp(t).value // 1_000_000)
+    except (TypeError, ValueError):
+        return None
+
+
+def _unsupported(error):
+    """¿El error indica que la API no tiene la llamada (y no un fallo pasajero)?"""
+    if isinstance(error, (AttributeError, NotImplementedError)):
+        return True
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    return status in (404, 405, 501)
+
+
+class BarSchedule:
+    """Cuándo toca volver a descargar las velas de cada (par, timeframe)
+
+    Solo al cerrar la vela en curso: entre cierres la última vela descargada
+    sigue siendo la misma y basta con los precios. Si tras el cierre la API
+    aún no tiene la vela nueva se reintenta con espera creciente, de retry a
+    max_retry segundos. clock da la hora en segundos epoch.
+    """
+    def __init__(self, clock=None, retry=RETRY_SECONDS, max_retry=MAX_RETRY_SECONDS):
+        self.clock = clock or time.time
+        self.retry = retry
+        self.max_retry = max_retry
+        # (par, tf) -> (ms en que toca volver a descargar, reintentos sin vela nueva)
+        self._due = {}
+        self._lock = threading.Lock()
+
+    def due(self, pair, timeframe):
+        with self._lock:
+            due, _ = self._due.get((pair, timeframe), (0, 0))
+        return self.clock() * 1000 >= due
+
+    def fetched(self, pair, timeframe, last_time):
+        """Registra una descarga cuya última vela empieza en last_time (ms, o
+        None si no llegó nada)"""
+        now = int(self.clock() * 1000)
+        close = last_time + TIMEFRAME_MS.get(timeframe, 60_000) if last_time is not None else 0
+        with self._lock:
+            _, retries = self._due.get((pair, timeframe), (0, 0))
+            if close > now:
+                self._due[(pair, timeframe)] = (close, 0)
+            else:
+                delay = min(self.retry * 2 ** retries, self.max_retry)
+                self._due[(pair, timeframe)] = (now + int(delay * 1000), retries + 1)
+
 
 class AlpacaRealClient:
-    def __init__(self, api_key=None, secret_key=None):
+    """Cliente de datos de mercado
+
+    api permite inyectar otro objeto con el interfaz de alpaca_trade_api.REST
+    (p. ej. modules.fake_alpaca.FakeREST para trabajar sin red). Las velas
+    descargadas se guardan en una BarCache en disco; cache=False la desactiva.
+
+    Con caché y resample=True solo se descarga M1 y el resto de timeframes se
+    agregan en local (una petición por par en lugar de una por timeframe).
+    Las peticiones de un mismo (par, timeframe) que llegan a menos de
+    min_refresh segundos de la última descarga reutilizan lo ya cacheado.
+    clock (segundos epoch) fija el final de las ventanas de historial; por
+    defecto, la hora actual.
+    """
+    def __init__(self, api_key=None, secret_key=None, candles=None, api=None, cache=None,
+                 resample=True, min_refresh=1.0, quote_ttl=None, quote_workers=8, clock=None):
+        self.clock = clock or time.time
+        self.candles = candles or CandleStore()
+        self.cache = BarCache() if cache is None else (cache or None)
+        self.resample = resample
+        self.min_refresh = min_refresh
+        self._covered = {}
+        self._refreshed = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.quotes = QuoteCache(self._latest_bars, ttl=quote_ttl)
+        self.quote_workers = quote_workers
+        self._quote_pool = None
+        self._batch_quotes = True
         self.api_key = api_key or os.environ.get("ALPACA_API_KEY")
         self.secret_key = secret_key or os.environ.get("ALPACA_SECRET_KEY")
-        self.api = tradeapi.REST(
-            self.api_key,
-            self.secret_key,
-            'https://paper-api.alpaca.markets',
-            api_version='v2'
-        )
-        print("✅ Conectado a Alpaca Markets (Paper Trading)")
+        if api is None:
+            if TRANSPORT == "tradeapi":
+                import alpaca_trade_api as tradeapi
+                api = tradeapi.REST(
+                    self.api_key,
+                    self.secret_key,
+                    'https://paper-api.alpaca.markets',
+                    api_version='v2'
+                )
+            else:
+                from .async_alpaca import AlpacaHTTP, AlpacaREST
+                api = AlpacaREST(AlpacaHTTP(self.api_key, self.secret_key))
+            print("✅ Conectado a Alpaca Markets (Paper Trading)")
+        self.api = api
         try:
-            account = self.api.get_account()
+            account = _upstream("get_account", self.api.get_account)
             print(f"💰 Balance: ${float(account.cash):,.2f}")
         except Exception as e:
             print(f"⚠️ Error al obtener cuenta: {e}")
     
     def get_all_forex_pairs(self):
         try:
-            assets = self.api.list_assets(status='active', asset_class='forex')
+            assets = _upstream("list_assets", self.api.list_assets, status='active', asset_class='forex')
             pairs = [asset.symbol.replace("/", "") for asset in assets if asset.tradable]
             print(f"📊 {len(pairs)} pares de forex disponibles")
             return pairs
         except Exception as e:
             print(f"Error obteniendo pares: {e}")
-            return [
-                "EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "USDCAD", "USDCHF",
-                "NZDUSD", "EURGBP", "EURJPY", "GBPJPY", "AUDJPY", "AUDNZD"
-            ]
+            return list(FALLBACK_PAIRS)
     
-    def get_historical_data(self, pair, timeframe="1Hour", days=30):
+    def _fetch_bars(self, pair, timeframe, start, end):
+        """Velas de la API entre start y end (datetimes) como array de registros"""
+        bars = _upstream(
+            "get_bars", self.api.get_bars,
+            to_symbol(pair),
+            ALPACA_TIMEFRAMES.get(timeframe, "1Hour"),
+            start=start.isoformat(),
+            end=end.isoformat()
+        ).df
+        if bars.empty:
+            return None
+        volume = bars["volume"].to_numpy() if "volume" in bars.columns else np.zeros(len(bars))
+        return as_records(
+            bars.index.as_unit("ms").asi8,
+            bars["open"].to_numpy(dtype=float),
+            bars["high"].to_numpy(dtype=float),
+            bars["low"].to_numpy(dtype=float),
+            bars["close"].to_numpy(dtype=float),
+            volume.astype(np.int64)
+        )
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _top_up(self, pair, timeframe, start, end):
+        """Descarga solo lo que falta en la caché para cubrir [start, end]
+
+        Se pide desde la última vela cacheada (incluida, porque puede ser la
+        vela en formación) y, si la ventana pedida empieza antes que lo que ya
+        se había pedido (al menos una vela antes), también ese tramo inicial.
+        Las llamadas concurrentes para la misma clave esperan a la primera.
+        """
+        with self._key_lock((pair, timeframe)):
+            self._top_up_locked(pair, timeframe, start, end)
+
+    def _top_up_locked(self, pair, timeframe, start, end):
+        key = (pair, timeframe)
+        start_ms = int(start.timestamp() * 1000)
+        covered = self._covered.get(key)
+        refreshed = self._refreshed.get(key)
+        if (refreshed is not None and covered <= start_ms
+                and time.monotonic() - refreshed < self.min_refresh):
+            return
+        last = self.cache.last_time(pair, timeframe)
+        if covered is None and last is not None:
+            covered = self.cache.first_time(pair, timeframe)
+        if last is None or last < start_ms:
+            fetches = [(start, end)]
+        else:
+            fetches = [(datetime.fromtimestamp(last / 1000, tz=timezone.utc), end)]
+            if covered - start_ms >= TIMEFRAME_MS.get(timeframe, 3_600_000):
+                fetches.append((start, datetime.fromtimestamp(covered / 1000, tz=timezone.utc)))
+        for fetch_start, fetch_end in fetches:
+            records = self._fetch_bars(pair, timeframe, fetch_start, fetch_end)
+            if records is not None:
+                self.cache.merge(pair, timeframe, records)
+        self._covered[key] = start_ms if last is None else min(covered, start_ms)
+        self._refreshed[key] = time.monotonic()
+
+    def _refresh_cache(self, pair, timeframe, start, end):
+        """Completa la caché para [start, end]; los errores se avisan y se sirve lo cacheado"""
+        try:
+            if self.resample and timeframe != BASE_TIMEFRAME and timeframe in TIMEFRAME_MS:
+                self._top_up(pair, BASE_TIMEFRAME, start, end)
+                derive_timeframe(self.cache, pair, timeframe)
+            else:
+                self._top_up(pair, timeframe, start, end)
+        except Exception as e:
+            swallow("history_refresh", e)
+            print(f"Error actualizando datos de {pair}: {e}")
+
+    def get_historical_data(self, pair, timeframe="1Hour", days=30, refresh=True):
+        """Últimos `days` días de velas, cargados en el CandleStore
+
+        Con caché solo se descargan las velas posteriores a la última guardada
+        (de M1 si el timeframe se deriva); con refresh=False no se toca la red.
+        Si la API falla se sirve lo que haya en la caché.
+        """
+        end = datetime.fromtimestamp(self.clock(), tz=timezone.utc)
+        start = end - timedelta(days=days)
         try:
-            symbol = f"{pair[:3]}/{pair[3:]}" if len(pair) == 6 else pair
-            end = datetime.now()
-            start = end - timedelta(days=days)
-            tf_map = {
-                "M1": "1Min", "M5": "5Min", "M15": "15Min",
-                "M30": "30Min", "H1": "1Hour", "H4": "4Hour", "D1": "1Day"
-            }
-            bars = self.api.get_bars(
-                symbol,
-                tf_map.get(timeframe, "1Hour"),
-                start=start.isoformat(),
-                end=end.isoformat()
-            ).df
-            
-            if not bars.empty:
-                history = []
-                for index, row in bars.iterrows():
-                    history.append({
-                        "timestamp": index.isoformat(),
-                        "o": float(row["open"]),
-                        "h": float(row["high"]),
-                        "l": float(row["low"]),
-                        "c": float(row["close"]),
-                        "v": int(row["volume"]) if "volume" in row else 0,
-                        "t": index.timestamp() * 1000
-                    })
-                return history
+            if self.cache is None:
+                records = self._fetch_bars(pair, timeframe, start, end)
+            else:
+                if refresh:
+                    self._refresh_cache(pair, timeframe, start, end)
+                records = self.cache.read(pair, timeframe, start=int(start.timestamp() * 1000))
+            if records is not None and len(records):
+                # Columnas directamente al buffer, sin pasar por un dict por vela
+                return self.candles.load(pair, timeframe, *(records[col] for col in COLUMNS))
         except Exception as e:
+            swallow("history", e)
             print(f"Error obteniendo datos de {pair}: {e}")
         return []
+
+    def read_history(self, pair, timeframe, days):
+        """Todas las velas de los últimos `days` días, sin el límite de
+        capacidad del CandleStore (entrenamiento y backtesting)"""
+        if self.cache is None:
+            return self.get_historical_data(pair, timeframe, days=days)
+        end = datetime.fromtimestamp(self.clock(), tz=timezone.utc)
+        start = end - timedelta(days=days)
+        self._refresh_cache(pair, timeframe, start, end)
+        return self.read_cached(pair, timeframe, start=int(start.timestamp() * 1000))
+
+    def read_cached(self, pair, timeframe, start=None, end=None):
+        """Velas cacheadas con start <= t < end (ms) sin tocar la red ni el CandleStore"""
+        if self.cache is None:
+            return CandleView(*(np.empty(0, dtype=np.int64 if col in 'tv' else float) for col in COLUMNS))
+        records = self.cache.read(pair, timeframe, start, end)
+        return CandleView(*(np.ascontiguousarray(records[col]) for col in COLUMNS))
     
-    def get_current_prices(self, pairs):
-        prices = {}
-        for pair in pairs:
+    def _latest_bars(self, pairs):
+        """Última vela de cada par: una petición por lotes si la API la tiene,
+        si no, peticiones individuales en paralelo (como mucho quote_workers)"""
+        prices, errors = {}, {}
+        symbols = {to_symbol(pair): pair for pair in pairs}
+        batch = getattr(self.api, "get_latest_bars", None) if self._batch_quotes else None
+        if batch is not None:
             try:
-                symbol = f"{pair[:3]}/{pair[3:]}" if len(pair) == 6 else pair
-                bar = self.api.get_latest_bar(symbol)
-                if bar:
-                    prices[pair] = float(bar.c)
+                bars = _upstream("get_latest_bars", batch, list(symbols))
+                for symbol, pair in symbols.items():
+                    bar = bars.get(symbol)
+                    if bar:
+                        prices[pair] = (float(bar.c), _bar_ms(bar))
+                return prices, errors
             except Exception as e:
-                print(f"Error obteniendo precio de {pair}: {e}")
-                prices[pair] = 0
-        return prices
+                if _unsupported(e):
+                    self._batch_quotes = False
+                    print(f"⚠️ Precios por lotes no disponibles ({e}), se piden por par")
+                else:
+                    # Fallo pasajero (5xx, 429, timeout): solo esta vez por par
+                    swallow("quotes_batch", e)
+                    print(f"⚠️ Error pidiendo precios por lotes ({e}), esta vez se piden por par")
+
+        def one(pair):
+            try:
+                return pair, _upstream("get_latest_bar", self.api.get_latest_bar, to_symbol(pair)), None
+            except Exception as e:
+                return pair, None, repr(e)
+
+        if self._quote_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._quote_pool = ThreadPoolExecutor(max_workers=self.quote_workers,
+                                                  thread_name_prefix="quotes")
+        for pair, bar, error in self._quote_pool.map(one, pairs):
+            if bar:
+                prices[pair] = (float(bar.c), _bar_ms(bar))
+            elif error:
+                print(f"Error obteniendo precio de {pair}: {error}")
+                errors[pair] = error
+        return prices, errors
+
+    def get_current_prices(self, pairs):
+        """Precios actuales (Prices: dict par -> precio)
+
+        Los pares sin precio no se rellenan con 0: quedan en .missing con el
+        motivo. Los precios se reutilizan durante quotes.ttl segundos y las
+        peticiones simultáneas de los mismos pares comparten una descarga.
+        """
+        return self.quotes.get(pairs)
+
+    def close(self):
+        if self._quote_pool is not None:
+            self._quote_pool.shutdown(wait=False)
+            self._quote_pool = None
+        close = getattr(self.api, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,626 @@
+# modules/async_alpaca.py
+# Capa de datos asíncrona para Alpaca: una sesión HTTP (aiohttp) con
+# conexiones reutilizadas, un cubo de fichas ajustado a la cuota de la API
+# con colas por prioridad (las peticiones del dashboard pasan delante de la
+# descarga masiva de historial) y reintentos con espera exponencial aleatoria.
+#
+# AsyncAlpacaClient devuelve lo mismo que AlpacaRealClient, en corrutinas.
+# AlpacaREST ofrece al cliente síncrono el interfaz de alpaca_trade_api.REST
+# que usa, sobre el mismo transporte. Un AlpacaHTTP vive en un único bucle
+# de eventos; run() lo arranca en un hilo propio para llamarlo desde código
+# síncrono.
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+
+from .alpaca_client import ALPACA_TIMEFRAMES, FALLBACK_PAIRS, to_symbol
+from .bar_cache import BarCache, as_records
+from .candles import COLUMNS, CandleStore
+from .config import TIMEFRAME_MS
+from .metrics import rate_limit_wait_seconds, upstream_errors, upstream_retries, upstream_seconds, swallow
+from .quotes import Prices
+from .resample import BASE_TIMEFRAME, derive_timeframe
+
+# Prioridades de las colas del limitador (menor = antes)
+LIVE = 0
+BACKFILL = 1
+PRIORITY_NAMES = {LIVE: "live", BACKFILL: "backfill"}
+
+# Cuota de la API de datos (peticiones por minuto; 200 en el plan gratuito)
+REQUESTS_PER_MINUTE = float(os.environ.get("SOYTUGUIA_ALPACA_RPM", "200"))
+MAX_CONNECTIONS = int(os.environ.get("SOYTUGUIA_ALPACA_CONNECTIONS", "16"))
+TRADING_URL = os.environ.get("APCA_API_BASE_URL", "https://paper-api.alpaca.markets")
+DATA_URL = os.environ.get("APCA_API_DATA_URL", "https://data.alpaca.markets")
+# Máximo de velas por página de /v2/stocks/bars
+PAGE_LIMIT = 10_000
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+# Respuestas (bytes) a partir de las que el JSON se decodifica en un hilo
+LARGE_BODY = 256 * 1024
+
+
+class AlpacaAPIError(Exception):
+    """Respuesta HTTP de error de la API"""
+    def __init__(self, status, body, url=None):
+        super().__init__(f"HTTP {status} en {url}: {body[:200]}")
+        self.status = status
+        self.body = body
+        self.url = url
+
+
+def _retry_after(value):
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def rfc3339(ms):
+    """Milisegundos epoch -> '2025-01-01T00:00:00.000Z'"""
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.") + f"{ms % 1000:03d}Z"
+
+
+def _timestamp_ms(value):
+    import pandas as pd
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+
+def _parse_times(stamps):
+    """Tiempos RFC 3339 -> ms epoch; en numpy si todos vienen en UTC con 'Z'
+    (lo que devuelve la API), si no con pandas"""
+    try:
+        return np.array([s[:-1] for s in stamps], dtype="datetime64[ms]").astype(np.int64)
+    except ValueError:
+        import pandas as pd
+        return pd.to_datetime(stamps, utc=True).as_unit("ms").asi8
+
+
+def bar_records(bars):
+    """Velas JSON de la API ({t, o, h, l, c, v, ...}) -> registros de la BarCache"""
+    if not bars:
+        return None
+    t = _parse_times([bar["t"] for bar in bars])
+    values = np.array([(bar["o"], bar["h"], bar["l"], bar["c"], bar.get("v", 0)) for bar in bars], dtype=float)
+    return as_records(t, values[:, 0], values[:, 1], values[:, 2], values[:, 3], values[:, 4].astype(np.int64))
+
+
+class TokenBucket:
+    """Cubo de fichas con colas por prioridad
+
+    Hay `capacity` fichas; cada petición gasta una, que vuelve al cubo
+    `period` segundos después. Así nunca salen más de capacity peticiones en
+    ninguna ventana de period segundos (como cuenta la cuota la API) y una
+    precarga en frío puede usar la cuota de golpe. Las últimas `reserve`
+    fichas son solo para LIVE, de modo que una precarga que agota lo suyo no
+    deja al dashboard esperando a que vuelvan fichas.
+
+    Sin ficha, la petición espera en un heap ordenado por (prioridad,
+    llegada): una LIVE adelanta a todas las BACKFILL que estén esperando,
+    nunca a una que ya tenga su ficha. block() corta la entrega durante unos
+    segundos (tras un 429 de la API). Solo se usa desde un bucle de eventos.
+    """
+    def __init__(self, capacity, period=60.0, reserve=0, clock=time.monotonic):
+        self.capacity = capacity
+        self.period = period
+        self.reserve = min(reserve, capacity - 1)
+        self.clock = clock
+        self.granted = {}
+        self.waited = {}
+        self.max_queue = 0
+        self._spent = deque()
+        self._blocked_until = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._dispatcher = None
+        self._wakeup = None
+
+    def _limit(self, priority):
+        return self.capacity if priority <= LIVE else self.capacity - self.reserve
+
+    def _expire(self, now):
+        while self._spent and now - self._spent[0] >= self.period:
+            self._spent.popleft()
+
+    def available(self, priority=LIVE):
+        """Fichas que puede gastar ahora mismo una petición de esa prioridad"""
+        now = self.clock()
+        self._expire(now)
+        if now < self._blocked_until:
+            return 0
+        return max(self._limit(priority) - len(self._spent), 0)
+
+    def _delay(self, priority):
+        """Segundos hasta que haya ficha para `priority`"""
+        now = self.clock()
+        self._expire(now)
+        wait = max(self._blocked_until - now, 0.0)
+        excess = len(self._spent) - self._limit(priority)
+        if excess >= 0:
+            wait = max(wait, self._spent[excess] + self.period - now)
+        return wait
+
+    def _record(self, priority, waited):
+        self.granted[priority] = self.granted.get(priority, 0) + 1
+        self.waited[priority] = self.waited.get(priority, 0.0) + waited
+        rate_limit_wait_seconds.observe(waited, PRIORITY_NAMES.get(priority, str(priority)))
+
+    async def acquire(self, priority=LIVE):
+        """Espera una ficha; devuelve los segundos de espera"""
+        # Pasa directamente si nadie de su prioridad o mayor está esperando
+        ahead = self._waiters and self._waiters[0][0] <= priority
+        if not ahead and self.available(priority) > 0:
+            self._spent.append(self.clock())
+            self._record(priority, 0.0)
+            return 0.0
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.max_queue = max(self.max_queue, len(self._waiters))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+        elif self._waiters[0][2] is future:
+            # Nueva cabeza de la cola: puede que su espera sea más corta
+            self._wakeup.set()
+        start = self.clock()
+        await future
+        waited = self.clock() - start
+        self._record(priority, waited)
+        return waited
+
+    async def _dispatch(self):
+        while self._waiters:
+            while self._waiters:
+                priority, _, future = self._waiters[0]
+                # Uno cancelado mientras esperaba no gasta ficha
+                if future.done():
+                    heapq.heappop(self._waiters)
+                elif self.available(priority) > 0:
+                    heapq.heappop(self._waiters)
+                    self._spent.append(self.clock())
+                    future.set_result(None)
+                else:
+                    break
+            if self._waiters:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(self._delay(self._waiters[0][0]), 0.001))
+                except asyncio.TimeoutError:
+                    pass
+
+    def block(self, seconds):
+        """Sin fichas durante `seconds` segundos"""
+        self._blocked_until = max(self._blocked_until, self.clock() + seconds)
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "reserve": self.reserve,
+            "period": self.period,
+            "available": self.available(),
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "granted": {PRIORITY_NAMES.get(p, p): n for p, n in self.granted.items()},
+            "waited_seconds": {PRIORITY_NAMES.get(p, p): round(s, 3) for p, s in self.waited.items()}
+        }
+
+
+class AlpacaHTTP:
+    """Transporte compartido: sesión aiohttp con pool de conexiones, cabeceras
+    de autenticación, limitador de cuota y reintentos
+
+    El limitador deja pasar como mucho rpm peticiones por ventana de `period`
+    segundos (un minuto en la API) menos un margen (headroom, en proporción)
+    para el desfase entre el reloj local y el de la API y para otros clientes
+    con las mismas claves; live_share de esa cuota y live_connections de las
+    conexiones quedan reservadas a las peticiones LIVE. Los 429, los 5xx y
+    los errores de red se reintentan hasta `retries` veces con espera
+    exponencial con jitter completo (aleatoria entre 0 y backoff *
+    2^intento, como mucho max_backoff), respetando Retry-After; un 429
+    además para el limitador.
+    """
+    def __init__(self, api_key=None, secret_key=None, trading_url=None, data_url=None, rpm=None,
+                 period=60.0, headroom=0.05, live_share=0.25, max_connections=None, live_connections=4,
+                 retries=5, backoff=0.5, max_backoff=30.0, timeout=30.0, seed=None):
+        self.api_key = api_key or os.environ.get("ALPACA_API_KEY")
+        self.secret_key = secret_key or os.environ.get("ALPACA_SECRET_KEY")
+        self.trading_url = (trading_url or TRADING_URL).rstrip("/")
+        self.data_url = (data_url or DATA_URL).rstrip("/")
+        rpm = rpm or REQUESTS_PER_MINUTE
+        capacity = max(int(rpm * (1 - headroom)), 1)
+        self.limiter = TokenBucket(capacity, period=period, reserve=int(capacity * live_share))
+        self.max_connections = max_connections or MAX_CONNECTIONS
+        self.live_connections = live_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.requests = 0
+        self.retried = 0
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._session = None
+        self._slots = None
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def delay(self, attempt):
+        """Espera antes del reintento `attempt` (0, 1, ...): jitter completo"""
+        return self._random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            headers = {}
+            if self.api_key and self.secret_key:
+                headers = {"APCA-API-KEY-ID": self.api_key, "APCA-API-SECRET-KEY": self.secret_key}
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=headers
+            )
+        return self._session
+
+    def _backfill_slots(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(self.max_connections - self.live_connections, 1))
+        return self._slots
+
+    async def _request(self, session, call, url, params, priority):
+        """(status, cuerpo, Retry-After) de un GET; la ficha se pide con la
+        conexión ya asegurada para que el instante apuntado sea el de envío"""
+        await self.limiter.acquire(priority)
+        start = time.perf_counter()
+        try:
+            async with session.get(url, params=params) as response:
+                self.requests += 1
+                body = await response.read()
+                return response.status, body, _retry_after(response.headers.get("Retry-After"))
+        finally:
+            upstream_seconds.observe(time.perf_counter() - start, call)
+
+    async def get(self, call, url, params=None, priority=LIVE):
+        """JSON de un GET, pasando por el limitador y con reintentos
+
+        Las peticiones que no son LIVE usan como mucho max_connections -
+        live_connections conexiones a la vez; el resto queda para el dashboard.
+        """
+        import aiohttp
+        session = self._get_session()
+        params = {key: str(value) for key, value in (params or {}).items() if value is not None}
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                if priority <= LIVE:
+                    status, body, retry_after = await self._request(session, call, url, params, priority)
+                else:
+                    async with self._backfill_slots():
+                        status, body, retry_after = await self._request(session, call, url, params, priority)
+                if status < 400:
+                    # Las páginas grandes se decodifican fuera del bucle
+                    if len(body) > LARGE_BODY:
+                        return await asyncio.to_thread(json.loads, body)
+                    return json.loads(body)
+                error = AlpacaAPIError(status, body.decode("utf-8", "replace"), url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            status = getattr(error, "status", None)
+            if (status is not None and status not in RETRY_STATUS) or attempt == self.retries:
+                upstream_errors.inc(call)
+                raise error
+            wait = max(retry_after or 0.0, self.delay(attempt))
+            if status == 429:
+                self.throttled += 1
+                self.limiter.block(wait)
+            self.retried += 1
+            upstream_retries.inc(call, str(status) if status else type(error).__name__)
+            await asyncio.sleep(wait)
+
+    async def account(self):
+        return await self.get("http:get_account", f"{self.trading_url}/v2/account")
+
+    async def assets(self, status=None, asset_class=None, priority=LIVE):
+        return await self.get("http:list_assets", f"{self.trading_url}/v2/assets",
+                              {"status": status, "asset_class": asset_class}, priority)
+
+    async def bars(self, symbols, timeframe, start=None, end=None, limit=None, priority=LIVE):
+        """{símbolo: [velas JSON]} de /v2/stocks/bars, recorriendo las páginas
+
+        limit es el total de velas (entre todos los símbolos); sin limit se
+        piden páginas completas hasta que no queda next_page_token.
+        """
+        out = {symbol: [] for symbol in symbols}
+        token, total = None, 0
+        while True:
+            page = PAGE_LIMIT if limit is None else min(PAGE_LIMIT, limit - total)
+            body = await self.get("http:get_bars", f"{self.data_url}/v2/stocks/bars", {
+                "symbols": ",".join(symbols), "timeframe": timeframe, "start": start, "end": end,
+                "limit": page, "page_token": token
+            }, priority)
+            for symbol, bars in (body.get("bars") or {}).items():
+                out.setdefault(symbol, []).extend(bars)
+                total += len(bars)
+            token = body.get("next_page_token")
+            if not token or (limit is not None and total >= limit):
+                return out
+
+    async def latest_bars(self, symbols, priority=LIVE):
+        """{símbolo: vela JSON} de /v2/stocks/bars/latest"""
+        body = await self.get("http:get_latest_bars", f"{self.data_url}/v2/stocks/bars/latest",
+                              {"symbols": ",".join(symbols)}, priority)
+        return body.get("bars") or {}
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="alpaca-http", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coro):
+        """Lanza la corrutina en el bucle propio del transporte (concurrent.futures.Future)"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro, timeout=None):
+        """Ejecuta la corrutina en el bucle propio y espera su resultado (código síncrono)"""
+        return self.submit(coro).result(timeout)
+
+    async def aclose(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def close(self):
+        """Cierra la sesión y para el bucle propio, si se arrancó"""
+        if self._loop is None:
+            return
+        try:
+            self.run(self.aclose(), timeout=5)
+        except Exception as e:
+            swallow("alpaca_http", e)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = self._thread = None
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "retried": self.retried,
+            "throttled": self.throttled,
+            "limiter": self.limiter.stats()
+        }
+
+
+class AsyncAlpacaClient:
+    """Versión asíncrona de AlpacaRealClient: get_all_forex_pairs,
+    get_historical_data y get_current_prices son corrutinas con los mismos
+    retornos (lista de pares, CandleView del CandleStore o [], Prices)
+
+    Con caché y resample=True solo se descarga M1 y el resto de timeframes se
+    agregan en local, como en el cliente síncrono. warm() precarga muchos
+    pares a la vez con peticiones de varios símbolos en paralelo.
+    """
+    def __init__(self, api_key=None, secret_key=None, http=None, candles=None, cache=None,
+                 resample=True, clock=None):
+        self.http = http or AlpacaHTTP(api_key, secret_key)
+        self.clock = clock or time.time
+        self.candles = candles or CandleStore()
+        self.cache = BarCache() if cache is None else (cache or None)
+        self.resample = resample
+
+    async def get_all_forex_pairs(self):
+        try:
+            assets = await self.http.assets(status='active', asset_class='forex')
+            return [asset["symbol"].replace("/", "") for asset in assets if asset.get("tradable")]
+        except Exception as e:
+            swallow("async_assets", e)
+            print(f"Error obteniendo pares: {e}")
+            return list(FALLBACK_PAIRS)
+
+    def _window(self, days):
+        end = int(self.clock() * 1000)
+        return end - int(days * 86_400_000), end
+
+    async def fetch(self, pairs, timeframe, start_ms, end_ms, priority=LIVE):
+        """{par: registros} entre start_ms y end_ms (incluidos) de varios pares
+
+        La ventana se parte en tramos de como mucho una página entre todos los
+        símbolos y los tramos se piden a la vez; el limitador decide el ritmo.
+        """
+        pairs = list(pairs)
+        symbols = {to_symbol(pair): pair for pair in pairs}
+        step = TIMEFRAME_MS.get(timeframe, 3_600_000)
+        span = max(PAGE_LIMIT // len(pairs), 1) * step
+        slices = [(s, min(s + span, end_ms + 1) - 1) for s in range(start_ms, end_ms + 1, span)]
+        pages = await asyncio.gather(*(
+            self.http.bars(list(symbols), ALPACA_TIMEFRAMES.get(timeframe, "1Hour"),
+                           rfc3339(a), rfc3339(b), priority=priority)
+            for a, b in slices))
+
+        def records():
+            return {pair: bar_records([bar for page in pages for bar in page.get(to_symbol(pair), ())])
+                    for pair in pairs}
+        return await asyncio.to_thread(records)
+
+    def _fetch_start(self, pair, timeframe, start_ms):
+        """Desde dónde pedir para completar la caché: la última vela cacheada
+        (puede estar a medio formar) o el principio si la caché no lo cubre"""
+        last = self.cache.last_time(pair, timeframe)
+        if last is None or last < start_ms:
+            return start_ms
+        if self.cache.first_time(pair, timeframe) - start_ms >= TIMEFRAME_MS.get(timeframe, 3_600_000):
+            return start_ms
+        return last
+
+    async def _top_up(self, pairs, timeframe, start_ms, end_ms, priority):
+        """Completa la caché de varios pares en una tanda de peticiones"""
+        start = min(self._fetch_start(pair, timeframe, start_ms) for pair in pairs)
+        fetched = await self.fetch(pairs, timeframe, start, end_ms, priority)
+
+        def merge():
+            bars = 0
+            for pair, records in fetched.items():
+                if records is not None and len(records):
+                    self.cache.merge(pair, timeframe, records)
+                    bars += len(records)
+            return bars
+        return await asyncio.to_thread(merge)
+
+    async def get_historical_data(self, pair, timeframe="1Hour", days=30, refresh=True, priority=LIVE):
+        """Como AlpacaRealClient.get_historical_data"""
+        start_ms, end_ms = self._window(days)
+        try:
+            if self.cache is None:
+                records = (await self.fetch([pair], timeframe, start_ms, end_ms, priority))[pair]
+            else:
+                if refresh:
+                    await self._refresh([pair], timeframe, start_ms, end_ms, priority)
+                records = self.cache.read(pair, timeframe, start=start_ms)
+            if records is not None and len(records):
+                return self.candles.load(pair, timeframe, *(records[col] for col in COLUMNS))
+        except Exception as e:
+            swallow("async_history", e)
+            print(f"Error obteniendo datos de {pair}: {e}")
+        return []
+
+    async def _refresh(self, pairs, timeframe, start_ms, end_ms, priority):
+        if self.resample and timeframe != BASE_TIMEFRAME and timeframe in TIMEFRAME_MS:
+            await self._top_up(pairs, BASE_TIMEFRAME, start_ms, end_ms, priority)
+            await asyncio.to_thread(lambda: [derive_timeframe(self.cache, pair, timeframe) for pair in pairs])
+        else:
+            await self._top_up(pairs, timeframe, start_ms, end_ms, priority)
+
+    async def warm(self, pairs, timeframes, days=30, priority=BACKFILL, symbols_per_request=7):
+        """Precarga en la caché `days` días de todos los pares y timeframes
+
+        Con resample se descarga solo M1, en grupos de symbols_per_request
+        símbolos por petición y tramos de una página, todos a la vez (el
+        limitador marca el ritmo con prioridad BACKFILL, así que las
+        peticiones LIVE siguen pasando delante); después se derivan los demás
+        timeframes. Un grupo que falla se avisa y no para al resto.
+        Devuelve un resumen: pares, velas, segundos y peticiones (todas las
+        del transporte mientras duró, también las LIVE que lo compartan).
+        """
+        if self.cache is None:
+            raise ValueError("warm() necesita una BarCache")
+        started, requests = time.perf_counter(), self.http.requests
+        start_ms, end_ms = self._window(days)
+        pairs = list(pairs)
+        groups = [pairs[i:i + symbols_per_request] for i in range(0, len(pairs), symbols_per_request)]
+        fetch = [BASE_TIMEFRAME] if self.resample else list(timeframes)
+        jobs = [(group, tf) for tf in fetch for group in groups]
+        results = await asyncio.gather(
+            *(self._top_up(group, tf, start_ms, end_ms, priority) for group, tf in jobs),
+            return_exceptions=True)
+        failed, bars = [], 0
+        for (group, tf), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                swallow("warm", result)
+                print(f"Error precargando {tf} de {','.join(group)}: {result}")
+                failed.extend(group)
+            else:
+                bars += result
+        if self.resample:
+            derived = [tf for tf in timeframes if tf != BASE_TIMEFRAME and tf in TIMEFRAME_MS]
+            ok = [pair for pair in pairs if pair not in failed]
+            await asyncio.to_thread(lambda: [derive_timeframe(self.cache, pair, tf)
+                                             for pair in ok for tf in derived])
+        return {
+            "pairs": len(pairs),
+            "timeframes": len(timeframes),
+            "failed": sorted(set(failed)),
+            "bars": bars,
+            "requests": self.http.requests - requests,
+            "seconds": time.perf_counter() - started
+        }
+
+    async def get_current_prices(self, pairs, priority=LIVE):
+        """Precios actuales (Prices) con una petición por lotes; los pares sin
+        precio válido quedan en .missing"""
+        pairs = list(dict.fromkeys(pairs))
+        prices, missing, as_of = {}, {}, {}
+        try:
+            bars = await self.http.latest_bars([to_symbol(pair) for pair in pairs], priority)
+        except Exception as e:
+            swallow("async_quotes", e)
+            return Prices({}, {pair: repr(e) for pair in pairs})
+        for pair in pairs:
+            bar = bars.get(to_symbol(pair))
+            price = float(bar["c"]) if bar and bar.get("c") is not None else None
+            if price is None or not np.isfinite(price) or price <= 0:
+                missing[pair] = "sin datos" if price is None else "precio no válido"
+                continue
+            prices[pair] = price
+            if bar.get("t") is not None:
+                as_of[pair] = _timestamp_ms(bar["t"])
+        return Prices(prices, missing, as_of)
+
+    async def close(self):
+        await self.http.aclose()
+
+
+class _Bars:
+    """Resultado de get_bars con el DataFrame de alpaca_trade_api en .df"""
+    def __init__(self, frame):
+        self.df = frame
+
+
+def bars_frame(bars):
+    """Velas JSON -> DataFrame con el formato de BarsV2.df (índice timestamp UTC)"""
+    import pandas as pd
+    columns = {"o": "open", "h": "high", "l": "low", "c": "close", "v": "volume",
+               "n": "trade_count", "vw": "vwap"}
+    frame = pd.DataFrame(bars or [], columns=["t", *columns]).rename(columns=columns)
+    frame.index = pd.to_datetime(frame.pop("t"), utc=True).rename("timestamp")
+    return frame
+
+
+def _latest(bar):
+    return SimpleNamespace(t=_timestamp_ms(bar["t"]) if bar.get("t") else None, c=float(bar["c"]))
+
+
+class AlpacaREST:
+    """Interfaz de alpaca_trade_api.REST que usa AlpacaRealClient (get_account,
+    list_assets, get_bars, get_latest_bar, get_latest_bars) sobre un
+    AlpacaHTTP: conexiones reutilizadas, cuota y reintentos compartidos con
+    las corrutinas que usen el mismo transporte. Cada llamada bloquea el
+    hilo que la hace hasta que el bucle del transporte la resuelve; priority
+    es la cola del limitador en la que entran sus peticiones.
+    """
+    def __init__(self, http=None, priority=LIVE):
+        self.http = http or AlpacaHTTP()
+        self.priority = priority
+
+    def get_account(self):
+        return SimpleNamespace(**self.http.run(self.http.account()))
+
+    def list_assets(self, status=None, asset_class=None):
+        assets = self.http.run(self.http.assets(status, asset_class, self.priority))
+        return [SimpleNamespace(**asset) for asset in assets]
+
+    def get_bars(self, symbol, timeframe, start=None, end=None, limit=None):
+        bars = self.http.run(self.http.bars([symbol], str(timeframe), start, end, limit, self.priority))
+        return _Bars(bars_frame(bars.get(symbol)))
+
+    def get_latest_bars(self, symbols):
+        bars = self.http.run(self.http.latest_bars(list(symbols), self.priority))
+        return {symbol: _latest(bar) for symbol, bar in bars.items()}
+
+    def get_latest_bar(self, symbol):
+        bar = self.get_latest_bars([symbol]).get(symbol)
+        if bar is None:
+            raise AlpacaAPIError(404, f"sin vela para {symbol}")
+        return bar
+
+    def close(self):
+        self.http.close()
@@ -0,0 +1,480 @@
+# modules/backtest.py
+# Backtesting vectorizado de los agentes y del consenso de MasterCoordinator.
+#
+#   python main.py backtest --pairs EURUSD,GBPUSD --timeframe H1 --days 3650
+#
+# Los indicadores se calculan una vez sobre toda la serie (por tramos, con
+# calentamiento) y las reglas de cada agente se evalúan como máscaras NumPy
+# sobre todas las velas a la vez. Cada señal BUY/SELL se cierra en el primer
+# toque del objetivo (+0.5%) o del stop (-0.3%) dentro de un horizonte máximo;
+# si no toca ninguno, al cierre de la última vela del horizonte.
+#
+# El consenso replica combine() con un agente de cada tipo (los del timeframe
+# que se reproduce): con los agentes de reglas da el mismo resultado que el
+# coordinador en vivo, que repite cada tipo una vez por timeframe con el mismo
+# historial y normaliza los scores.
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .config import AGENTS, FOREX_PAIRS, TIMEFRAME_MS, normalize_timeframe
+from .coordinator import SIGNAL_THRESHOLD, STOP_PCT, TARGET_PCT
+from .indicators import FEATURE_COLUMNS, MIN_BARS, VOLUME_COLUMNS
+from .ml_agents import PatternAgent
+from .patterns import PATTERNS, detect
+
+NEUTRAL, HOLD, BUY, SELL = 0, 1, 2, 3
+DIRECTIONS = ("NEUTRAL", "HOLD", "BUY", "SELL")
+# Días de historial que ve cada agente en vivo (get_historical_data)
+HISTORY_DAYS = 30
+# Horizonte máximo de una señal antes de cerrarla a mercado
+HORIZON_MS = 5 * 86_400_000
+# Velas por tramo de cálculo de indicadores (acota la memoria en series largas)
+SEGMENT_BARS = 250_000
+# Señales por bloque en la búsqueda del primer toque
+_HIT_BLOCK = 1 << 18
+
+
+# --- Señales de los agentes ---------------------------------------------------
+#
+# Cada función recibe el DataFrame de indicadores del tramo, la máscara de
+# filas con features completas, la posición absoluta de cada fila y la salida
+# del modelo (None si el agente no tiene modelo entrenado) y devuelve arrays
+# (dirección, confianza) con la misma regla que el predict del agente.
+
+def _trend(df, valid, position, outputs):
+    c = df['c'].to_numpy()
+    direction = np.full(len(df), NEUTRAL, dtype=np.int8)
+    confidence = np.zeros(len(df))
+    if outputs is None:
+        return direction, confidence
+    up = valid & (outputs > c * 1.001)
+    down = valid & (outputs < c * 0.999)
+    direction[valid] = HOLD
+    confidence[valid] = 50
+    direction[up | down] = np.where(up, BUY, SELL)[up | down]
+    confidence[up | down] = np.minimum(95, np.abs(outputs - c) / c * 10000)[up | down]
+    return direction, confidence
+
+
+def _momentum(df, valid, position, outputs):
+    direction = np.full(len(df), NEUTRAL, dtype=np.int8)
+    confidence = np.zeros(len(df))
+    if outputs is None:
+        return direction, confidence
+    momentum = df['momentum_5'].to_numpy()
+    rsi = df['rsi'].to_numpy()
+    up = valid & (momentum > 0.002) & (rsi < 70)
+    down = valid & ~up & (momentum < -0.002) & (rsi > 30)
+    direction[valid], confidence[valid] = HOLD, 40
+    direction[up], confidence[up] = BUY, np.minimum(90, momentum * 10000)[up]
+    direction[down], confidence[down] = SELL, np.minimum(90, np.abs(momentum) * 10000)[down]
+    return direction, confidence
+
+
+def _volatility(df, valid, position, outputs):
+    c = df['c'].to_numpy()
+    # Desviación de los retornos de todo el historial que vería el agente
+    volatility = df['history_std'].to_numpy()
+    calm = volatility < 0.01
+    up = valid & (c <= df['bb_lower'].to_numpy()) & calm
+    down = valid & ~up & (c >= df['bb_upper'].to_numpy()) & calm
+    direction = np.where(valid, HOLD, NEUTRAL).astype(np.int8)
+    confidence = np.where(valid, 60.0, 0.0)
+    direction[up | down] = np.where(up, BUY, SELL)[up | down]
+    confidence[up | down] = 85
+    return direction, confidence
+
+
+def _pattern(df, valid, position, outputs):
+    masks = detect(df, PatternAgent.patterns)
+    buy = masks["BULLISH_ENGULFING"] | masks["HAMMER"]
+    ready = position >= 19
+    conditions = [~ready, buy, masks["BEARISH_ENGULFING"], masks["DOJI"]]
+    direction = np.select(conditions, [NEUTRAL, BUY, SELL, HOLD], NEUTRAL).astype(np.int8)
+    confidence = np.select(conditions, [0, 80, 80, 70], 50).astype(float)
+    return direction, confidence
+
+
+def _scalping(df, valid, position, outputs):
+    c = df['c'].to_numpy()
+    average = df['c'].rolling(10).mean().to_numpy()
+    micro_trend = c / df['c'].shift(4).to_numpy() - 1
+    ready = position >= 9
+    up = ready & (micro_trend > 0.0005) & (c < average)
+    down = ready & ~up & (micro_trend < -0.0005) & (c > average)
+    direction = np.where(ready, HOLD, NEUTRAL).astype(np.int8)
+    confidence = np.where(ready, 55.0, 0.0)
+    direction[up | down] = np.where(up, BUY, SELL)[up | down]
+    confidence[up | down] = 75
+    return direction, confidence
+
+
+def _news(df, valid, position, outputs):
+    c = df['c'].to_numpy()
+    volatility = df['returns'].rolling(10, min_periods=2).std().to_numpy()
+    active = volatility > 0.005
+    direction = np.full(len(df), HOLD, dtype=np.int8)
+    confidence = np.full(len(df), 60.0)
+    rising = c > df['c'].shift(4).to_numpy()
+    direction[active] = np.where(rising, BUY, SELL)[active]
+    confidence[active] = 70
+    # En vivo, con menos de 5 velas la regla falla y el agente queda neutral
+    early = active & (position < 4)
+    direction[early], confidence[early] = NEUTRAL, 0
+    return direction, confidence
+
+
+# Agentes cuya regla no usa la salida del modelo, solo que haya uno entrenado
+# (no hace falta ajustarlo en cada bloque del walk-forward ni evaluarlo)
+MODEL_GATED = {"MomentumAgent"}
+
+# Regla vectorizada de cada agente; un agente nuevo se añade aquí
+SIGNALS = {
+    "TrendAgent": _trend,
+    "MomentumAgent": _momentum,
+    "VolatilityAgent": _volatility,
+    "PatternAgent": _pattern,
+    "ScalpingAgent": _scalping,
+    "NewsAgent": _news
+}
+
+
+def combine(directions, confidences, weights):
+    """Versión vectorizada de MasterCoordinator.combine: (dirección, confianza) del consenso"""
+    scores = {d: 0.0 for d in (BUY, SELL, HOLD)}
+    for name, direction in directions.items():
+        weighted = confidences[name] * weights[name]
+        for d in scores:
+            scores[d] = scores[d] + np.where(direction == d, weighted, 0.0)
+    total = scores[BUY] + scores[SELL] + scores[HOLD]
+    safe = np.where(total > 0, total, 1.0)
+    buy, sell, hold = (np.where(total > 0, scores[d] / safe, scores[d]) for d in (BUY, SELL, HOLD))
+    direction = np.select([buy > SIGNAL_THRESHOLD, sell > SIGNAL_THRESHOLD], [BUY, SELL], HOLD).astype(np.int8)
+    confidence = np.minimum(95, np.select([direction == BUY, direction == SELL], [buy, sell], hold) * 100)
+    return direction, confidence
+
+
+# --- Salidas de las operaciones -----------------------------------------------
+
+def first_hit(values, starts, limits, thresholds):
+    """Primer índice j en [start, limit) con values[j] >= threshold (limit si no hay)
+
+    Búsqueda binaria sobre una tabla de máximos por potencias de dos, para
+    todas las consultas a la vez; las consultas se procesan por bloques de
+    posiciones para acotar el tamaño de la tabla.
+    """
+    result = np.array(limits, dtype=np.int64)
+    if len(starts) == 0:
+        return result
+    order = np.argsort(starts, kind="stable")
+    starts, limits, thresholds = starts[order], limits[order], thresholds[order]
+    bounds = np.r_[np.searchsorted(starts, np.arange(starts[0], starts[-1] + 1, _HIT_BLOCK)), len(starts)]
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        if a == b:
+            continue
+        lo, hi = int(starts[a]), int(limits[a:b].max())
+        if hi <= lo:
+            result[order[a:b]] = limits[a:b]
+            continue
+        levels = [np.asarray(values[lo:hi], dtype=float)]
+        span = int((limits[a:b] - starts[a:b]).max())
+        while (1 << len(levels)) <= span:
+            prev, half = levels[-1], 1 << (len(levels) - 1)
+            levels.append(np.maximum(prev[:-half], prev[half:]))
+        p, limit, threshold = starts[a:b] - lo, limits[a:b] - lo, thresholds[a:b]
+        for k in range(len(levels) - 1, -1, -1):
+            table, step = levels[k], 1 << k
+            can = p + step <= limit
+            can &= table[np.minimum(p, len(table) - 1)] < threshold
+            p = np.where(can, p + step, p)
+        result[order[a:b]] = p + lo
+    return result
+
+
+def simulate(h, l, c, index, side, horizon, target=TARGET_PCT, stop=STOP_PCT):
+    """Resultado de cada señal (entrada al cierre de la vela index, side +1/-1)
+
+    Devuelve (salida, retorno, resultado) con resultado 1 objetivo, -1 stop y
+    0 cierre a mercado al final del horizonte. Si objetivo y stop se tocan en
+    la misma vela se cuenta el stop.
+    """
+    n = len(c)
+    entry = c[index]
+    starts = index + 1
+    limits = np.minimum(starts + horizon, n)
+    long = side > 0
+    target_price = np.where(long, entry * (1 + target), entry * (1 - target))
+    stop_price = np.where(long, entry * (1 - stop), entry * (1 + stop))
+    hit_target = np.empty(len(index), dtype=np.int64)
+    hit_stop = np.empty(len(index), dtype=np.int64)
+    for mask, sign in ((long, 1), (~long, -1)):
+        if not mask.any():
+            continue
+        # Largos: objetivo por arriba (h) y stop por abajo (l); cortos, al revés
+        up, down = (h, l) if sign > 0 else (l, h)
+        hit_target[mask] = first_hit(sign * up, starts[mask], limits[mask], sign * target_price[mask])
+        hit_stop[mask] = first_hit(-sign * down, starts[mask], limits[mask], -sign * stop_price[mask])
+    won = hit_target < hit_stop
+    lost = (hit_stop <= hit_target) & (hit_stop < limits)
+    last = np.maximum(limits - 1, index)
+    exit_index = np.select([won, lost], [hit_target, hit_stop], last)
+    returns = np.select([won, lost], [target, -stop], side * (c[last] / entry - 1))
+    outcome = np.select([won, lost], [1, -1], 0).astype(np.int8)
+    return exit_index, returns, outcome
+
+
+def non_overlapping(index, exit_index):
+    """Señales que se pueden operar de una en una (la siguiente, tras cerrar la anterior)"""
+    taken = []
+    i = 0
+    while i < len(index):
+        taken.append(i)
+        i = int(np.searchsorted(index, exit_index[i], side="right"))
+    return np.array(taken, dtype=np.int64)
+
+
+def signal_stats(h, l, c, direction, horizon):
+    """Aciertos de todas las señales BUY/SELL y PnL operándolas sin solaparse"""
+    index = np.flatnonzero((direction == BUY) | (direction == SELL))
+    side = np.where(direction[index] == BUY, 1, -1)
+    exit_index, returns, outcome = simulate(h, l, c, index, side, horizon)
+    taken = non_overlapping(index, exit_index)
+    return {
+        "signals": int(len(index)),
+        "buy": int((side > 0).sum()),
+        "sell": int((side < 0).sum()),
+        "wins": int((outcome == 1).sum()),
+        "losses": int((outcome == -1).sum()),
+        "timeouts": int((outcome == 0).sum()),
+        "trades": int(len(taken)),
+        "pnl_pct": float(returns[taken].sum() * 100),
+        "avg_signal_pct": float(returns.mean() * 100) if len(returns) else 0.0
+    }
+
+
+def pattern_stats(bars, h, l, c, horizon):
+    """Estadísticas de cada patrón direccional operado en el sentido de su sesgo"""
+    stats = {}
+    for name, mask in detect(bars).items():
+        bias = PATTERNS[name].bias
+        if bias not in ("BUY", "SELL"):
+            continue
+        direction = np.where(mask, BUY if bias == "BUY" else SELL, NEUTRAL).astype(np.int8)
+        stats[name] = _with_rates(signal_stats(h, l, c, direction, horizon))
+    return stats
+
+
+def _with_rates(stats):
+    decided = stats["wins"] + stats["losses"]
+    stats["hit_rate"] = stats["wins"] / decided if decided else None
+    stats["avg_trade_pct"] = stats["pnl_pct"] / stats["trades"] if stats["trades"] else 0.0
+    return stats
+
+
+def merge_stats(items):
+    """Suma las estadísticas de varios pares (las medias se ponderan por señales)"""
+    total = {key: 0 for key in ("signals", "buy", "sell", "wins", "losses", "timeouts", "trades")}
+    total["pnl_pct"] = 0.0
+    weighted = 0.0
+    for stats in items:
+        for key in total:
+            total[key] += stats[key]
+        weighted += stats["avg_signal_pct"] * stats["signals"]
+    total["avg_signal_pct"] = weighted / total["signals"] if total["signals"] else 0.0
+    return _with_rates(total)
+
+
+# --- Reproducción de un par ---------------------------------------------------
+
+def _models_from_registry(pair, timeframe, agents):
+    from .training import agent_class
+    models = {}
+    for name in agents:
+        agent = agent_class(name)(pair, timeframe)
+        if agent.load():
+            models[name] = (agent.model, agent.scaler)
+    return models
+
+
+def _outputs(name, model, df, columns, rows):
+    """Salida del modelo en rows (NaN en el resto), o None si no hay modelo"""
+    if model is None:
+        return None
+    out = np.full(len(df), np.nan)
+    if name in MODEL_GATED or len(rows) == 0:
+        return out
+    estimator, scaler = model
+    X = df[columns].to_numpy(dtype=float)
+    for a in range(0, len(rows), SEGMENT_BARS):
+        chunk = rows[a:a + SEGMENT_BARS]
+        out[chunk] = estimator.predict(scaler.transform(X[chunk]))
+    return out
+
+
+def replay(pair, timeframe, bars, agents=None, walk_forward=None, models=None, threads=1,
+           segment=SEGMENT_BARS):
+    """Señales de cada agente y del consenso sobre bars (CandleView)
+
+    walk_forward=(train, test): los agentes con modelo se reentrenan con las
+    `train` velas anteriores a cada bloque de `test` velas y predicen ese
+    bloque; antes del primer bloque no tienen modelo. Sin walk_forward se usan
+    `models` ({agente: (modelo, escalador)}) o, si es None, los del registro.
+    Devuelve ({agente: dirección}, dirección del consenso).
+    """
+    from .feature_store import compute_feature_frame
+    from .system import AGENT_WEIGHTS
+    from .training import agent_class, fit_model
+    import pandas as pd
+
+    agents = list(agents or AGENTS)
+    n = len(bars)
+    model_agents = [name for name in agents if agent_class(name).uses_model]
+    if walk_forward is None and models is None:
+        models = _models_from_registry(pair, timeframe, model_agents)
+    step = walk_forward[1] if walk_forward else segment
+    train = walk_forward[0] if walk_forward else 0
+    warmup = HISTORY_DAYS * 86_400_000 // TIMEFRAME_MS[timeframe] + MIN_BARS
+    columns = list(FEATURE_COLUMNS) + list(VOLUME_COLUMNS)
+
+    directions = {name: np.full(n, NEUTRAL, dtype=np.int8) for name in agents}
+    confidences = {name: np.zeros(n) for name in agents}
+    for a in range(0, n, step):
+        b = min(a + step, n)
+        start = max(0, a - train - warmup)
+        df = compute_feature_frame(bars[start:b])
+        index = pd.to_datetime(df['t'].to_numpy(), unit='ms')
+        returns = pd.Series(df['returns'].to_numpy(), index=index)
+        df['history_std'] = returns.rolling(pd.Timedelta(days=HISTORY_DAYS), min_periods=2).std().to_numpy()
+        position = np.arange(start, b)
+        valid = (position >= MIN_BARS - 1) & ~df[columns].isna().any(axis=1).to_numpy()
+
+        segment_models = models or {}
+        if walk_forward is not None:
+            segment_models = {}
+            # Filas de entrenamiento: su objetivo (el cierre siguiente) es anterior a a
+            rows = np.flatnonzero(valid & (position >= a - train) & (position < a - 1))
+            if a >= train and len(rows) >= MIN_BARS:
+                X = df[columns].to_numpy(dtype=float)[rows]
+                y = df['c'].to_numpy()[rows + 1]
+                for name in model_agents:
+                    segment_models[name] = (True if name in MODEL_GATED
+                                            else fit_model(name, pair, timeframe, X, y, threads))
+
+        keep = slice(a - start, b - start)
+        rows = np.flatnonzero(valid & (position >= a))
+        for name in agents:
+            outputs = _outputs(name, segment_models.get(name), df, columns, rows)
+            d, conf = SIGNALS[name](df, valid, position, outputs)
+            directions[name][a:b] = d[keep]
+            confidences[name][a:b] = conf[keep]
+
+    consensus, _ = combine(directions, confidences, AGENT_WEIGHTS)
+    return directions, consensus
+
+
+def horizon_bars(timeframe):
+    return max(10, HORIZON_MS // TIMEFRAME_MS[timeframe])
+
+
+def backtest_pair(pair, timeframe, days, agents=None, walk_forward=None, fake=False,
+                  cache_dir=None, threads=1):
+    """Trabajo de un par: carga la serie, la reproduce y devuelve sus estadísticas"""
+    from .training import _data_client
+    started = time.perf_counter()
+    bars = _data_client(fake, cache_dir).read_history(pair, timeframe, days)
+    report = {"pair": pair, "timeframe": timeframe, "bars": len(bars)}
+    if len(bars) == 0:
+        return report
+    directions, consensus = replay(pair, timeframe, bars, agents, walk_forward, threads=threads)
+    horizon = horizon_bars(timeframe)
+    h, l, c = (np.asarray(getattr(bars, col), dtype=float) for col in ('h', 'l', 'c'))
+    report.update({
+        "start": bars[0]['timestamp'],
+        "end": bars[-1]['timestamp'],
+        "consensus": _with_rates(signal_stats(h, l, c, consensus, horizon)),
+        "agents": {name: _with_rates(signal_stats(h, l, c, d, horizon)) for name, d in directions.items()},
+        "patterns": pattern_stats(bars, h, l, c, horizon),
+        "seconds": time.perf_counter() - started
+    })
+    return report
+
+
+def run_backtest(pairs, timeframe, days, agents=None, walk_forward=None, workers=None,
+                 fake=False, cache_dir=None, threads=1):
+    """Backtest de varios pares en paralelo: informe por par y agregados por agente"""
+    import multiprocessing
+    from .training import _limit_threads
+
+    timeframe = normalize_timeframe(timeframe)
+    started = time.perf_counter()
+    workers = workers or min(len(pairs), os.cpu_count() or 1)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_limit_threads, initargs=(threads,)) as pool:
+        futures = {
+            pair: pool.submit(backtest_pair, pair, timeframe, days, agents, walk_forward, fake, cache_dir, threads)
+            for pair in pairs
+        }
+        reports, failed = {}, {}
+        for pair, future in futures.items():
+            try:
+                reports[pair] = future.result()
+            except Exception as e:
+                failed[pair] = repr(e)
+                print(f"❌ Backtest de {pair}: {e}")
+    done = [r for r in reports.values() if "consensus" in r]
+    names = list(agents or AGENTS)
+    return {
+        "timeframe": timeframe,
+        "days": days,
+        "walk_forward": list(walk_forward) if walk_forward else None,
+        "target_pct": TARGET_PCT * 100,
+        "stop_pct": STOP_PCT * 100,
+        "horizon_bars": horizon_bars(timeframe),
+        "pairs": reports,
+        "consensus": merge_stats([r["consensus"] for r in done]),
+        "agents": {name: merge_stats([r["agents"][name] for r in done]) for name in names},
+        "patterns": {name: merge_stats([r["patterns"][name] for r in done if name in r["patterns"]])
+                     for name in PATTERNS if PATTERNS[name].bias in ("BUY", "SELL")},
+        "failed": failed,
+        "seconds": time.perf_counter() - started
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py backtest", description="Backtest de los agentes y del consenso")
+    parser.add_argument("--pairs", help="pares separados por comas (todos por defecto)")
+    parser.add_argument("--timeframe", default="H1")
+    parser.add_argument("--agents", help="agentes separados por comas (todos por defecto)")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--walk-forward", help="TRAIN:TEST en velas, p. ej. 5000:1000")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--threads", type=int, default=1, help="hilos por par (ajuste y predicción)")
+    parser.add_argument("--cache-dir", help="caché de velas (por defecto la de la aplicación)")
+    parser.add_argument("--fake", action="store_true", help="datos sintéticos de FakeREST, sin red")
+    parser.add_argument("--output", help="guardar el informe JSON completo en este fichero")
+    args = parser.parse_args(argv)
+
+    from .training import _csv
+    walk_forward = tuple(int(x) for x in args.walk_forward.split(":")) if args.walk_forward else None
+    report = run_backtest(
+        _csv(args.pairs, FOREX_PAIRS), args.timeframe, args.days, agents=_csv(args.agents, AGENTS),
+        walk_forward=walk_forward, workers=args.workers, fake=args.fake,
+        cache_dir=args.cache_dir, threads=args.threads
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    summary = {key: report[key] for key in ("timeframe", "days", "consensus", "agents", "patterns", "failed", "seconds")}
+    summary["pairs"] = {pair: r.get("consensus") for pair, r in report["pairs"].items()}
+    print(json.dumps(summary, indent=2))
+    return 0 if not report["failed"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,179 @@
+# modules/bar_cache.py
+# Caché de velas en disco por (par, timeframe): un fichero binario de
+# registros fijos (t, o, h, l, c, v) que se lee con np.memmap, de modo que las
+# lecturas por rango no tocan la red ni copian el fichero entero a memoria.
+import os
+import threading
+
+import numpy as np
+
+from .candles import COLUMNS, DTYPES
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "bars")
+BAR_CACHE_DIR = os.environ.get("SOYTUGUIA_BAR_CACHE_DIR", DEFAULT_ROOT)
+
+RECORD = np.dtype([(col, DTYPES[col]) for col in COLUMNS])
+
+
+def as_records(t, o, h, l, c, v):
+    """Columnas -> array estructurado ordenado por t y sin tiempos repetidos
+
+    Si un tiempo aparece varias veces gana la última aparición (la vela más
+    reciente de la API sustituye a la cacheada).
+    """
+    records = np.empty(len(t), dtype=RECORD)
+    for col, values in zip(COLUMNS, (t, o, h, l, c, v)):
+        records[col] = values
+    return _dedupe(records)
+
+
+def _dedupe(records):
+    if len(records) < 2:
+        return records
+    order = np.argsort(records['t'], kind='stable')
+    records = records[order]
+    keep = np.ones(len(records), dtype=bool)
+    keep[:-1] = records['t'][1:] != records['t'][:-1]
+    return records[keep]
+
+
+class BarCache:
+    """Velas históricas en disco, con recarga incremental
+
+    Cada (par, timeframe) vive en <root>/<par>/<timeframe>.bars como registros
+    RECORD ordenados por t. Las velas nuevas se añaden al final; las que
+    solapan con las últimas cacheadas (la vela en formación que la API revisa)
+    se reescriben en su sitio. Como un merge nunca acorta el fichero, las
+    vistas memmap ya abiertas siguen siendo válidas. El recorte por max_bars
+    escribe un fichero nuevo y lo sustituye de forma atómica.
+    """
+    def __init__(self, root=None, max_bars=None):
+        self.root = root or BAR_CACHE_DIR
+        self.max_bars = max_bars
+        self.reads = 0
+        self.appended = 0
+        self.rewritten = 0
+        self._maps = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def path_for(self, pair, timeframe):
+        return os.path.join(self.root, pair, f"{timeframe}.bars")
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _records(self, pair, timeframe):
+        """Todos los registros cacheados como memmap de solo lectura"""
+        path = self.path_for(pair, timeframe)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.empty(0, dtype=RECORD)
+        # Un registro a medio escribir (proceso interrumpido) se ignora
+        count = size // RECORD.itemsize
+        if count == 0:
+            return np.empty(0, dtype=RECORD)
+        key = (pair, timeframe)
+        stamp = (os.stat(path).st_ino, count)
+        with self._lock:
+            cached = self._maps.get(key)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+        records = np.memmap(path, dtype=RECORD, mode='r', shape=(count,))
+        with self._lock:
+            self._maps[key] = (stamp, records)
+        return records
+
+    def count(self, pair, timeframe):
+        return len(self._records(pair, timeframe))
+
+    def first_time(self, pair, timeframe):
+        records = self._records(pair, timeframe)
+        return int(records['t'][0]) if len(records) else None
+
+    def last_time(self, pair, timeframe):
+        records = self._records(pair, timeframe)
+        return int(records['t'][-1]) if len(records) else None
+
+    def read(self, pair, timeframe, start=None, end=None):
+        """Registros con start <= t < end (ms), sin copiar el fichero"""
+        records = self._records(pair, timeframe)
+        t = records['t']
+        lo = 0 if start is None else int(np.searchsorted(t, start, side='left'))
+        hi = len(records) if end is None else int(np.searchsorted(t, end, side='left'))
+        with self._lock:
+            self.reads += 1
+        return records[lo:hi]
+
+    def merge(self, pair, timeframe, records):
+        """Incorpora velas (array RECORD) a la caché y devuelve cuántas hay"""
+        records = _dedupe(np.asarray(records, dtype=RECORD))
+        if len(records) == 0:
+            return self.count(pair, timeframe)
+        key = (pair, timeframe)
+        path = self.path_for(pair, timeframe)
+        with self._key_lock(key):
+            cached = self._records(pair, timeframe)
+            if len(cached) == 0 or records['t'][0] < cached['t'][0]:
+                merged = _dedupe(np.concatenate([cached, records]))
+                return self._rewrite(key, path, merged)
+            # Las velas nuevas empiezan en index: la cola cacheada desde ahí se
+            # combina con ellas y se escribe encima (nunca es más corta)
+            index = int(np.searchsorted(cached['t'], records['t'][0], side='left'))
+            tail = _dedupe(np.concatenate([cached[index:], records]))
+            with open(path, 'r+b') as f:
+                f.seek(index * RECORD.itemsize)
+                f.write(tail.tobytes())
+                f.truncate(f.tell())
+            with self._lock:
+                self.appended += max(len(tail) - (len(cached) - index), 0)
+            total = index + len(tail)
+            if self.max_bars and total > self.max_bars * 1.25:
+                return self._rewrite(key, path, np.array(self._records(pair, timeframe)))
+            return total
+
+    def _rewrite(self, key, path, records):
+        if self.max_bars:
+            records = records[-self.max_bars:]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(records.tobytes())
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._maps.pop(key, None)
+            self.rewritten += 1
+        return len(records)
+
+    def clear(self, pair=None, timeframe=None):
+        """Borra de disco la caché de un (par, timeframe), de un par o toda"""
+        with self._lock:
+            for key in list(self._maps):
+                if pair in (None, key[0]) and timeframe in (None, key[1]):
+                    del self._maps[key]
+        if pair is None:
+            pairs = os.listdir(self.root) if os.path.isdir(self.root) else []
+        else:
+            pairs = [pair]
+        for p in pairs:
+            folder = os.path.join(self.root, p)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.endswith(".bars") and timeframe in (None, name[:-5]):
+                    os.remove(os.path.join(folder, name))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "root": self.root,
+                "open_files": len(self._maps),
+                "reads": self.reads,
+                "appended": self.appended,
+                "rewritten": self.rewritten
+            }
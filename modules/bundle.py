@@ -0,0 +1,281 @@
+# modules/bundle.py
+# Todos los modelos en un solo fichero: un bundle guarda, por (par, timeframe,
+# agente), el dict de BaseAgent.save (modelo, escalador, rendimiento) con un
+# índice al final. Cada entrada es un pickle (protocolo 5) cuyos arrays NumPy
+# van fuera de banda, alineados, en el propio fichero: al leerla con mmap los
+# arrays son vistas del fichero y no se lee nada de las demás entradas.
+#
+#   cabecera fija  MAGIC, versión, crc32 del índice, offset y tamaño del índice
+#   datos          por entrada: pickle y buffers, cada uno alineado a ALIGN
+#   índice         JSON: {"version", "created", "metadata", "data_crc32",
+#                         "entries": {"PAR:TF:AGENTE": {pickle, buffers, crc32, size}}}
+#
+# El fichero se escribe aparte y se cambia con os.replace: quien tenga abierto
+# el anterior lo sigue leyendo entero (su mmap apunta al fichero viejo) y
+# ModelRegistry pasa al nuevo en cuanto ve que ha cambiado.
+#
+#   python main.py bundle pack --models-dir models      # de .joblib a bundle
+#   python main.py bundle verify models/models.bundle
+#   python main.py bundle list models/models.bundle
+import argparse
+import json
+import mmap
+import os
+import pickle
+import struct
+import time
+import zlib
+
+MAGIC = b"SOYTGBND"
+VERSION = 1
+ALIGN = 64
+BUNDLE_NAME = "models.bundle"
+# MAGIC, versión, crc32 del índice, offset del índice, tamaño del índice
+_PREAMBLE = struct.Struct("<8sIIQQ")
+
+
+class BundleError(ValueError):
+    """Bundle ilegible: formato, versión o checksum incorrectos"""
+
+
+def entry_key(pair, timeframe, name):
+    return f"{pair}:{timeframe}:{name}"
+
+
+def _crc(views, crc=0):
+    for view in views:
+        crc = zlib.crc32(view, crc)
+    return crc
+
+
+class BundleWriter:
+    """Escribe un bundle en path de forma atómica (fichero temporal + os.replace)
+
+        with BundleWriter(path) as writer:
+            writer.add(pair, timeframe, name, entry)
+
+    Si el bloque termina con excepción el bundle anterior queda intacto.
+    """
+    def __init__(self, path, metadata=None):
+        self.path = path
+        self.metadata = dict(metadata or {})
+        self.entries = {}
+        self._tmp_path = f"{path}.tmp-{os.getpid()}"
+        self._file = None
+        self._data_crc = 0
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(b"\0" * _PREAMBLE.size)
+        return self
+
+    def _write(self, data):
+        """Escribe data alineado y devuelve [offset, tamaño]"""
+        pad = -self._file.tell() % ALIGN
+        if pad:
+            self._file.write(b"\0" * pad)
+        offset = self._file.tell()
+        self._file.write(data)
+        self._data_crc = zlib.crc32(data, self._data_crc)
+        return [offset, len(data)]
+
+    def _add_raw(self, key, payload, buffers):
+        crc = _crc(buffers, zlib.crc32(payload))
+        self.entries[key] = {
+            "pickle": self._write(payload),
+            "buffers": [self._write(buffer) for buffer in buffers],
+            "crc32": crc,
+            "size": len(payload) + sum(len(buffer) for buffer in buffers)
+        }
+
+    def add(self, pair, timeframe, name, entry):
+        buffers = []
+        payload = pickle.dumps(entry, protocol=5, buffer_callback=buffers.append)
+        self._add_raw(entry_key(pair, timeframe, name), payload, [buffer.raw() for buffer in buffers])
+
+    def copy(self, bundle, key):
+        """Copia tal cual (sin deserializar) la entrada key de otro bundle"""
+        payload, buffers = bundle.raw(key)
+        self._add_raw(key, payload, buffers)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._file.close()
+            os.unlink(self._tmp_path)
+            return False
+        index = json.dumps({
+            "version": VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "metadata": self.metadata,
+            "data_crc32": self._data_crc,
+            "entries": dict(sorted(self.entries.items()))
+        }, separators=(",", ":")).encode()
+        offset = self._file.tell()
+        self._file.write(index)
+        self._file.seek(0)
+        self._file.write(_PREAMBLE.pack(MAGIC, VERSION, zlib.crc32(index), offset, len(index)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        return False
+
+
+class ModelBundle:
+    """Bundle abierto para leer, con el fichero mapeado en memoria
+
+    get() deserializa solo la entrada pedida, comprobando antes su crc32 si
+    check=True (eso lee la entrada entera); con copy=False sus arrays son
+    vistas de solo lectura del fichero.
+    """
+    def __init__(self, path, copy=False, check=True):
+        self.path = path
+        self.copy = copy
+        self.check = check
+        with open(path, "rb") as f:
+            self.identity = _identity(os.fstat(f.fileno()))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_crc, offset, size = _PREAMBLE.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise BundleError(f"{path} no es un bundle de modelos")
+        if version != VERSION:
+            raise BundleError(f"versión de bundle no soportada: {version}")
+        if offset + size > len(self._map):
+            raise BundleError(f"{path} está truncado")
+        index = self._map[offset:offset + size]
+        if zlib.crc32(index) != index_crc:
+            raise BundleError(f"checksum del índice de {path} incorrecto")
+        header = json.loads(index)
+        self.version = header["version"]
+        self.created = header["created"]
+        self.metadata = header["metadata"]
+        self.data_crc32 = header["data_crc32"]
+        self.entries = header["entries"]
+        self._data_end = offset
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def keys(self):
+        return list(self.entries)
+
+    def size(self, key):
+        return self.entries[key]["size"]
+
+    def raw(self, key):
+        """(pickle, [buffers]) de la entrada key como memoryviews del fichero"""
+        entry = self.entries[key]
+        view = memoryview(self._map)
+        offset, size = entry["pickle"]
+        return view[offset:offset + size], [view[o:o + n] for o, n in entry["buffers"]]
+
+    def get(self, pair, timeframe, name):
+        """Dict guardado para (par, timeframe, agente), o None si no está"""
+        key = entry_key(pair, timeframe, name)
+        if key not in self.entries:
+            return None
+        payload, buffers = self.raw(key)
+        if self.check and _crc(buffers, zlib.crc32(payload)) != self.entries[key]["crc32"]:
+            raise BundleError(f"checksum de {key} incorrecto en {self.path}")
+        if self.copy:
+            buffers = [bytearray(buffer) for buffer in buffers]
+        return pickle.loads(payload, buffers=buffers)
+
+    def verify(self):
+        """Comprueba el crc32 de cada entrada y el de todos los datos (lee el
+        fichero entero)"""
+        crc = 0
+        view = memoryview(self._map)
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]["pickle"][0]):
+            ranges = [view[offset:offset + size] for offset, size in [entry["pickle"], *entry["buffers"]]]
+            if _crc(ranges) != entry["crc32"]:
+                raise BundleError(f"checksum de {key} incorrecto en {self.path}")
+            crc = _crc(ranges, crc)
+        if crc != self.data_crc32:
+            raise BundleError(f"checksum de datos de {self.path} incorrecto")
+        return {"entries": len(self.entries), "data_crc32": crc}
+
+    def stats(self):
+        return {"path": self.path, "version": self.version, "created": self.created,
+                "entries": len(self.entries), "bytes": len(self._map)}
+
+
+def _identity(stat):
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def changed(path, identity):
+    """¿El fichero de path ya no es el abierto con esa identidad?"""
+    try:
+        return _identity(os.stat(path)) != identity
+    except FileNotFoundError:
+        return identity is not None
+
+
+def update(path, entries, metadata=None):
+    """Reescribe el bundle de path con entries ({(par, tf, agente): dict})
+    añadidas o reemplazadas; el resto se copia sin deserializar"""
+    old = ModelBundle(path) if os.path.exists(path) else None
+    replaced = {entry_key(*key) for key in entries}
+    merged = dict(old.metadata) if old is not None else {}
+    merged.update(metadata or {})
+    with BundleWriter(path, merged) as writer:
+        if old is not None:
+            for key in old.keys():
+                if key not in replaced:
+                    writer.copy(old, key)
+        for (pair, timeframe, name), entry in sorted(entries.items()):
+            writer.add(pair, timeframe, name, entry)
+    return len(writer.entries)
+
+
+def pack(models_dir, path=None):
+    """Bundle con todos los .joblib de models_dir ({par}/{agente}_{tf}.joblib)"""
+    import joblib
+    path = path or os.path.join(models_dir, BUNDLE_NAME)
+    with BundleWriter(path) as writer:
+        for pair in sorted(os.listdir(models_dir)):
+            directory = os.path.join(models_dir, pair)
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                if filename.endswith(".joblib"):
+                    name, _, timeframe = filename[:-len(".joblib")].rpartition("_")
+                    writer.add(pair, timeframe, name, joblib.load(os.path.join(directory, filename)))
+    return path, len(writer.entries)
+
+
+def main(argv=None):
+    from .registry import MODELS_DIR
+    parser = argparse.ArgumentParser(prog="main.py bundle", description="Bundle de modelos en un solo fichero")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack_parser = commands.add_parser("pack", help="empaqueta los .joblib de un directorio de modelos")
+    pack_parser.add_argument("--models-dir", default=MODELS_DIR)
+    pack_parser.add_argument("--output", help=f"por defecto <models-dir>/{BUNDLE_NAME}")
+    for command in ("verify", "list"):
+        commands.add_parser(command).add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        path, count = pack(args.models_dir, args.output)
+        print(json.dumps({"path": path, "entries": count, "bytes": os.path.getsize(path)}, indent=2))
+        return 0
+    bundle = ModelBundle(args.path)
+    if args.command == "list":
+        for key in bundle.keys():
+            print(f"{key}\t{bundle.size(key)}")
+        return 0
+    try:
+        print(json.dumps({**bundle.stats(), **bundle.verify()}, indent=2))
+    except BundleError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,213 @@
+# modules/candles.py
+# Almacén columnar de velas: buffers NumPy de capacidad fija por (par, timeframe)
+# con vistas sin copia para agentes y gráficos, y un adaptador que se comporta
+# como la antigua lista de dicts (o/h/l/c/v/t/timestamp).
+import threading
+from collections.abc import Sequence
+from datetime import datetime, timezone
+
+import numpy as np
+
+COLUMNS = ('t', 'o', 'h', 'l', 'c', 'v')
+DTYPES = {'t': np.int64, 'o': np.float64, 'h': np.float64,
+          'l': np.float64, 'c': np.float64, 'v': np.int64}
+
+# Velas que se conservan por timeframe (30 días de M1 caben en 45.000)
+CAPACITY = {
+    "M1": 45000, "M5": 10000, "M15": 4000, "M30": 2000,
+    "H1": 2000, "H4": 1000, "D1": 1000
+}
+DEFAULT_CAPACITY = 5000
+
+
+def _iso(t_ms):
+    return datetime.fromtimestamp(t_ms / 1000, tz=timezone.utc).isoformat()
+
+
+class CandleView(Sequence):
+    """Vista de solo lectura sobre columnas de velas
+
+    Indexar devuelve un dict con el formato antiguo; un slice devuelve otra
+    vista sin copiar. Las columnas (.t, .o, .h, .l, .c, .v) son vistas NumPy
+    del buffer: siguen siendo válidas hasta que el buffer se compacta, así que
+    quien las guarde entre velas debe usar copy().
+    """
+    __slots__ = COLUMNS
+
+    def __init__(self, t, o, h, l, c, v):
+        self.t = t
+        self.o = o
+        self.h = h
+        self.l = l
+        self.c = c
+        self.v = v
+
+    def __len__(self):
+        return len(self.t)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CandleView(*(getattr(self, col)[index] for col in COLUMNS))
+        t = int(self.t[index])
+        return {
+            "timestamp": _iso(t),
+            "o": float(self.o[index]),
+            "h": float(self.h[index]),
+            "l": float(self.l[index]),
+            "c": float(self.c[index]),
+            "v": int(self.v[index]),
+            "t": t
+        }
+
+    def __repr__(self):
+        return f"CandleView({len(self)} velas)"
+
+    def columns(self):
+        return {col: getattr(self, col) for col in COLUMNS}
+
+    def copy(self):
+        return CandleView(*(getattr(self, col).copy() for col in COLUMNS))
+
+    def to_dicts(self):
+        """Lista de dicts para el código que aún espera el formato antiguo"""
+        return [self[i] for i in range(len(self))]
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame(self.columns(), copy=False)
+
+
+class CandleBuffer:
+    """Buffer circular de velas para un (par, timeframe)
+
+    Se reserva capacity + slack posiciones; las velas se escriben al final y,
+    cuando se llena, las últimas `capacity` se mueven al principio. Así las
+    ventanas recientes siempre son contiguas y se pueden servir como vistas.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, slack=None):
+        self.capacity = capacity
+        size = capacity + (slack if slack is not None else max(capacity // 4, 16))
+        self._data = {col: np.zeros(size, dtype=DTYPES[col]) for col in COLUMNS}
+        self._start = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def last_time(self):
+        return int(self._data['t'][self._end - 1]) if len(self) else None
+
+    def _compact(self, incoming):
+        keep = min(len(self), self.capacity - incoming) if incoming < self.capacity else 0
+        if keep > 0:
+            for arr in self._data.values():
+                arr[:keep] = arr[self._end - keep:self._end]
+        self._start = 0
+        self._end = keep
+
+    def extend(self, t, o, h, l, c, v):
+        """Añade un bloque de velas (arrays) en orden cronológico"""
+        with self._lock:
+            self._extend(t, o, h, l, c, v)
+
+    def _extend(self, t, o, h, l, c, v):
+        cols = dict(zip(COLUMNS, (t, o, h, l, c, v)))
+        n = len(t)
+        if n >= self.capacity:
+            self._start = self._end = 0
+            for col, values in cols.items():
+                self._data[col][:self.capacity] = np.asarray(values)[-self.capacity:]
+            self._end = self.capacity
+            return
+        if self._end + n > len(self._data['t']):
+            self._compact(n)
+        for col, values in cols.items():
+            self._data[col][self._end:self._end + n] = values
+        self._end += n
+        if len(self) > self.capacity:
+            self._start = self._end - self.capacity
+
+    def replace(self, t, o, h, l, c, v):
+        """Sustituye todo el contenido y devuelve una copia de las velas
+        resultantes, en una sola sección crítica"""
+        with self._lock:
+            self._start = self._end = 0
+            self._extend(t, o, h, l, c, v)
+            return CandleView(*(self._data[col][self._start:self._end].copy() for col in COLUMNS))
+
+    def append(self, bar):
+        """Añade una vela nueva o, si tiene el mismo tiempo que la última, la revisa"""
+        t = int(bar['t'])
+        with self._lock:
+            if len(self) and int(self._data['t'][self._end - 1]) == t:
+                index = self._end - 1
+            else:
+                if self._end >= len(self._data['t']):
+                    self._compact(1)
+                index = self._end
+                self._end += 1
+                if len(self) > self.capacity:
+                    self._start += 1
+            for col in COLUMNS:
+                self._data[col][index] = bar.get(col, 0)
+
+    def clear(self):
+        with self._lock:
+            self._start = self._end = 0
+
+    def view(self, n=None):
+        """Últimas n velas (todas por defecto) como CandleView sin copia: la
+        vista cambia si después se revisa la última vela, se compacta o se
+        recarga el buffer"""
+        with self._lock:
+            start = self._start if n is None else max(self._start, self._end - n)
+            return CandleView(*(self._data[col][start:self._end] for col in COLUMNS))
+
+
+class CandleStore:
+    """Buffers de velas por (par, timeframe)"""
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.buffers = {}
+        self._lock = threading.Lock()
+
+    def buffer(self, pair, timeframe):
+        key = (pair, timeframe)
+        with self._lock:
+            buf = self.buffers.get(key)
+            if buf is None:
+                capacity = self.capacity or CAPACITY.get(timeframe, DEFAULT_CAPACITY)
+                buf = self.buffers[key] = CandleBuffer(capacity)
+            return buf
+
+    def load(self, pair, timeframe, t, o, h, l, c, v):
+        """Sustituye el contenido de (par, timeframe) por las columnas dadas y
+        devuelve una copia: la siguiente carga de la misma clave reescribe el
+        buffer mientras otros hilos siguen usando el historial anterior"""
+        return self.buffer(pair, timeframe).replace(t, o, h, l, c, v)
+
+    def append(self, pair, timeframe, bar):
+        self.buffer(pair, timeframe).append(bar)
+
+    def view(self, pair, timeframe, n=None):
+        return self.buffer(pair, timeframe).view(n)
+
+    def memory_bytes(self):
+        return sum(arr.nbytes for buf in self.buffers.values() for arr in buf._data.values())
+
+
+def as_frame(history):
+    """DataFrame o/h/l/c/v a partir de una CandleView o de una lista de dicts"""
+    if isinstance(history, CandleView):
+        return history.to_frame()
+    import pandas as pd
+    return pd.DataFrame(history)
+
+
+def closes(history):
+    """Precios de cierre como array NumPy"""
+    if isinstance(history, CandleView):
+        return history.c
+    return np.fromiter((bar['c'] for bar in history), dtype=float, count=len(history))
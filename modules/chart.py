@@ -1,14 +1,285 @@
 # modules/chart.py
-import matplotlib.pyplot as plt
+# Gráficos del dashboard. La figura se describe como dict (el JSON que espera
+# Plotly.newPlot) calculado con NumPy; el navegador la pinta una vez y después
+# solo recibe deltas: las velas nuevas o revisadas y sus puntos de indicador.
+# matplotlib y pandas se importan al generar el primer gráfico estático.
+import json
+import threading
+from collections import OrderedDict
 
+import numpy as np
+
+from .candles import closes
+from .formatter import to_jsonable
+from .metrics import chart_seconds
+from .patterns import PATTERNS, detect, labels
+
+# Velas visibles en el gráfico y velas extra para que SMA20/RSI14 sean exactas
+# desde la primera visible
+CHART_BARS = 300
+WARMUP = 50
+
+GRID = 'rgba(255,255,255,0.1)'
+# Índices fijos de las trazas (los deltas se aplican por índice)
+CANDLES, SMA20, RSI, VOLUME, MARKERS = range(5)
+BIAS_COLORS = {'BUY': '#00ff00', 'SELL': '#ff0000', 'HOLD': '#aaaaaa'}
+
+
+def _rolling_mean(values, window):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(values, window).mean(axis=1)
+    return out
+
+
+def _rsi(close, period=14):
+    """RSI con medias simples, igual que el cálculo anterior con pandas rolling"""
+    delta = np.diff(close, prepend=np.nan)
+    gain = _rolling_mean(np.where(delta > 0, delta, 0.0), period)
+    loss = _rolling_mean(np.where(delta < 0, -delta, 0.0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - 100 / (1 + gain / loss)
+
+
+def _labels(t):
+    return np.datetime_as_string(np.asarray(t, dtype='datetime64[ms]'), unit='m').tolist()
+
+
+def chart_points(history, count):
+    """Últimas `count` velas con sus indicadores, como listas listas para JSON"""
+    window = history[-(count + WARMUP):]
+    cols = {col: np.asarray(getattr(window, col)) for col in 'tohlcv'} if hasattr(window, 't') else {
+        col: np.array([bar.get(col, 0) for bar in window], dtype=float) for col in 'tohlcv'}
+    c = cols['c'].astype(float)
+    sma = _rolling_mean(c, 20)
+    rsi = _rsi(c)
+    tail = slice(-count, None) if count else slice(len(c), None)
+    # Patrones de velas: marcador sobre el máximo de la vela, del color del sesgo del primero
+    masks = detect(window)
+    names = labels(masks)[tail]
+    marked = np.array([bool(text) for text in names], dtype=bool)
+    first = [text.split(", ")[0] for text in names]
+    return {
+        't': cols['t'][tail].astype(np.int64).tolist(),
+        'x': _labels(cols['t'][tail]),
+        'open': cols['o'][tail], 'high': cols['h'][tail],
+        'low': cols['l'][tail], 'close': c[tail],
+        'sma20': sma[tail], 'rsi': rsi[tail],
+        'volume': cols['v'][tail],
+        'colors': np.where(c[tail] > cols['o'][tail], 'green', 'red').tolist(),
+        'patterns': np.where(marked, cols['h'][tail].astype(float), np.nan),
+        'pattern_text': names,
+        'pattern_colors': [BIAS_COLORS[PATTERNS[name].bias] if name else BIAS_COLORS['HOLD'] for name in first]
+    }
+
+
+def prediction_layer(title, prediction):
+    """Títulos, niveles del RSI y líneas de precio actual, target y stop
+    (shapes + annotations del layout)"""
+    shapes = [
+        {'type': 'line', 'xref': 'paper', 'x0': 0, 'x1': 1, 'yref': 'y2', 'y0': level, 'y1': level,
+         'line': {'color': color, 'width': 1, 'dash': 'dash'}}
+        for level, color in ((70, 'red'), (30, 'green'))
+    ]
+    annotations = [
+        {'text': text, 'xref': 'paper', 'yref': 'paper', 'x': 0.5, 'y': y,
+         'xanchor': 'center', 'yanchor': 'bottom', 'showarrow': False, 'font': {'size': 14}}
+        for text, y in ((title, 1.0), ('RSI', 0.406), ('Volumen', 0.188))
+    ]
+    if prediction and 'current_price' in prediction:
+        last_price = prediction['current_price']
+        lines = (
+            (last_price, 'blue', 'solid', f"Actual: {last_price:.5f}"),
+            (prediction.get('target_price', last_price), 'green', 'dash',
+             f"Target: {prediction.get('target_price', last_price):.5f}"),
+            (prediction.get('stop_loss', last_price), 'red', 'dash',
+             f"Stop: {prediction.get('stop_loss', last_price):.5f}")
+        )
+        for level, color, dash, text in lines:
+            shapes.append({'type': 'line', 'xref': 'paper', 'x0': 0, 'x1': 1, 'yref': 'y',
+                           'y0': level, 'y1': level, 'line': {'color': color, 'width': 2, 'dash': dash}})
+            annotations.append({'text': text, 'xref': 'paper', 'x': 1, 'xanchor': 'right',
+                                'yref': 'y', 'y': level, 'yanchor': 'bottom', 'showarrow': False})
+    return {'shapes': shapes, 'annotations': annotations}
+
+
+@chart_seconds.timed("figure")
+def build_figure(pair, history, prediction, timeframe="M1", bars=CHART_BARS):
+    """Figura completa (dict data/layout) para Plotly.newPlot
+
+    Tres zonas apiladas sobre un único eje x de categorías: velas con SMA 20,
+    RSI y volumen. El eje de categorías evita los huecos de fin de semana y
+    hace que añadir velas sea solo extender las trazas.
+    """
+    points = chart_points(history, bars)
+    x = points['x']
+    data = [
+        {'type': 'candlestick', 'name': 'Precio', 'x': x, 'open': points['open'],
+         'high': points['high'], 'low': points['low'], 'close': points['close'],
+         'increasing': {'line': {'color': '#00ff00'}}, 'decreasing': {'line': {'color': '#ff0000'}},
+         'xaxis': 'x', 'yaxis': 'y'},
+        {'type': 'scatter', 'mode': 'lines', 'name': 'SMA 20', 'x': x, 'y': points['sma20'],
+         'line': {'color': 'yellow', 'width': 1}, 'xaxis': 'x', 'yaxis': 'y'},
+        {'type': 'scatter', 'mode': 'lines', 'name': 'RSI', 'x': x, 'y': points['rsi'],
+         'line': {'color': 'cyan', 'width': 1}, 'fill': 'tozeroy',
+         'fillcolor': 'rgba(0,255,255,0.1)', 'xaxis': 'x', 'yaxis': 'y2'},
+        {'type': 'bar', 'name': 'Volumen', 'x': x, 'y': points['volume'],
+         'marker': {'color': points['colors']}, 'xaxis': 'x', 'yaxis': 'y3'},
+        {'type': 'scatter', 'mode': 'markers', 'name': 'Patrones', 'x': x, 'y': points['patterns'],
+         'text': points['pattern_text'], 'hoverinfo': 'text',
+         'marker': {'symbol': 'triangle-down', 'size': 8, 'color': points['pattern_colors']},
+         'xaxis': 'x', 'yaxis': 'y'}
+    ]
+    layer = prediction_layer(f'{pair} - {timeframe}', prediction)
+    layout = {
+        'height': 600,
+        'showlegend': True,
+        'hovermode': 'x unified',
+        'margin': {'l': 0, 'r': 0, 't': 30, 'b': 0},
+        'paper_bgcolor': 'rgba(0,0,0,0)',
+        'plot_bgcolor': 'rgba(0,0,0,0.3)',
+        'font': {'color': 'white'},
+        'xaxis': {'type': 'category', 'anchor': 'y3', 'rangeslider': {'visible': False},
+                  'showgrid': True, 'gridcolor': GRID, 'nticks': 8},
+        'yaxis': {'domain': [0.436, 1.0], 'showgrid': True, 'gridcolor': GRID},
+        'yaxis2': {'domain': [0.218, 0.406], 'showgrid': True, 'gridcolor': GRID},
+        'yaxis3': {'domain': [0.0, 0.188], 'showgrid': True, 'gridcolor': GRID},
+        **layer
+    }
+    return to_jsonable({'data': data, 'layout': layout, 'last_time': points['t'][-1] if points['t'] else None})
+
+
+@chart_seconds.timed("delta")
+def chart_delta(pair, history, prediction, base_time, timeframe="M1", bars=CHART_BARS):
+    """Cambios desde un gráfico cuya última vela es base_time
+
+    replace indica cuántos puntos finales hay que quitar antes de extender
+    (la vela base_time, que pudo cambiar mientras se formaba). Devuelve None si
+    base_time ya no está entre las velas visibles: hay que pedir la figura.
+    """
+    if base_time is None or len(history) == 0:
+        return None
+    t = history.t if hasattr(history, 't') else np.array([bar['t'] for bar in history])
+    index = int(np.searchsorted(t, base_time))
+    if index >= len(t) or int(t[index]) != base_time or len(t) - index > bars:
+        return None
+    points = chart_points(history, len(t) - index)
+    layer = prediction_layer(f'{pair} - {timeframe}', prediction)
+    return to_jsonable({
+        'base': base_time,
+        'replace': 1,
+        'max_points': bars,
+        'x': points['x'],
+        'candles': {key: points[key] for key in ('open', 'high', 'low', 'close')},
+        'sma20': points['sma20'],
+        'rsi': points['rsi'],
+        'volume': points['volume'],
+        'colors': points['colors'],
+        'patterns': {key: points[key] for key in ('patterns', 'pattern_text', 'pattern_colors')},
+        'layout': layer,
+        'last_time': points['t'][-1]
+    })
+
+
+class FigureCache:
+    """Figuras ya calculadas por (par, timeframe, última vela, cierre, velas)"""
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pair, history, prediction, timeframe="M1", bars=CHART_BARS):
+        """Figura sin las líneas de predicción cacheada; estas se añaden aparte
+        porque dependen del precio actual"""
+        if len(history) == 0:
+            return None
+        last = history[-1]
+        key = (pair, timeframe, last['t'], last['c'], bars)
+        with self._lock:
+            figure = self._entries.get(key)
+            if figure is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if figure is None:
+            figure = build_figure(pair, history, None, timeframe, bars)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = figure
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        layer = to_jsonable(prediction_layer(f'{pair} - {timeframe}', prediction))
+        return {**figure, 'layout': {**figure['layout'], **layer}}
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+figure_cache = FigureCache()
+
+
+def generate_live_chart(pair, history, prediction, timeframe="M1"):
+    """Genera gráfico interactivo con predicciones (fragmento HTML autónomo)"""
+    
+    if history is None or len(history) < 20:
+        return "<div style='color: cyan; text-align: center; padding: 50px;'>Esperando datos...</div>"
+    
+    figure = figure_cache.get(pair, history, prediction, timeframe)
+    div_id = f"chart-plot-{pair}"
+    return (
+        f"<div id='{div_id}'></div>"
+        f"<script>Plotly.newPlot('{div_id}', {json.dumps(figure['data'])}, "
+        f"{json.dumps(figure['layout'])}, {{displayModeBar: false}});</script>"
+    )
+
+@chart_seconds.timed("matplotlib")
 def plot_prediction(pair, history, prediction):
-    prices = [h['c'] for h in history[-50:]]
-    plt.figure(figsize=(12,5))
-    plt.plot(prices, label="Precio histórico")
-    plt.axhline(prediction['current_price'], color='blue', linestyle='--', label="Actual")
-    plt.axhline(prediction['target_price'], color='green', linestyle='--', label="Target")
-    plt.axhline(prediction['stop_loss'], color='red', linestyle='--', label="Stop Loss")
-    plt.title(f"{pair} - {prediction['direction']}")
-    plt.legend()
-    plt.grid(True)
-    plt.show()
+    """Versión simplificada para matplotlib si se necesita"""
+    import matplotlib.pyplot as plt
+    import matplotlib
+    import pandas as pd
+    matplotlib.use('Agg')
+    
+    prices = closes(history[-100:])
+    
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8), 
+                                    gridspec_kw={'height_ratios': [3, 1]})
+    
+    # Precio
+    ax1.plot(prices, label="Precio", color='cyan', linewidth=2)
+    ax1.set_facecolor('black')
+    ax1.grid(True, alpha=0.3)
+    
+    if prediction:
+        ax1.axhline(prediction['current_price'], color='blue', linestyle='--', label="Actual")
+        ax1.axhline(prediction.get('target_price', 0), color='green', linestyle='--', label="Target")
+        ax1.axhline(prediction.get('stop_loss', 0), color='red', linestyle='--', label="Stop Loss")
+    
+    ax1.legend(loc='upper left')
+    ax1.set_title(f"{pair} - {prediction.get('direction', 'ANALIZANDO')}", color='white', fontsize=14)
+    
+    # RSI
+    if len(prices) > 14:
+        df = pd.DataFrame({'c': prices})
+        delta = df['c'].diff()
+        gain = (delta.where(delta > 0, 0)).rolling(14).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+        rs = gain / loss
+        rsi = 100 - (100 / (1 + rs))
+        
+        ax2.plot(rsi, color='yellow', linewidth=1)
+        ax2.axhline(70, color='red', linestyle='--', alpha=0.5)
+        ax2.axhline(30, color='green', linestyle='--', alpha=0.5)
+        ax2.fill_between(range(len(rsi)), 30, 70, alpha=0.1, color='gray')
+        ax2.set_ylabel('RSI', color='white')
+        ax2.set_ylim(0, 100)
+    
+    ax2.set_facecolor('black')
+    ax2.grid(True, alpha=0.3)
+    
+    fig.patch.set_facecolor('black')
+    plt.tight_layout()
+    
+    return fig
@@ -0,0 +1,35 @@
+# modules/config.py
+# Universo de pares, timeframes y agentes del sistema
+
+FOREX_PAIRS = [
+    "AUDCAD", "AUDCHF", "AUDJPY", "AUDNZD", "AUDUSD",
+    "CADCHF", "CADJPY", "CHFJPY", "EURAUD", "EURCAD",
+    "EURCHF", "EURGBP", "EURJPY", "EURNZD", "EURUSD",
+    "GBPAUD", "GBPCAD", "GBPCHF", "GBPJPY", "GBPNZD",
+    "GBPUSD", "NZDCAD", "NZDCHF", "NZDJPY", "NZDUSD",
+    "USDCAD", "USDCHF", "USDJPY"
+]
+
+TIMEFRAMES = ["M1", "M5", "M15", "M30", "H1", "H4", "D1"]
+
+# Duración de cada vela en milisegundos
+TIMEFRAME_MS = {
+    "M1": 60_000, "M5": 300_000, "M15": 900_000, "M30": 1_800_000,
+    "H1": 3_600_000, "H4": 14_400_000, "D1": 86_400_000
+}
+
+# Etiquetas que usa el dashboard -> timeframe interno
+TIMEFRAME_LABELS = {
+    "1m": "M1", "5m": "M5", "15m": "M15", "30m": "M30",
+    "1h": "H1", "4h": "H4", "1d": "D1"
+}
+
+AGENTS = [
+    "TrendAgent", "MomentumAgent", "VolatilityAgent",
+    "PatternAgent", "ScalpingAgent", "NewsAgent"
+]
+
+
+def normalize_timeframe(timeframe):
+    """Acepta '1m' o 'M1' y devuelve el timeframe interno ('M1')"""
+    return TIMEFRAME_LABELS.get(timeframe, timeframe.upper())
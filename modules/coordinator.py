@@ -1,61 +1,174 @@
 # modules/coordinator.py
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, wait
+
+from .metrics import agent_seconds, consensus_seconds, agent_failures
+
+# Objetivo y stop de cada señal, en proporción del precio de entrada
+TARGET_PCT = 0.005
+STOP_PCT = 0.003
+# Proporción del score ponderado que necesita una dirección para ser señal
+SIGNAL_THRESHOLD = 0.6
+
+
+def make_executor(mode, max_workers=None):
+    """Crea el pool para los agentes: 'thread', 'process' o un Executor ya creado
+
+    Los hilos bastan para los agentes con modelos (sklearn, XGBoost y LightGBM
+    liberan el GIL al predecir); los procesos sirven para lógica en Python puro
+    o pandas, a costa de serializar agente e historial en cada llamada.
+    """
+    if mode is None or isinstance(mode, Executor):
+        return mode
+    if mode == "thread":
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+    if mode == "process":
+        return ProcessPoolExecutor(max_workers=max_workers)
+    raise ValueError(f"Modo de ejecución desconocido: {mode}")
+
+
+def _run_agent(agent, current_price, history):
+    # Con ProcessPoolExecutor el tiempo queda en las métricas del proceso hijo
+    with agent_seconds.time(agent.name):
+        return agent.predict(current_price, history)
+
 
 class MasterCoordinator:
     """Coordina todos los agentes y toma la decisión final"""
-    def __init__(self, pair):
+    def __init__(self, pair, executor=None, timeout=None):
         self.pair = pair
         self.agents = {}
         self.weights = {}
-        
-    def add_agent(self, agent, weight=1.0):
-        key = f"{agent.name}_{agent.timeframe}"
+        self.executor = executor
+        self.timeout = timeout
+        self._unique = None
+
+    def add_agent(self, agent, weight=1.0, timeframe=None):
+        """Registra el agente con clave "Agente_timeframe"; un mismo agente
+        (flyweight) puede registrarse para varios timeframes"""
+        key = f"{agent.name}_{timeframe or agent.timeframe}"
         self.agents[key] = agent
         self.weights[key] = weight
-    
-    def get_consensus_prediction(self, current_price, history):
-        predictions = []
-        total_weight = 0
-        for key, agent in self.agents.items():
-            try:
-                pred = agent.predict(current_price, history)
-                pred['weight'] = self.weights[key]
-                predictions.append(pred)
-                total_weight += self.weights[key]
-            except Exception:
+        self._unique = None
+
+    def unique_agents(self):
+        """[(agente, [claves])]: cada objeto agente una vez, con sus claves"""
+        if self._unique is None:
+            unique = {}
+            for key, agent in self.agents.items():
+                unique.setdefault(id(agent), (agent, []))[1].append(key)
+            self._unique = list(unique.values())
+        return self._unique
+
+    def submit_predictions(self, current_price, history, executor=None):
+        """Lanza la predicción de cada agente en el pool y devuelve {key: future};
+        las claves de un mismo agente comparten future"""
+        executor = executor or self.executor
+        futures = {}
+        for agent, keys in self.unique_agents():
+            future = executor.submit(_run_agent, agent, current_price, history)
+            futures.update((key, future) for key in keys)
+        return futures
+
+    def collect_predictions(self, futures):
+        """Separa los futures en resultados, fallos y agentes fuera de plazo,
+        en el orden de self.agents (como el camino en serie)"""
+        results, failed, timed_out = {}, {}, []
+        for key in self.agents:
+            future = futures.get(key)
+            if future is None:
                 continue
+            if not future.done():
+                future.cancel()
+                timed_out.append(key)
+            elif future.exception() is not None:
+                failed[key] = repr(future.exception())
+            else:
+                results[key] = future.result()
+        return results, failed, timed_out
+
+    def get_consensus_prediction(self, current_price, history, timeout=None):
+        with consensus_seconds.time(self.pair):
+            return self._consensus(current_price, history, timeout)
+
+    def _consensus(self, current_price, history, timeout):
+        timeout = timeout if timeout is not None else self.timeout
+        if self.executor is None:
+            results, failed = {}, {}
+            for agent, keys in self.unique_agents():
+                try:
+                    prediction = _run_agent(agent, current_price, history)
+                except Exception as e:
+                    failed.update((key, repr(e)) for key in keys)
+                    continue
+                results.update((key, prediction) for key in keys)
+            # Mismo orden de agentes que self.agents
+            results = {key: results[key] for key in self.agents if key in results}
+            return self.combine(current_price, results, failed, [])
+
+        futures = self.submit_predictions(current_price, history)
+        wait(futures.values(), timeout=timeout)
+        results, failed, timed_out = self.collect_predictions(futures)
+        return self.combine(current_price, results, failed, timed_out)
+
+    def combine(self, current_price, results, failed=None, timed_out=None):
+        """Consenso ponderado a partir de las predicciones que llegaron a tiempo"""
+        failed = failed or {}
+        timed_out = timed_out or []
+        for key in failed:
+            agent_failures.inc(self.agents[key].name if key in self.agents else key, "error")
+        for key in timed_out:
+            agent_failures.inc(self.agents[key].name if key in self.agents else key, "timeout")
+        predictions = []
+        for key, pred in results.items():
+            weight = self.weights[key]
+            # Un flyweight devuelve la misma Prediction para todas sus claves
+            if pred.weight is not None and pred.weight != weight:
+                pred = pred.copy()
+            pred.weight = weight
+            predictions.append(pred)
+        status = {
+            "timed_out_agents": timed_out,
+            "failed_agents": failed,
+            "partial": bool(timed_out or failed)
+        }
         if not predictions:
-            return {"pair": self.pair, "direction": "HOLD", "confidence": 0, "agents_count": 0}
-        
-        buy_score = sum(p['confidence'] * p['weight'] for p in predictions if p['direction'] == 'BUY')
-        sell_score = sum(p['confidence'] * p['weight'] for p in predictions if p['direction'] == 'SELL')
-        hold_score = sum(p['confidence'] * p['weight'] for p in predictions if p['direction'] == 'HOLD')
-        
+            return {"pair": self.pair, "direction": "HOLD", "confidence": 0, "agents_count": 0, **status}
+
+        buy_score = sell_score = hold_score = 0
+        for p in predictions:
+            if p.direction == 'BUY':
+                buy_score += p.confidence * p.weight
+            elif p.direction == 'SELL':
+                sell_score += p.confidence * p.weight
+            elif p.direction == 'HOLD':
+                hold_score += p.confidence * p.weight
+
         total_score = buy_score + sell_score + hold_score
         if total_score > 0:
             buy_score /= total_score
             sell_score /= total_score
             hold_score /= total_score
-        
-        if buy_score > 0.6:
+
+        if buy_score > SIGNAL_THRESHOLD:
             final_direction = "📈 COMPRAR"
             final_confidence = buy_score * 100
-        elif sell_score > 0.6:
+        elif sell_score > SIGNAL_THRESHOLD:
             final_direction = "📉 VENDER"
             final_confidence = sell_score * 100
         else:
             final_direction = "⏸️ MANTENER"
             final_confidence = hold_score * 100
-        
+
         if final_direction == "📈 COMPRAR":
-            target_price = current_price * 1.005
-            stop_loss = current_price * 0.997
+            target_price = current_price * (1 + TARGET_PCT)
+            stop_loss = current_price * (1 - STOP_PCT)
         elif final_direction == "📉 VENDER":
-            target_price = current_price * 0.995
-            stop_loss = current_price * 1.003
+            target_price = current_price * (1 - TARGET_PCT)
+            stop_loss = current_price * (1 + STOP_PCT)
         else:
             target_price = current_price
             stop_loss = current_price
-        
+
         return {
             "pair": self.pair,
             "direction": final_direction,
@@ -65,5 +178,6 @@ class MasterCoordinator:
             "stop_loss": stop_loss,
             "agents_count": len(predictions),
             "individual_predictions": predictions,
-            "scores": {"buy": buy_score * 100, "sell": sell_score * 100, "hold": hold_score * 100}
+            "scores": {"buy": buy_score * 100, "sell": sell_score * 100, "hold": hold_score * 100},
+            **status
         }
@@ -0,0 +1,427 @@
+# modules/fake_alpaca.py
+# Sustituto local de alpaca_trade_api.REST para trabajar sin red ni claves:
+# precios sintéticos deterministas por símbolo y contadores de llamadas para
+# medir cuánta cuota consumiría el mismo uso contra la API real. Con un
+# SyntheticMarket y un reloj fijo las velas son reproducibles entre
+# ejecuciones (benchmarks). FakeAlpacaServer sirve lo mismo por HTTP local.
+import asyncio
+import json
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+
+from .config import FOREX_PAIRS
+
+# Cadena de timeframe de Alpaca -> milisegundos por vela
+BAR_MS = {
+    "1Min": 60_000, "5Min": 300_000, "15Min": 900_000, "30Min": 1_800_000,
+    "1Hour": 3_600_000, "4Hour": 14_400_000, "1Day": 86_400_000
+}
+
+
+def _to_ms(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+# Régimen -> (deriva, volatilidad) por minuto, en proporción del precio
+REGIMES = {
+    "calm": (0.0, 0.00008),
+    "trend_up": (0.00002, 0.00012),
+    "trend_down": (-0.00002, 0.00012),
+    "volatile": (0.0, 0.00035)
+}
+
+
+def synthetic_pairs(count):
+    """count símbolos de seis letras: los pares reales primero y después
+    símbolos inventados (XA0USD, XA1USD...) para universos mayores"""
+    pairs = list(FOREX_PAIRS[:count])
+    i = 0
+    while len(pairs) < count:
+        pairs.append(f"X{chr(65 + i // 10 % 26)}{i % 10}USD")
+        i += 1
+    return pairs
+
+
+class SyntheticMarket:
+    """Mercado sintético reproducible: por símbolo, un paseo aleatorio de
+    velas de un minuto que cambia de régimen (calma, tendencia alcista o
+    bajista, volatilidad alta) tras duraciones aleatorias de media
+    regime_minutes. Todo depende solo de (seed, símbolo): las mismas
+    velas en cualquier máquina y en cualquier orden de petición.
+
+    Cubre `minutes` minutos que terminan en end_ms; los timeframes mayores se
+    agregan a partir de los minutos (apertura, máximo, mínimo, cierre, suma
+    del volumen), igual que hace la API.
+    """
+    def __init__(self, pairs=None, minutes=100_000, end_ms=1_767_225_600_000, seed=0,
+                 regime_minutes=720):
+        self.pairs = list(pairs or FOREX_PAIRS)
+        self.minutes = minutes
+        self.end_ms = end_ms - end_ms % 60_000
+        self.start_ms = self.end_ms - minutes * 60_000
+        self.seed = seed
+        self.regime_minutes = regime_minutes
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def _generate(self, symbol):
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+        base = 150.0 if "JPY" in symbol else 0.6 + rng.random()
+        names = list(REGIMES)
+        drift, vol = np.empty(self.minutes), np.empty(self.minutes)
+        regimes = np.empty(self.minutes, dtype=np.int8)
+        k = 0
+        while k < self.minutes:
+            length = int(rng.geometric(1 / self.regime_minutes))
+            regime = int(rng.integers(len(names)))
+            drift[k:k + length], vol[k:k + length] = REGIMES[names[regime]]
+            regimes[k:k + length] = regime
+            k += length
+        steps = drift + vol * rng.standard_normal(self.minutes)
+        path = base * np.exp(np.r_[0.0, np.cumsum(steps)])
+        o, c = path[:-1], path[1:]
+        wick = vol * np.abs(rng.standard_normal((2, self.minutes)))
+        return {
+            "t": self.start_ms + np.arange(self.minutes + 1, dtype=np.int64) * 60_000,
+            "path": path,
+            "h": np.maximum(o, c) * (1 + wick[0]),
+            "l": np.minimum(o, c) * (1 - wick[1]),
+            "v": rng.integers(1, 200, self.minutes) * (1 + regimes.astype(np.int64)),
+            "regime": regimes
+        }
+
+    def series(self, symbol):
+        symbol = symbol.replace("/", "")
+        with self._lock:
+            data = self._paths.get(symbol)
+        if data is None:
+            data = self._generate(symbol)
+            with self._lock:
+                data = self._paths.setdefault(symbol, data)
+        return data
+
+    def price_at(self, symbol, t_ms):
+        data = self.series(symbol)
+        return np.interp(np.asarray(t_ms, dtype=float), data["t"], data["path"])
+
+    def bars(self, symbol, t, step, now):
+        """o, h, l, c, v de las velas que empiezan en t (ms, contiguas);
+        la última se corta en now si aún se está formando"""
+        data = self.series(symbol)
+        t = t[(t >= self.start_ms) & (t < min(now, self.end_ms))]
+        k0 = (t - self.start_ms) // 60_000
+        k1 = np.minimum((t + step - self.start_ms) // 60_000,
+                        (min(now, self.end_ms) - self.start_ms) // 60_000)
+        if len(t) == 0:
+            return t, *(np.empty(0) for _ in range(4)), np.empty(0, dtype=np.int64)
+        end = int(k1[-1])
+        h = np.maximum.reduceat(data["h"][:end], k0)
+        l = np.minimum.reduceat(data["l"][:end], k0)
+        v = np.add.reduceat(data["v"][:end], k0)
+        return t, data["path"][k0], h, l, data["path"][k1], v
+
+
+class _Bars:
+    """Imita el objeto que devuelve REST.get_bars (solo .df)"""
+    def __init__(self, frame):
+        self.df = frame
+
+
+class FakeREST:
+    """Mismo interfaz que usa AlpacaRealClient: get_account, list_assets,
+    get_bars, get_latest_bar y get_latest_bars
+
+    El precio de cada símbolo es una función continua del tiempo, así que
+    cualquier rango se puede pedir en cualquier orden y siempre devuelve las
+    mismas velas; la vela en formación (la que contiene `now`) cierra en el
+    precio actual y se revisa entre llamadas, como en la API real.
+    latency simula el coste fijo de cada petición HTTP en segundos.
+
+    Con market (SyntheticMarket) las velas salen de sus paseos aleatorios y,
+    si no se da clock, el reloj se queda parado en el final del mercado.
+    """
+    def __init__(self, pairs=None, clock=None, latency=0.0, seed=0, market=None):
+        self.market = market
+        if market is not None:
+            pairs = pairs or market.pairs
+            clock = clock or (lambda: market.end_ms / 1000)
+        self.pairs = list(pairs or FOREX_PAIRS)
+        self.clock = clock or time.time
+        self.latency = latency
+        self.seed = seed
+        self.calls = {"get_bars": 0, "get_latest_bar": 0, "get_latest_bars": 0, "list_assets": 0}
+        self.bars_served = 0
+        self._lock = threading.Lock()
+
+    def _count(self, method, bars=0):
+        with self._lock:
+            self.calls[method] += 1
+            self.bars_served += bars
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _shape(self, symbol):
+        h = zlib.crc32(f"{symbol}:{self.seed}".encode())
+        base = 150.0 if "JPY" in symbol else 0.6 + (h % 1000) / 1000
+        return base, (h % 6283) / 1000
+
+    def price_at(self, symbol, t_ms):
+        """Precio sintético del símbolo en el instante t (ms, escalar o array)"""
+        if self.market is not None:
+            return self.market.price_at(symbol, t_ms)
+        base, phase = self._shape(symbol)
+        x = np.asarray(t_ms, dtype=float) / 60_000
+        wave = (0.010 * np.sin(x / 2880 + phase)
+                + 0.003 * np.sin(x / 173 + 2 * phase)
+                + 0.0008 * np.sin(x / 7.3 + 3 * phase))
+        return base * (1 + wave)
+
+    def now_ms(self):
+        return int(self.clock() * 1000)
+
+    def get_account(self):
+        return SimpleNamespace(cash="100000", status="ACTIVE")
+
+    def list_assets(self, status=None, asset_class=None):
+        self._count("list_assets")
+        return [SimpleNamespace(symbol=f"{p[:3]}/{p[3:]}", tradable=True, status="active")
+                for p in self.pairs]
+
+    def bar_columns(self, symbol, timeframe, start=None, end=None, limit=None):
+        """t, o, h, l, c, v (arrays) de las velas entre start y end, incluidos"""
+        step = BAR_MS[str(timeframe)]
+        now = self.now_ms()
+        end_ms = min(_to_ms(end) or now, now)
+        start_ms = _to_ms(start) or end_ms - 1000 * step
+        first = -(-start_ms // step) * step
+        t = np.arange(first, end_ms + 1, step, dtype=np.int64)
+        if limit:
+            t = t[:limit]
+        if self.market is not None:
+            t, o, h, l, c, v = self.market.bars(symbol.replace("/", ""), t, step, now)
+        else:
+            close_t = np.minimum(t + step, now)
+            o = self.price_at(symbol, t)
+            c = self.price_at(symbol, close_t)
+            wiggle = np.abs(self.price_at(symbol, t + step // 2) - (o + c) / 2)
+            h = np.maximum(o, c) + wiggle
+            l = np.minimum(o, c) - wiggle
+            v = (t // step) % 97 + 1
+        return t, o, h, l, c, v
+
+    def get_bars(self, symbol, timeframe, start=None, end=None, limit=None):
+        import pandas as pd
+        t, o, h, l, c, v = self.bar_columns(symbol, timeframe, start, end, limit)
+        self._count("get_bars", len(t))
+        frame = pd.DataFrame(
+            {"open": o, "high": h, "low": l, "close": c, "volume": v},
+            index=pd.to_datetime(t, unit="ms", utc=True).rename("timestamp")
+        )
+        return _Bars(frame)
+
+    def get_latest_bar(self, symbol):
+        self._count("get_latest_bar", 1)
+        now = self.now_ms()
+        t = now - now % 60_000
+        return SimpleNamespace(t=t, c=float(self.price_at(symbol, now)))
+
+    def get_latest_bars(self, symbols):
+        self._count("get_latest_bars", len(symbols))
+        now = self.now_ms()
+        t = now - now % 60_000
+        return {symbol: SimpleNamespace(t=t, c=float(self.price_at(symbol, now))) for symbol in symbols}
+
+    def stats(self):
+        with self._lock:
+            return {"calls": dict(self.calls), "bars_served": self.bars_served}
+
+
+def _encode(t, o, h, l, c, v):
+    """Cada vela como objeto JSON de la API (una cadena por vela)"""
+    stamps = np.datetime_as_string(np.asarray(t).astype("datetime64[ms]"), unit="s").tolist()
+    return [f'{{"t":"{s}Z","o":{oi!r},"h":{hi!r},"l":{li!r},"c":{ci!r},"v":{vi},"n":0,"vw":{ci!r}}}'
+            for s, oi, hi, li, ci, vi in zip(stamps, np.asarray(o).tolist(), np.asarray(h).tolist(),
+                                             np.asarray(l).tolist(), np.asarray(c).tolist(),
+                                             np.asarray(v).tolist())]
+
+
+class FakeAlpacaServer:
+    """Servidor HTTP local (aiohttp) con los endpoints de Alpaca que usa
+    modules.async_alpaca, servidos por un FakeREST: /v2/account, /v2/assets,
+    /v2/stocks/bars (varios símbolos, paginado con next_page_token) y
+    /v2/stocks/bars/latest.
+
+    rpm limita las peticiones por ventana deslizante de `period` segundos (un
+    minuto, como la API real): las que sobran reciben un 429 con Retry-After. latency añade una
+    espera por petición y error_rate responde 503 a esa fracción de las
+    peticiones (con semilla), para probar los reintentos. prime() precalcula
+    las respuestas para que el coste del servidor no tape el del cliente en
+    los benchmarks. start() lo arranca
+    en un hilo propio con su bucle de eventos; url es la base de las URLs.
+    """
+    def __init__(self, rest=None, rpm=200, latency=0.0, error_rate=0.0, seed=0, host="127.0.0.1", port=0,
+                 period=60.0):
+        self.rest = rest or FakeREST()
+        self.rpm = rpm
+        self.period = period
+        self.latency = latency
+        self.error_rate = error_rate
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+        self._random = np.random.default_rng(seed)
+        self._window = []
+        self._encoded = {}
+        self._loop = None
+        self._thread = None
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _admit(self):
+        """None si la petición entra en la cuota; si no, segundos hasta que entre"""
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < self.period]
+        if self.rpm and len(self._window) >= self.rpm:
+            return self.period - (now - self._window[0])
+        self._window.append(now)
+        return None
+
+    def _app(self):
+        from aiohttp import web
+
+        @web.middleware
+        async def gate(request, handler):
+            self.requests += 1
+            wait = self._admit()
+            if wait is not None:
+                self.throttled += 1
+                return web.json_response({"message": "too many requests"}, status=429,
+                                         headers={"Retry-After": f"{wait:.3f}"})
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.failed += 1
+                return web.json_response({"message": "service unavailable"}, status=503)
+            return await handler(request)
+
+        app = web.Application(middlewares=[gate])
+        app.router.add_get("/v2/account", self._account)
+        app.router.add_get("/v2/assets", self._assets)
+        app.router.add_get("/v2/stocks/bars", self._bars)
+        app.router.add_get("/v2/stocks/bars/latest", self._latest)
+        return app
+
+    async def _account(self, request):
+        from aiohttp import web
+        return web.json_response(vars(self.rest.get_account()))
+
+    async def _assets(self, request):
+        from aiohttp import web
+        assets = self.rest.list_assets(request.query.get("status"), request.query.get("asset_class"))
+        return web.json_response([{**vars(asset), "class": "forex"} for asset in assets])
+
+    def prime(self, symbols, timeframes):
+        """Precalcula el JSON de todas las velas del mercado de esos símbolos y
+        timeframes, para que servir una página no cueste más que unirlas (solo
+        con SyntheticMarket; si el reloj avanza, se vuelve a codificar)"""
+        market = self.rest.market
+        if market is None:
+            return
+        now = self.rest.now_ms()
+        for symbol in symbols:
+            for timeframe in timeframes:
+                t, *values = self.rest.bar_columns(symbol, timeframe, market.start_ms, now)
+                self._encoded[(symbol, timeframe)] = (now, t, _encode(t, *values))
+
+    def _rows(self, symbol, timeframe, start, end):
+        """(número de velas, fn(a, b) -> JSON de las velas a:b) entre start y end"""
+        cached = self._encoded.get((symbol, timeframe))
+        now = self.rest.now_ms()
+        if cached is not None and cached[0] == now:
+            _, t, encoded = cached
+            end_ms = min(_to_ms(end) or now, now)
+            start_ms = _to_ms(start) or end_ms - 1000 * BAR_MS[timeframe]
+            a, b = np.searchsorted(t, start_ms), np.searchsorted(t, end_ms, side="right")
+            return int(b - a), lambda i, j: encoded[a + i:a + j]
+        columns = self.rest.bar_columns(symbol, timeframe, start, end)
+        return len(columns[0]), lambda i, j: _encode(*(col[i:j] for col in columns))
+
+    async def _bars(self, request):
+        from aiohttp import web
+        query = request.query
+        symbols = [s for s in query.get("symbols", "").split(",") if s]
+        timeframe = query.get("timeframe", "1Hour")
+        if not symbols or timeframe not in BAR_MS:
+            return web.json_response({"message": "invalid symbols or timeframe"}, status=422)
+        limit = min(int(query.get("limit") or 1000), 10_000)
+        offset = int(query.get("page_token") or 0)
+        # Las velas de todos los símbolos seguidas, en orden; el token es la posición
+        rows = [(symbol, *self._rows(symbol, timeframe, query.get("start"), query.get("end")))
+                for symbol in symbols]
+        total = sum(count for _, count, _ in rows)
+        parts, position = [], 0
+        for symbol, count, encoded in rows:
+            a, b = max(offset - position, 0), min(offset + limit - position, count)
+            position += count
+            if a < b:
+                parts.append(f"{json.dumps(symbol)}:[{','.join(encoded(a, b))}]")
+        served = min(total, offset + limit) - offset
+        self.rest._count("get_bars", max(served, 0))
+        token = str(offset + limit) if offset + limit < total else None
+        return web.Response(text=f'{{"bars":{{{",".join(parts)}}},"next_page_token":{json.dumps(token)}}}',
+                            content_type="application/json")
+
+    async def _latest(self, request):
+        from aiohttp import web
+        symbols = [s for s in request.query.get("symbols", "").split(",") if s]
+        bars = self.rest.get_latest_bars(symbols)
+        return web.json_response({"bars": {
+            symbol: {"t": f"{np.datetime_as_string(np.datetime64(bar.t, 'ms'), unit='s')}Z", "c": bar.c}
+            for symbol, bar in bars.items()
+        }})
+
+    def start(self):
+        from aiohttp import web
+        self._loop = asyncio.new_event_loop()
+
+        async def setup():
+            self._runner = web.AppRunner(self._app())
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, self.host, self.port)
+            await site.start()
+            self.port = self._runner.addresses[0][1]
+
+        self._loop.run_until_complete(setup())
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fake-alpaca", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop = self._thread = None
+
+    def stats(self):
+        return {"requests": self.requests, "throttled": self.throttled, "failed": self.failed,
+                **self.rest.stats()}
@@ -0,0 +1,212 @@
+# modules/feature_store.py
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .candles import CandleView, as_frame, closes
+from .config import TIMEFRAME_MS
+from .indicators import FEATURE_COLUMNS, VOLUME_COLUMNS, MIN_BARS, indicator_engine
+from .metrics import feature_seconds
+
+
+def calculate_atr(df, period=14):
+    import pandas as pd
+    high_low = df['h'] - df['l']
+    high_close = np.abs(df['h'] - df['c'].shift())
+    low_close = np.abs(df['l'] - df['c'].shift())
+    ranges = pd.concat([high_low, high_close, low_close], axis=1)
+    true_range = np.max(ranges, axis=1)
+    return true_range.rolling(period).mean()
+
+
+def compute_feature_frame(history):
+    """Calcula todos los indicadores sobre el historial completo"""
+    df = as_frame(history)
+    df['returns'] = df['c'].pct_change()
+    df['log_returns'] = np.log(df['c'] / df['c'].shift(1))
+    df['sma_5'] = df['c'].rolling(5).mean()
+    df['sma_10'] = df['c'].rolling(10).mean()
+    df['sma_20'] = df['c'].rolling(20).mean()
+    df['ema_9'] = df['c'].ewm(span=9).mean()
+    df['ema_21'] = df['c'].ewm(span=21).mean()
+
+    delta = df['c'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+    rs = gain / loss
+    df['rsi'] = 100 - (100 / (1 + rs))
+
+    df['macd'] = df['c'].ewm(span=12).mean() - df['c'].ewm(span=26).mean()
+    df['macd_signal'] = df['macd'].ewm(span=9).mean()
+    df['macd_diff'] = df['macd'] - df['macd_signal']
+
+    df['bb_middle'] = df['c'].rolling(20).mean()
+    bb_std = df['c'].rolling(20).std()
+    df['bb_upper'] = df['bb_middle'] + (bb_std * 2)
+    df['bb_lower'] = df['bb_middle'] - (bb_std * 2)
+    df['bb_width'] = df['bb_upper'] - df['bb_lower']
+    df['bb_position'] = (df['c'] - df['bb_lower']) / df['bb_width']
+
+    df['volatility'] = df['returns'].rolling(20).std()
+    df['atr'] = calculate_atr(df)
+
+    if 'v' in df.columns:
+        df['volume_ratio'] = df['v'] / df['v'].rolling(20).mean()
+        df['volume_trend'] = df['v'].rolling(5).mean() / df['v'].rolling(20).mean()
+
+    df['high_low_ratio'] = df['h'] / df['l']
+    df['close_open_ratio'] = df['c'] / df['o']
+    df['momentum_3'] = df['c'] / df['c'].shift(3) - 1
+    df['momentum_5'] = df['c'] / df['c'].shift(5) - 1
+    df['momentum_10'] = df['c'] / df['c'].shift(10) - 1
+    return df
+
+
+def feature_row(frame):
+    """Última fila completa de features del modelo (o None)"""
+    if len(frame) < MIN_BARS:
+        return None
+    df = frame.dropna()
+    if len(df) == 0:
+        return None
+    feature_cols = list(FEATURE_COLUMNS)
+    if 'volume_ratio' in df.columns:
+        feature_cols.extend(VOLUME_COLUMNS)
+    return df[feature_cols].iloc[-1:].values
+
+
+def history_key(history):
+    """Huella del historial: longitud, primera y última vela"""
+    if len(history) == 0:
+        return (0,)
+    first, last = history[0], history[-1]
+    return (
+        len(history),
+        first.get('t', first.get('timestamp')),
+        last.get('t', last.get('timestamp')),
+        last.get('c'),
+        last.get('h'),
+        last.get('l'),
+        last.get('v')
+    )
+
+
+_STEP_TIMEFRAMES = {step: timeframe for timeframe, step in TIMEFRAME_MS.items()}
+
+
+def series_timeframe(history, default):
+    """Timeframe de las velas del historial según su separación (default si
+    no se reconoce). Todos los agentes de un par reciben el mismo historial
+    sea cual sea su timeframe; así comparten indicadores en lugar de
+    calcularlos una vez por timeframe de agente."""
+    if len(history) < 2:
+        return default
+    if isinstance(history, CandleView):
+        t = history.t[-8:]
+    else:
+        t = [bar.get('t') for bar in history[-8:]]
+        if None in t:
+            return default
+    steps = np.diff(np.asarray(t, dtype=np.int64))
+    steps = steps[steps > 0]
+    return _STEP_TIMEFRAMES.get(int(steps.min()), default) if len(steps) else default
+
+
+class FeatureStore:
+    """Caché LRU de indicadores compartida por todos los agentes de un (par, timeframe)
+
+    Con un IndicatorEngine (por defecto) las features y los últimos valores
+    se obtienen en O(1) por vela nueva; el DataFrame completo solo se calcula
+    si algún consumidor lo pide con get_frame().
+    """
+    def __init__(self, maxsize=512, engine=indicator_engine):
+        self.maxsize = maxsize
+        self.engine = engine
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {}
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _field(self, pair, timeframe, history, name, compute):
+        entry = self._entry((pair, timeframe) + history_key(history))
+        if name in entry:
+            with self._lock:
+                self.hits += 1
+            return entry[name]
+        with self._lock:
+            self.misses += 1
+        with feature_seconds.time(name):
+            value = entry[name] = compute()
+        return value
+
+    def get_frame(self, pair, timeframe, history):
+        """DataFrame con todos los indicadores (calculado una vez por vela)"""
+        timeframe = series_timeframe(history, timeframe)
+        return self._field(pair, timeframe, history, 'frame',
+                           lambda: compute_feature_frame(history))
+
+    def get_features(self, pair, timeframe, history):
+        if len(history) < MIN_BARS:
+            return None
+        timeframe = series_timeframe(history, timeframe)
+        if self.engine is None:
+            compute = lambda: feature_row(self.get_frame(pair, timeframe, history))
+        else:
+            compute = lambda: self.engine.features(pair, timeframe, history)
+        return self._field(pair, timeframe, history, 'features', compute)
+
+    def get_latest(self, pair, timeframe, history):
+        """Valores de los indicadores en la última vela"""
+        timeframe = series_timeframe(history, timeframe)
+        if self.engine is None:
+            compute = lambda: self.get_frame(pair, timeframe, history).iloc[-1].to_dict()
+        else:
+            compute = lambda: self.engine.latest(pair, timeframe, history)
+        return self._field(pair, timeframe, history, 'latest', compute)
+
+    def get_returns_std(self, pair, timeframe, history):
+        """Desviación estándar de los retornos de todo el historial"""
+        timeframe = series_timeframe(history, timeframe)
+        def compute():
+            c = closes(history)
+            if len(c) < 3:
+                return np.nan
+            return np.std(c[1:] / c[:-1] - 1, ddof=1)
+        return self._field(pair, timeframe, history, 'returns_std', compute)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+        if self.engine is not None:
+            stats["engine"] = self.engine.stats()
+        return stats
+
+
+# Instancia compartida por defecto entre todos los agentes del proceso
+feature_store = FeatureStore()
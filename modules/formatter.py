@@ -1,4 +1,21 @@
 # modules/formatter.py
+import math
 
 def format_signal(signal):
     return f"[{signal['pair']}] {signal['direction']} @ {signal['current_price']:.5f} (Conf: {signal['confidence']:.1f}%)"
+
+def to_jsonable(value):
+    """Convierte tipos NumPy y registros con to_dict a nativos y NaN/inf a None
+    para responder en JSON"""
+    if isinstance(value, dict):
+        return {k: to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if hasattr(value, 'to_dict') and hasattr(value, '__slots__'):
+        # Registros compactos (ml_agents.Prediction): a dict solo al responder
+        return to_jsonable(value.to_dict())
+    if hasattr(value, 'tolist'):
+        return to_jsonable(value.tolist())
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
@@ -0,0 +1,350 @@
+# modules/indicators.py
+# Motor incremental de indicadores: mantiene el estado por (par, timeframe)
+# y actualiza en O(1) cada vela nueva o revisada, con la misma definición
+# que compute_feature_frame() en feature_store.py.
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+FEATURE_COLUMNS = [
+    'returns', 'log_returns', 'sma_5', 'sma_10', 'sma_20',
+    'ema_9', 'ema_21', 'rsi', 'macd', 'macd_signal', 'macd_diff',
+    'bb_position', 'bb_width', 'volatility', 'atr',
+    'high_low_ratio', 'close_open_ratio',
+    'momentum_3', 'momentum_5', 'momentum_10'
+]
+VOLUME_COLUMNS = ['volume_ratio', 'volume_trend']
+MIN_BARS = 50
+
+# Las EMA "adjust=True" de pandas dependen de todo el historial. Si la ventana
+# recibida empieza más tarde que el estado acumulado, la diferencia es
+# (1 - alpha)^n para la EMA más lenta (span 26): con este número de velas
+# queda por debajo de 1e-10 y se puede seguir en modo incremental.
+EXACT_HORIZON = int(math.ceil(math.log(1e-10) / math.log(1 - 2 / 27)))
+
+# Máximo de velas nuevas que se aceptan en un sync antes de rehacer todo
+MAX_APPEND = 512
+
+# Velas que se recorren al rehacer el estado de un historial largo: por lo
+# mismo que EXACT_HORIZON, las anteriores ya no cambian el resultado (el doble
+# deja margen para la señal del MACD, que es una EMA de otra EMA)
+REPLAY_BARS = 2 * EXACT_HORIZON
+
+
+def _bar_time(bar):
+    t = bar.get('t')
+    return t if t is not None else bar.get('timestamp')
+
+
+def _bar_values(bar):
+    return (bar['o'], bar['h'], bar['l'], bar['c'], bar.get('v', 0))
+
+
+class _Window:
+    """Ventana deslizante con suma y suma de cuadrados en O(1)"""
+    def __init__(self, size):
+        self.size = size
+        self.values = deque()
+        self.ref = 0.0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.nonzero = 0
+        self._updates = 0
+
+    def _add(self, x, sign):
+        d = x - self.ref
+        self.total += sign * d
+        self.total_sq += sign * d * d
+        if x != 0:
+            self.nonzero += sign
+
+    def _resum(self):
+        # Re-centra y vuelve a sumar para acotar el error de redondeo
+        self.ref = self.values[-1] if self.values else 0.0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.nonzero = 0
+        for x in self.values:
+            self._add(x, 1)
+        self._updates = 0
+
+    def push(self, x):
+        self.values.append(x)
+        self._add(x, 1)
+        if len(self.values) > self.size:
+            self._add(self.values.popleft(), -1)
+        self._updates += 1
+        if self._updates >= self.size * 4:
+            self._resum()
+
+    def replace_last(self, x):
+        self._add(self.values[-1], -1)
+        self.values[-1] = x
+        self._add(x, 1)
+
+    @property
+    def full(self):
+        return len(self.values) == self.size
+
+    def mean(self):
+        if not self.full:
+            return math.nan
+        if self.nonzero == 0:
+            return 0.0
+        return self.ref + self.total / self.size
+
+    def std(self):
+        if not self.full:
+            return math.nan
+        var = (self.total_sq - self.total * self.total / self.size) / (self.size - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+
+class _EMA:
+    """EMA equivalente a pandas ewm(span=n, adjust=True).mean()"""
+    def __init__(self, span):
+        self.decay = 1 - 2 / (span + 1)
+        self.num = 0.0
+        self.den = 0.0
+        self._prev = (0.0, 0.0)
+
+    def push(self, x):
+        self._prev = (self.num, self.den)
+        self.num = self.num * self.decay + x
+        self.den = self.den * self.decay + 1
+
+    def replace_last(self, x):
+        num, den = self._prev
+        self.num = num * self.decay + x
+        self.den = den * self.decay + 1
+
+    def value(self):
+        return self.num / self.den if self.den else math.nan
+
+
+def _div(a, b):
+    if b == 0:
+        if a == 0 or math.isnan(a):
+            return math.nan
+        return math.copysign(math.inf, a)
+    return a / b
+
+
+class IncrementalIndicators:
+    """Estado de indicadores de una serie de velas (un par y un timeframe)"""
+    def __init__(self, has_volume=True):
+        self.has_volume = has_volume
+        self.count = 0
+        self.first_time = None
+        self.last_time = None
+        self.last_values = None
+        self.prev_close = None
+        self.closes = deque(maxlen=11)
+        self.sma = {5: _Window(5), 10: _Window(10), 20: _Window(20)}
+        self.returns = _Window(20)
+        self.gains = _Window(14)
+        self.losses = _Window(14)
+        self.true_range = _Window(14)
+        self.volume_5 = _Window(5)
+        self.volume_20 = _Window(20)
+        self.ema = {9: _EMA(9), 12: _EMA(12), 21: _EMA(21), 26: _EMA(26)}
+        self.macd_signal = _EMA(9)
+        self._latest = None
+
+    def _step(self, bar, revise):
+        o, h, l, c, v = _bar_values(bar)
+        prev = self.prev_close
+        op = 'replace_last' if revise else 'push'
+
+        if revise:
+            self.closes[-1] = c
+        else:
+            self.closes.append(c)
+        for window in self.sma.values():
+            getattr(window, op)(c)
+        for ema in self.ema.values():
+            getattr(ema, op)(c)
+
+        if prev is None:
+            ret = log_ret = math.nan
+            delta = 0.0
+            tr = h - l
+        else:
+            ret = c / prev - 1
+            log_ret = math.log(c / prev)
+            delta = c - prev
+            tr = max(h - l, abs(h - prev), abs(l - prev))
+            getattr(self.returns, op)(ret)
+        getattr(self.gains, op)(delta if delta > 0 else 0.0)
+        getattr(self.losses, op)(-delta if delta < 0 else 0.0)
+        getattr(self.true_range, op)(tr)
+
+        macd = self.ema[12].value() - self.ema[26].value()
+        getattr(self.macd_signal, op)(macd)
+        macd_signal = self.macd_signal.value()
+
+        if self.has_volume:
+            getattr(self.volume_5, op)(v)
+            getattr(self.volume_20, op)(v)
+
+        mid = self.sma[20].mean()
+        std = self.sma[20].std()
+        bb_upper = mid + std * 2
+        bb_lower = mid - std * 2
+        bb_width = bb_upper - bb_lower
+        rs = _div(self.gains.mean(), self.losses.mean())
+
+        closes = self.closes
+        n = len(closes)
+        latest = {
+            'c': c,
+            'returns': ret,
+            'log_returns': log_ret,
+            'sma_5': self.sma[5].mean(),
+            'sma_10': self.sma[10].mean(),
+            'sma_20': mid,
+            'ema_9': self.ema[9].value(),
+            'ema_21': self.ema[21].value(),
+            'rsi': 100 - (100 / (1 + rs)) if not math.isnan(rs) else math.nan,
+            'macd': macd,
+            'macd_signal': macd_signal,
+            'macd_diff': macd - macd_signal,
+            'bb_middle': mid,
+            'bb_upper': bb_upper,
+            'bb_lower': bb_lower,
+            'bb_position': _div(c - bb_lower, bb_width),
+            'bb_width': bb_width,
+            'volatility': self.returns.std(),
+            'atr': self.true_range.mean(),
+            'high_low_ratio': h / l,
+            'close_open_ratio': c / o,
+            'momentum_3': c / closes[-4] - 1 if n > 3 else math.nan,
+            'momentum_5': c / closes[-6] - 1 if n > 5 else math.nan,
+            'momentum_10': c / closes[-11] - 1 if n > 10 else math.nan
+        }
+        if self.has_volume:
+            vol_20 = self.volume_20.mean()
+            latest['volume_ratio'] = _div(v, vol_20)
+            latest['volume_trend'] = _div(self.volume_5.mean(), vol_20)
+        self._latest = latest
+        self.last_values = (o, h, l, c, v)
+        self.last_time = _bar_time(bar)
+
+    def append(self, bar):
+        """Añade una vela cerrada o nueva"""
+        if self.count:
+            self.prev_close = self.closes[-1]
+        else:
+            self.first_time = _bar_time(bar)
+        self.count += 1
+        self._step(bar, revise=False)
+
+    def revise(self, bar):
+        """Sustituye la última vela (vela en formación que ha cambiado)"""
+        if not self.count:
+            return self.append(bar)
+        self._step(bar, revise=True)
+
+    def latest(self):
+        return dict(self._latest) if self._latest else {}
+
+    def features(self):
+        """Vector de features igual a BaseAgent.prepare_features (o None)"""
+        if self.count < MIN_BARS or not self._latest:
+            return None
+        cols = FEATURE_COLUMNS + VOLUME_COLUMNS if self.has_volume else FEATURE_COLUMNS
+        row = np.array([[self._latest[col] for col in cols]], dtype=float)
+        if np.isnan(row).any():
+            return None
+        return row
+
+
+class IndicatorEngine:
+    """Mantiene un IncrementalIndicators por (par, timeframe) y lo sincroniza con el historial"""
+    def __init__(self):
+        self.states = {}
+        self.replays = 0
+        self.appends = 0
+        self.revisions = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _replay(self, key, history):
+        state = IncrementalIndicators(has_volume='v' in history[0])
+        for bar in history[-REPLAY_BARS:]:
+            state.append(bar)
+        # El estado representa el historial completo para los sync siguientes
+        state.first_time = _bar_time(history[0])
+        state.count = len(history)
+        self.states[key] = state
+        self.replays += 1
+        return state
+
+    def _sync(self, key, history):
+        state = self.states.get(key)
+        n = len(history)
+        first_time = _bar_time(history[0])
+        last_time = _bar_time(history[-1])
+        if (state is None or not state.count or last_time is None
+                or first_time is None or first_time < state.first_time
+                or (first_time != state.first_time and n < EXACT_HORIZON)):
+            return self._replay(key, history)
+
+        # Localizar la última vela conocida dentro del historial recibido
+        i = n - 1
+        while i >= 0 and n - 1 - i <= MAX_APPEND and _bar_time(history[i]) > state.last_time:
+            i -= 1
+        if i < 0 or _bar_time(history[i]) != state.last_time:
+            return self._replay(key, history)
+
+        if _bar_values(history[i]) != state.last_values:
+            state.revise(history[i])
+            self.revisions += 1
+        for bar in history[i + 1:]:
+            state.append(bar)
+            self.appends += 1
+        return state
+
+    def sync(self, pair, timeframe, history):
+        """Lleva el estado de (par, timeframe) hasta la última vela del historial"""
+        if len(history) == 0:
+            return None
+        key = (pair, timeframe)
+        with self._key_lock(key):
+            return self._sync(key, history)
+
+    def features(self, pair, timeframe, history):
+        state = self.sync(pair, timeframe, history)
+        return state.features() if state else None
+
+    def latest(self, pair, timeframe, history):
+        state = self.sync(pair, timeframe, history)
+        return state.latest() if state else {}
+
+    def reset(self, pair=None, timeframe=None):
+        with self._lock:
+            if pair is None:
+                self.states.clear()
+            else:
+                self.states.pop((pair, timeframe), None)
+
+    def stats(self):
+        return {
+            "series": len(self.states),
+            "replays": self.replays,
+            "appends": self.appends,
+            "revisions": self.revisions
+        }
+
+
+# Motor compartido por defecto
+indicator_engine = IndicatorEngine()
@@ -0,0 +1,336 @@
+# modules/journal.py
+# Diario de señales: cada consenso calculado (con individual_predictions y
+# scores) se guarda en disco para auditarlo después. record() solo encola; un
+# hilo escritor serializa y escribe por lotes, fuera del camino de la petición.
+#
+# El diario se parte en segmentos por tiempo (SEGMENT_HOURS), uno por
+# directorio <root>/<AAAAMMDDTHHMM>/:
+#   signals.log   registros seguidos: cada uno, el JSON del consenso
+#                 comprimido con zlib
+#   <PAR>.idx     índice del par: registros INDEX (t, vela, offset y tamaño
+#                 en signals.log, timeframe, dirección, confianza)
+# Primero se escribe el registro y después su entrada del índice, así que un
+# índice nunca apunta a datos a medias; una entrada a medio escribir (proceso
+# interrumpido) se ignora al leer, como en bar_cache.
+#
+# query(pair, start, end) abre solo los segmentos que solapan [start, end) y
+# solo el índice de ese par, y lee de signals.log únicamente sus registros.
+#
+#   python main.py journal query EURUSD --start 2026-10-01 --end 2026-10-02
+#   python main.py journal stats
+import argparse
+import calendar
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .config import TIMEFRAMES
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "signals")
+# Directorio del diario ("" lo desactiva)
+JOURNAL_DIR = os.environ.get("SOYTUGUIA_JOURNAL_DIR", DEFAULT_ROOT)
+# Horas de cada segmento
+SEGMENT_HOURS = float(os.environ.get("SOYTUGUIA_JOURNAL_SEGMENT_HOURS", "24"))
+# Señales pendientes de escribir como máximo; con la cola llena se descartan
+QUEUE_SIZE = int(os.environ.get("SOYTUGUIA_JOURNAL_QUEUE", "10000"))
+LOG_NAME = "signals.log"
+SEGMENT_FORMAT = "%Y%m%dT%H%M"
+
+DIRECTIONS = {"📈 COMPRAR": 1, "📉 VENDER": -1}
+_TIMEFRAME_CODES = {tf: i for i, tf in enumerate(TIMEFRAMES)}
+INDEX = np.dtype([("t", "<i8"), ("bar_t", "<i8"), ("offset", "<u8"), ("size", "<u4"),
+                  ("timeframe", "u1"), ("direction", "i1"), ("confidence", "<f4")])
+
+
+def segment_name(start_ms):
+    return time.strftime(SEGMENT_FORMAT, time.gmtime(start_ms / 1000))
+
+
+def segment_start(name):
+    return calendar.timegm(time.strptime(name, SEGMENT_FORMAT)) * 1000
+
+
+def parse_time(value):
+    """Milisegundos desde epoch a partir de un entero (ms) o una fecha ISO
+    (UTC si no lleva zona); None se queda en None"""
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    if str(value).lstrip("-").isdigit():
+        return int(value)
+    moment = datetime.fromisoformat(str(value))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def _encode(t, pair, timeframe, bar_t, prediction):
+    from .formatter import to_jsonable
+    document = {"t": t, "pair": pair, "timeframe": timeframe, "bar_t": bar_t, **prediction}
+    data = zlib.compress(json.dumps(to_jsonable(document), separators=(",", ":")).encode())
+    row = (t, bar_t if bar_t is not None else -1, 0, len(data), _TIMEFRAME_CODES.get(timeframe, 255),
+           DIRECTIONS.get(prediction.get("direction"), 0), prediction.get("confidence") or 0)
+    return data, row
+
+
+class SignalJournal:
+    """Diario de señales en root con un hilo escritor
+
+    record() encola la señal (descarta y cuenta si la cola está llena) y el
+    hilo la escribe en el segmento de su tiempo. flush() espera a que todo lo
+    encolado esté en disco; close() además para el hilo.
+    """
+    def __init__(self, root=None, segment_hours=None, queue_size=None):
+        self.root = root or JOURNAL_DIR
+        self.segment_ms = int((segment_hours or SEGMENT_HOURS) * 3_600_000)
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.bytes = 0
+        self._queue = queue.Queue(maxsize=queue_size or QUEUE_SIZE)
+        self._segment = None
+        self._log = None
+        self._indexes = {}
+        self._thread = threading.Thread(target=self._run, name="signal-journal", daemon=True)
+        self._thread.start()
+
+    def record(self, pair, timeframe, prediction, bar_t=None, t=None):
+        """Encola un consenso (el dict de get_consensus_prediction)"""
+        from .metrics import journal_records
+        item = (int(time.time() * 1000) if t is None else t, pair, timeframe, bar_t, prediction)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            journal_records.inc("dropped")
+            return False
+        return True
+
+    def _run(self):
+        from .metrics import journal_records, journal_write_seconds, swallow
+        while True:
+            items = [self._queue.get()]
+            while len(items) < 512:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            try:
+                with journal_write_seconds.time():
+                    for item in items:
+                        if item is None:
+                            stop = True
+                        elif isinstance(item, threading.Event):
+                            continue
+                        else:
+                            self._write(*item)
+                    self._flush_files()
+                journal_records.inc("written", amount=sum(1 for item in items if isinstance(item, tuple)))
+            except Exception as e:
+                self.errors += 1
+                swallow("journal", e)
+                print(f"⚠️ Error escribiendo el diario de señales: {e}")
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if stop:
+                self._close_files()
+                return
+
+    def _write(self, t, pair, timeframe, bar_t, prediction):
+        start = t - t % self.segment_ms
+        if self._segment != start:
+            self._close_files()
+            directory = os.path.join(self.root, segment_name(start))
+            os.makedirs(directory, exist_ok=True)
+            self._log = open(os.path.join(directory, LOG_NAME), "ab")
+            self._segment = start
+        data, row = _encode(t, pair, timeframe, bar_t, prediction)
+        offset = self._log.tell()
+        self._log.write(data)
+        index = self._indexes.get(pair)
+        if index is None:
+            path = os.path.join(self.root, segment_name(start), f"{pair}.idx")
+            index = self._indexes[pair] = [open(path, "ab"), []]
+        index[1].append((row[0], row[1], offset, *row[3:]))
+        self.written += 1
+        self.bytes += len(data) + INDEX.itemsize
+
+    def _flush_files(self):
+        if self._log is None:
+            return
+        # Datos antes que índices: un índice nunca apunta a datos sin escribir
+        self._log.flush()
+        for f, rows in self._indexes.values():
+            if rows:
+                f.write(np.array(rows, dtype=INDEX).tobytes())
+                f.flush()
+                rows.clear()
+
+    def _close_files(self):
+        self._flush_files()
+        for f, _ in self._indexes.values():
+            f.close()
+        if self._log is not None:
+            self._log.close()
+        self._log, self._segment, self._indexes = None, None, {}
+
+    def flush(self, timeout=None):
+        """Espera a que lo encolado hasta ahora esté escrito"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=10):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def query(self, pair, start=None, end=None, timeframe=None, limit=None):
+        return query(self.root, pair, start, end, timeframe, limit)
+
+    def stats(self):
+        return {"root": self.root, "written": self.written, "dropped": self.dropped, "errors": self.errors,
+                "pending": self._queue.qsize(), "bytes": self.bytes}
+
+
+def segments(root, start=None, end=None):
+    """[(inicio_ms, directorio)] de los segmentos que pueden tener señales en
+    [start, end), en orden; el fin de un segmento es el inicio del siguiente"""
+    try:
+        names = sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+    except FileNotFoundError:
+        return []
+    found = []
+    for name in names:
+        try:
+            found.append((segment_start(name), os.path.join(root, name)))
+        except ValueError:
+            continue
+    selected = []
+    for i, (begin, directory) in enumerate(found):
+        following = found[i + 1][0] if i + 1 < len(found) else None
+        if end is not None and begin >= end:
+            break
+        if start is not None and following is not None and following <= start:
+            continue
+        selected.append((begin, directory))
+    return selected
+
+
+def read_index(directory, pair):
+    """Índice de un par en un segmento (registros completos, sin copiar)"""
+    path = os.path.join(directory, f"{pair}.idx")
+    try:
+        count = os.path.getsize(path) // INDEX.itemsize
+    except OSError:
+        return np.empty(0, dtype=INDEX)
+    if count == 0:
+        return np.empty(0, dtype=INDEX)
+    return np.memmap(path, dtype=INDEX, mode="r", shape=(count,))
+
+
+def query(root, pair, start=None, end=None, timeframe=None, limit=None):
+    """Señales de pair con start <= t < end (ms o fechas ISO), de la más
+    antigua a la más reciente; timeframe filtra y limit se queda con las
+    `limit` más recientes"""
+    start, end = parse_time(start), parse_time(end)
+    code = _TIMEFRAME_CODES.get(timeframe) if timeframe is not None else None
+    if timeframe is not None and code is None:
+        return []
+    selected = []
+    for _, directory in segments(root, start, end):
+        index = read_index(directory, pair)
+        if len(index) == 0:
+            continue
+        mask = np.ones(len(index), dtype=bool)
+        if start is not None:
+            mask &= index["t"] >= start
+        if end is not None:
+            mask &= index["t"] < end
+        if code is not None:
+            mask &= index["timeframe"] == code
+        rows = np.asarray(index[mask])
+        if len(rows):
+            selected.append((directory, rows))
+    if limit:
+        # Solo los segmentos necesarios para las `limit` más recientes
+        kept, total = [], 0
+        for directory, rows in reversed(selected):
+            rows = rows[np.argsort(rows["t"], kind="stable")][-(limit - total):]
+            kept.append((directory, rows))
+            total += len(rows)
+            if total >= limit:
+                break
+        selected = kept[::-1]
+    signals = []
+    for directory, rows in selected:
+        with open(os.path.join(directory, LOG_NAME), "rb") as f:
+            fd = f.fileno()
+            size = os.fstat(fd).st_size
+            for row in rows:
+                if int(row["offset"]) + int(row["size"]) <= size:
+                    signals.append(json.loads(zlib.decompress(os.pread(fd, int(row["size"]), int(row["offset"])))))
+    signals.sort(key=lambda signal: signal["t"])
+    return signals
+
+
+def summary(root):
+    """Segmentos, pares y señales del diario (solo lee índices)"""
+    result = {"root": root, "segments": [], "signals": 0, "bytes": 0}
+    for begin, directory in segments(root):
+        files = os.listdir(directory)
+        counts = {name[:-4]: os.path.getsize(os.path.join(directory, name)) // INDEX.itemsize
+                  for name in files if name.endswith(".idx")}
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+        result["segments"].append({"start": segment_name(begin), "pairs": len(counts),
+                                   "signals": sum(counts.values()), "bytes": size})
+        result["signals"] += sum(counts.values())
+        result["bytes"] += size
+    return result
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """Diario del proceso (None si SOYTUGUIA_JOURNAL_DIR está vacío)"""
+    global _journal
+    if not JOURNAL_DIR:
+        return None
+    with _journal_lock:
+        if _journal is None:
+            _journal = SignalJournal()
+        return _journal
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py journal", description="Diario de señales emitidas")
+    parser.add_argument("--root", default=JOURNAL_DIR or DEFAULT_ROOT)
+    commands = parser.add_subparsers(dest="command", required=True)
+    query_parser = commands.add_parser("query", help="señales de un par en un intervalo (JSON por línea)")
+    query_parser.add_argument("pair")
+    query_parser.add_argument("--start", help="ms desde epoch o fecha ISO (UTC)")
+    query_parser.add_argument("--end", help="ms desde epoch o fecha ISO (UTC), excluida")
+    query_parser.add_argument("--timeframe")
+    query_parser.add_argument("--limit", type=int)
+    commands.add_parser("stats", help="segmentos y señales guardadas")
+    args = parser.parse_args(argv)
+
+    if args.command == "stats":
+        print(json.dumps(summary(args.root), indent=2))
+        return 0
+    for signal in query(args.root, args.pair, args.start, args.end, args.timeframe, args.limit):
+        print(json.dumps(signal, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,369 @@
+# modules/metrics.py
+# Instrumentación del camino caliente: histogramas de tiempos (agentes,
+# consensos, features, API de Alpaca, gráficos) y contadores de excepciones
+# tragadas y de respuestas NEUTRAL de reserva. Todo se exporta en formato de
+# texto de Prometheus (/metrics). Un perfilador por muestreo opcional
+# atribuye además las muestras de pila al tramo medido en curso de cada hilo.
+import functools
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally, OrderedDict
+
+# "0" desactiva la medición (los contadores y tramos pasan a no hacer nada)
+ENABLED = os.environ.get("SOYTUGUIA_METRICS", "1") != "0"
+# Segundos entre muestras del perfilador continuo; vacío o 0 = apagado
+PROFILE_INTERVAL = float(os.environ.get("SOYTUGUIA_PROFILE_INTERVAL", "0") or 0)
+PREFIX = "soytuguia_"
+# Límites (segundos) de los cubos de los histogramas; el presupuesto de
+# refresco del dashboard es de 5 s
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Tramo medido en curso de cada hilo (ident -> nombre), para el perfilador
+_active = {}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monótono con etiquetas (valores en el orden de labelnames)"""
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _labels(self.labelnames, labels), value) for labels, value in items]
+
+
+class Gauge:
+    """Valor leído en el momento de exportar: fn() devuelve un número o
+    {tupla de etiquetas: número}"""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, labelnames=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception:
+            swallowed.inc("metrics", "gauge")
+            return []
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, _labels(self.labelnames, labels), value)
+                for labels, value in sorted(values.items()) if value is not None]
+
+
+class _Span:
+    """Mide un tramo con `with`; guarda el tramo en curso del hilo para el perfilador"""
+    __slots__ = ("histogram", "labels", "start", "previous")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        ident = threading.get_ident()
+        self.previous = _active.get(ident)
+        _active[ident] = self.histogram.span_name(self.labels)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        ident = threading.get_ident()
+        if self.previous is None:
+            _active.pop(ident, None)
+        else:
+            _active[ident] = self.previous
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Histogram:
+    """Histograma acumulado de duraciones (segundos) con etiquetas"""
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # etiquetas -> [cuentas por cubo (+Inf al final), suma, total]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        if not ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels):
+        """Context manager que observa la duración del bloque"""
+        return _Span(self, labels) if ENABLED else _NO_SPAN
+
+    def timed(self, *labels):
+        """Decorador: observa la duración de cada llamada"""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(*labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def span_name(self, labels):
+        name = self.name[len(PREFIX):] if self.name.startswith(PREFIX) else self.name
+        return ":".join((name,) + tuple(str(label) for label in labels))
+
+    def summary(self, *labels):
+        """{'count', 'sum'} de una serie (ceros si no hay observaciones)"""
+        with self._lock:
+            series = self._series.get(labels)
+            return {"count": series[2], "sum": series[1]} if series else {"count": 0, "sum": 0.0}
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        out = []
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                out.append((self.name + "_bucket",
+                            _labels(self.labelnames, labels, (("le", _number(bound)),)), cumulative))
+            rendered = _labels(self.labelnames, labels)
+            out.append((self.name + "_sum", rendered, total))
+            out.append((self.name + "_count", rendered, count))
+        return out
+
+
+class MetricsRegistry:
+    """Métricas del proceso por nombre; render() produce el texto de Prometheus"""
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _register(self, metric, replace=False):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not replace:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(PREFIX + name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=BUCKETS):
+        return self._register(Histogram(PREFIX + name, help, labelnames, buckets))
+
+    def gauge(self, name, help, fn, labelnames=()):
+        """Registra (o sustituye) un gauge calculado al exportar"""
+        return self._register(Gauge(PREFIX + name, help, fn, labelnames), replace=True)
+
+    def get(self, name):
+        with self._lock:
+            return self._metrics.get(name if name.startswith(PREFIX) else PREFIX + name)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            samples = metric.samples()
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+agent_seconds = registry.histogram(
+    "agent_predict_seconds", "Duración de predict por tipo de agente", ("agent",))
+model_batch_seconds = registry.histogram(
+    "model_batch_seconds", "Duración de una llamada al modelo con las filas de varios agentes", ("agent",))
+consensus_seconds = registry.histogram(
+    "consensus_seconds", "Duración de un consenso completo por par (coordinador)", ("pair",))
+batch_seconds = registry.histogram(
+    "predict_batch_seconds", "Duración de predict_all_batched (todos los pares de un timeframe)")
+feature_seconds = registry.histogram(
+    "feature_seconds", "Cálculo de features e indicadores cuando no están en caché", ("field",))
+upstream_seconds = registry.histogram(
+    "upstream_seconds", "Duración de las llamadas a la API de datos", ("call",))
+chart_seconds = registry.histogram(
+    "chart_seconds", "Construcción de figuras y deltas del gráfico", ("kind",))
+upstream_errors = registry.counter(
+    "upstream_errors_total", "Llamadas a la API de datos que fallaron", ("call",))
+upstream_retries = registry.counter(
+    "upstream_retries_total", "Reintentos de llamadas a la API de datos", ("call", "reason"))
+rate_limit_wait_seconds = registry.histogram(
+    "rate_limit_wait_seconds", "Espera por una ficha del limitador de peticiones a la API", ("priority",))
+swallowed = registry.counter(
+    "swallowed_exceptions_total", "Excepciones capturadas sin propagarse", ("component", "error"))
+neutral_fallbacks = registry.counter(
+    "neutral_fallbacks_total", "Predicciones NEUTRAL de reserva por falta de datos o por error",
+    ("agent", "reason"))
+agent_failures = registry.counter(
+    "agent_failures_total", "Agentes que no llegaron al consenso (error o fuera de plazo)",
+    ("agent", "kind"))
+journal_records = registry.counter(
+    "journal_records_total", "Señales del diario escritas o descartadas con la cola llena", ("outcome",))
+journal_write_seconds = registry.histogram(
+    "journal_write_seconds", "Escritura de un lote de señales en el diario")
+
+
+def swallow(component, error):
+    """Cuenta una excepción capturada que no se propaga"""
+    swallowed.inc(component, type(error).__name__)
+
+
+def render():
+    return registry.render()
+
+
+class SamplingProfiler:
+    """Perfilador por muestreo: cada `interval` segundos toma la pila de
+    todos los hilos (sys._current_frames) y cuenta pilas colapsadas (formato
+    de flamegraph.pl / speedscope) y muestras por tramo medido en curso.
+
+    Su coste no depende de lo que se ejecute, solo del intervalo; los hilos
+    fuera de cualquier tramo medido cuentan como "-".
+    """
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self.stacks = _Tally()
+        self.spans = _Tally()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stack(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def sample(self):
+        own = threading.get_ident()
+        frames = sys._current_frames()
+        with self._lock:
+            self.samples += 1
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                span = _active.get(ident, "-")
+                self.spans[span] += 1
+                self.stacks[f"{span};{self._stack(frame)}"] += 1
+        profile_samples.inc()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def collapsed(self):
+        """Una línea 'pila;colapsada cuenta' por pila, de más a menos muestras"""
+        with self._lock:
+            return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common()) + "\n"
+
+    def report(self, top=20):
+        with self._lock:
+            return {
+                "interval": self.interval,
+                "samples": self.samples,
+                "spans": dict(self.spans.most_common()),
+                "top_stacks": [{"stack": stack, "samples": n} for stack, n in self.stacks.most_common(top)]
+            }
+
+
+profile_samples = registry.counter("profile_samples_total", "Pasadas del perfilador por muestreo")
+
+# Perfilador continuo del proceso, si SOYTUGUIA_PROFILE_INTERVAL lo activa
+profiler = SamplingProfiler(PROFILE_INTERVAL).start() if PROFILE_INTERVAL > 0 else None
+
+
+def profile(seconds, interval=0.005):
+    """Muestrea todos los hilos durante `seconds` y devuelve el perfilador"""
+    sampler = SamplingProfiler(interval).start()
+    try:
+        time.sleep(seconds)
+    finally:
+        sampler.stop()
+    return sampler
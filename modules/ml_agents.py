@@ -1,201 +1,312 @@
 # modules/ml_agents.py
+# Los backends de ML (scikit-learn, XGBoost, LightGBM) y pandas se importan
+# la primera vez que un agente construye su modelo o los necesita, no al
+# importar el módulo: el servidor web arranca sin pagar ese coste.
+import threading
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.neural_network import MLPRegressor
-import xgboost as xgb
-import lightgbm as lgb
-import os
-import joblib
 import warnings
+from .candles import closes
+from .feature_store import feature_store, calculate_atr, MIN_BARS
+from .metrics import neutral_fallbacks, swallow
+from .patterns import latest
+from .registry import model_registry
 warnings.filterwarnings('ignore')
 
+PERFORMANCE = {"wins": 0, "losses": 0, "accuracy": 0}
+# Estimador y escalador sin entrenar por tipo de agente, compartidos por
+# todos sus agentes (solo se usan para predecir, nunca se entrenan en sitio)
+_UNFITTED = {}
+_unfitted_lock = threading.Lock()
+
+
+class Prediction:
+    """Opinión de un agente: un registro con __slots__ en lugar de un dict
+
+    names son los campos propios del tipo de agente (una tupla de la clase,
+    compartida) y values sus valores; weight lo pone el coordinador. Admite
+    lectura tipo dict (pred['confidence'], pred.get('rsi')); el dict solo se
+    construye al responder, con to_dict() (formatter.to_jsonable).
+    """
+    __slots__ = ("agent", "direction", "confidence", "weight", "names", "values")
+
+    def __init__(self, agent, direction, confidence, names=(), values=(), weight=None):
+        self.agent = agent
+        self.direction = direction
+        self.confidence = confidence
+        self.names = names
+        self.values = values
+        self.weight = weight
+
+    def get(self, key, default=None):
+        if key in ("agent", "direction", "confidence"):
+            return getattr(self, key)
+        if key == "weight":
+            return default if self.weight is None else self.weight
+        for name, value in zip(self.names, self.values):
+            if name == key:
+                return value
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def copy(self):
+        return Prediction(self.agent, self.direction, self.confidence, self.names, self.values, self.weight)
+
+    def to_dict(self):
+        out = {"agent": self.agent, "direction": self.direction, "confidence": self.confidence}
+        out.update(zip(self.names, self.values))
+        if self.weight is not None:
+            out["weight"] = self.weight
+        return out
+
+    def __eq__(self, other):
+        if not isinstance(other, Prediction):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Prediction({self.to_dict()!r})"
+
+
+_MISSING = object()
+
+
 class BaseAgent:
     """Clase base para todos los agentes"""
+    __slots__ = ("name", "pair", "timeframe", "performance", "_model", "_scaler")
+    feature_store = feature_store
+    # Agentes cuyo predict pasa por self.model; el sistema puede agrupar sus
+    # filas de features y llamar al modelo una sola vez (predict_all_batched)
+    uses_model = False
+    # Agentes cuya predicción depende solo del par y del historial, no de su
+    # timeframe: el sistema crea uno por par (flyweight) para todos los
+    # timeframes y el coordinador lo evalúa una vez por historial
+    stateless = False
+    # Campos propios de las predicciones de este agente (Prediction.names)
+    details = ()
+    
+    registry = model_registry
+    
     def __init__(self, name, pair, timeframe):
         self.name = name
         self.pair = pair
         self.timeframe = timeframe
-        self.model = None
-        self.scaler = StandardScaler()
-        self.performance = {"wins": 0, "losses": 0, "accuracy": 0}
-        self.model_path = f"/content/repo/models/{pair}/{name}_{timeframe}.joblib"
+        # None hasta que se entrena o se carga (PERFORMANCE por defecto)
+        self.performance = None
+        # Modelo y escalador se resuelven al primer uso: el asignado a mano
+        # (entrenamiento, modelo compartido), el guardado en el registro o el
+        # compartido sin entrenar de su tipo
+        self._model = None
+        self._scaler = None
+    
+    def build_model(self):
+        """Estimador sin entrenar de este agente (None si no usa modelo)"""
+        return None
+    
+    def _stored(self, field):
+        entry = self.registry.get(self.pair, self.timeframe, self.name)
+        return entry.get(field) if entry is not None else None
+    
+    def _fresh_pair(self):
+        pair = _UNFITTED.get(self.name)
+        if pair is None:
+            with _unfitted_lock:
+                pair = _UNFITTED.get(self.name)
+                if pair is None:
+                    from sklearn.preprocessing import StandardScaler
+                    pair = _UNFITTED[self.name] = (self.build_model(), StandardScaler())
+        return pair
+    
+    @property
+    def model(self):
+        if self._model is not None:
+            return self._model
+        stored = self._stored('model')
+        if stored is not None:
+            return stored
+        return self._fresh_pair()[0]
+    
+    @model.setter
+    def model(self, value):
+        self._model = value
+    
+    @property
+    def scaler(self):
+        if self._scaler is not None:
+            return self._scaler
+        stored = self._stored('scaler')
+        if stored is not None:
+            return stored
+        return self._fresh_pair()[1]
+    
+    @scaler.setter
+    def scaler(self, value):
+        self._scaler = value
+    
+    @property
+    def model_path(self):
+        return self.registry.path_for(self.pair, self.timeframe, self.name)
         
     def prepare_features(self, history):
-        if len(history) < 50:
-            return None
-        df = pd.DataFrame(history)
-        df['returns'] = df['c'].pct_change()
-        df['log_returns'] = np.log(df['c'] / df['c'].shift(1))
-        df['sma_5'] = df['c'].rolling(5).mean()
-        df['sma_10'] = df['c'].rolling(10).mean()
-        df['sma_20'] = df['c'].rolling(20).mean()
-        df['ema_9'] = df['c'].ewm(span=9).mean()
-        df['ema_21'] = df['c'].ewm(span=21).mean()
-        
-        delta = df['c'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-        rs = gain / loss
-        df['rsi'] = 100 - (100 / (1 + rs))
-        
-        df['macd'] = df['c'].ewm(span=12).mean() - df['c'].ewm(span=26).mean()
-        df['macd_signal'] = df['macd'].ewm(span=9).mean()
-        df['macd_diff'] = df['macd'] - df['macd_signal']
-        
-        df['bb_middle'] = df['c'].rolling(20).mean()
-        bb_std = df['c'].rolling(20).std()
-        df['bb_upper'] = df['bb_middle'] + (bb_std * 2)
-        df['bb_lower'] = df['bb_middle'] - (bb_std * 2)
-        df['bb_width'] = df['bb_upper'] - df['bb_lower']
-        df['bb_position'] = (df['c'] - df['bb_lower']) / df['bb_width']
-        
-        df['volatility'] = df['returns'].rolling(20).std()
-        df['atr'] = self.calculate_atr(df)
-        
-        if 'v' in df.columns:
-            df['volume_ratio'] = df['v'] / df['v'].rolling(20).mean()
-            df['volume_trend'] = df['v'].rolling(5).mean() / df['v'].rolling(20).mean()
-        
-        df['high_low_ratio'] = df['h'] / df['l']
-        df['close_open_ratio'] = df['c'] / df['o']
-        df['momentum_3'] = df['c'] / df['c'].shift(3) - 1
-        df['momentum_5'] = df['c'] / df['c'].shift(5) - 1
-        df['momentum_10'] = df['c'] / df['c'].shift(10) - 1
-        
-        df = df.dropna()
-        if len(df) == 0:
+        if len(history) < MIN_BARS:
             return None
-            
-        feature_cols = [
-            'returns', 'log_returns', 'sma_5', 'sma_10', 'sma_20',
-            'ema_9', 'ema_21', 'rsi', 'macd', 'macd_signal', 'macd_diff',
-            'bb_position', 'bb_width', 'volatility', 'atr',
-            'high_low_ratio', 'close_open_ratio',
-            'momentum_3', 'momentum_5', 'momentum_10'
-        ]
-        if 'volume_ratio' in df.columns:
-            feature_cols.extend(['volume_ratio', 'volume_trend'])
-        
-        return df[feature_cols].iloc[-1:].values
+        return self.feature_store.get_features(self.pair, self.timeframe, history)
+    
+    def get_frame(self, history):
+        return self.feature_store.get_frame(self.pair, self.timeframe, history)
+    
+    def latest_indicators(self, history):
+        return self.feature_store.get_latest(self.pair, self.timeframe, history)
     
     def calculate_atr(self, df, period=14):
-        high_low = df['h'] - df['l']
-        high_close = np.abs(df['h'] - df['c'].shift())
-        low_close = np.abs(df['l'] - df['c'].shift())
-        ranges = pd.concat([high_low, high_close, low_close], axis=1)
-        true_range = np.max(ranges, axis=1)
-        return true_range.rolling(period).mean()
-    
-    def save(self):
-        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        joblib.dump({
-            'model': self.model,
-            'scaler': self.scaler,
-            'performance': self.performance,
+        return calculate_atr(df, period)
+    
+    def result(self, direction, confidence, *values):
+        """Prediction del agente; values en el orden de self.details"""
+        return Prediction(self.name, direction, confidence, self.details, values)
+    
+    def neutral(self, reason=None):
+        """Predicción NEUTRAL sin opinión; con reason cuenta como respuesta de
+        reserva ('insufficient_data' o 'error')"""
+        if reason is not None:
+            neutral_fallbacks.inc(self.name, reason)
+        return Prediction(self.name, "NEUTRAL", 0)
+    
+    def fallback(self, error):
+        """NEUTRAL en lugar de propagar una excepción de predict"""
+        swallow(self.name, error)
+        return self.neutral("error")
+    
+    def model_outputs(self, features, model=None, scaler=None):
+        """Salida del modelo para una o varias filas de features (con model y
+        scaler ya resueltos, si se dan, en lugar de pedirlos al registro)"""
+        model = self.model if model is None else model
+        scaler = self.scaler if scaler is None else scaler
+        return model.predict(scaler.transform(features))
+    
+    def predict(self, current_price, history):
+        if not self.uses_model:
+            raise NotImplementedError
+        features = self.prepare_features(history)
+        if features is None:
+            return self.neutral("insufficient_data")
+        try:
+            prediction = self.model_outputs(features)[0]
+            return self.interpret(current_price, history, prediction)
+        except Exception as e:
+            return self.fallback(e)
+    
+    def interpret(self, current_price, history, prediction):
+        """Convierte la salida del modelo en dirección y confianza"""
+        raise NotImplementedError
+    
+    def save(self, registry=None):
+        """Guarda el agente en registry (por defecto, el de la clase) y
+        devuelve la ruta; el modelo y el escalador van compilados a arrays
+        NumPy si se puede (modules.tree_ensemble), para servir sin
+        scikit-learn, XGBoost ni LightGBM"""
+        from .tree_ensemble import for_serving
+        model, scaler = for_serving(self.model, self.scaler)
+        return (registry or self.registry).put(self.pair, self.timeframe, self.name, {
+            'model': model,
+            'scaler': scaler,
+            'performance': self.performance or dict(PERFORMANCE),
             'name': self.name,
             'pair': self.pair,
             'timeframe': self.timeframe
-        }, self.model_path)
+        })
     
     def load(self):
-        if os.path.exists(self.model_path):
-            data = joblib.load(self.model_path)
-            self.model = data['model']
-            self.scaler = data['scaler']
-            self.performance = data['performance']
-            return True
-        return False
+        """Comprueba que hay modelo guardado y recupera su rendimiento; el
+        modelo y el escalador se siguen sirviendo desde el registro"""
+        data = self.registry.get(self.pair, self.timeframe, self.name)
+        if data is None:
+            return False
+        self._model = None
+        self._scaler = None
+        self.performance = dict(data['performance'])
+        return True
 
 class TrendAgent(BaseAgent):
+    __slots__ = ()
+    details = ("predicted_price",)
+    uses_model = True
+    
     def __init__(self, pair, timeframe):
         super().__init__("TrendAgent", pair, timeframe)
-        self.model = RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42)
     
-    def predict(self, current_price, history):
-        features = self.prepare_features(history)
-        if features is None:
-            return {"agent": self.name, "direction": "NEUTRAL", "confidence": 0}
-        try:
-            features_scaled = self.scaler.transform(features)
-            prediction = self.model.predict(features_scaled)[0]
-            if prediction > current_price * 1.001:
-                direction = "BUY"
-                confidence = min(95, abs(prediction - current_price) / current_price * 10000)
-            elif prediction < current_price * 0.999:
-                direction = "SELL"
-                confidence = min(95, abs(current_price - prediction) / current_price * 10000)
-            else:
-                direction = "HOLD"
-                confidence = 50
-            return {
-                "agent": self.name,
-                "direction": direction,
-                "confidence": confidence,
-                "predicted_price": prediction
-            }
-        except Exception:
-            return {"agent": self.name, "direction": "NEUTRAL", "confidence": 0}
+    def build_model(self):
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42)
+    
+    def interpret(self, current_price, history, prediction):
+        if prediction > current_price * 1.001:
+            direction = "BUY"
+            confidence = min(95, abs(prediction - current_price) / current_price * 10000)
+        elif prediction < current_price * 0.999:
+            direction = "SELL"
+            confidence = min(95, abs(current_price - prediction) / current_price * 10000)
+        else:
+            direction = "HOLD"
+            confidence = 50
+        return self.result(direction, confidence, prediction)
 
 class MomentumAgent(BaseAgent):
+    __slots__ = ()
+    details = ("momentum", "rsi")
+    uses_model = True
+    
     def __init__(self, pair, timeframe):
         super().__init__("MomentumAgent", pair, timeframe)
-        self.model = GradientBoostingRegressor(n_estimators=100, learning_rate=0.1, max_depth=5)
     
-    def predict(self, current_price, history):
-        features = self.prepare_features(history)
-        if features is None:
-            return {"agent": self.name, "direction": "NEUTRAL", "confidence": 0}
-        try:
-            df = pd.DataFrame(history)
-            momentum = df['c'].pct_change(5).iloc[-1]
-            rsi = self.calculate_rsi(df['c'])
-            features_scaled = self.scaler.transform(features)
-            prediction = self.model.predict(features_scaled)[0]
-            if momentum > 0.002 and rsi < 70:
-                direction = "BUY"
-                confidence = min(90, momentum * 10000)
-            elif momentum < -0.002 and rsi > 30:
-                direction = "SELL"
-                confidence = min(90, abs(momentum) * 10000)
-            else:
-                direction = "HOLD"
-                confidence = 40
-            return {
-                "agent": self.name,
-                "direction": direction,
-                "confidence": confidence,
-                "momentum": momentum,
-                "rsi": rsi
-            }
-        except Exception:
-            return {"agent": self.name, "direction": "NEUTRAL", "confidence": 0}
-    
-    def calculate_rsi(self, prices, period=14):
-        delta = prices.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(period).mean()
-        rs = gain / loss
-        return 100 - (100 / (1 + rs)).iloc[-1]
+    def build_model(self):
+        from sklearn.ensemble import GradientBoostingRegressor
+        return GradientBoostingRegressor(n_estimators=100, learning_rate=0.1, max_depth=5)
+    
+    def interpret(self, current_price, history, prediction):
+        # La salida del modelo no entra en la regla, pero el agente solo
+        # opina si el modelo está entrenado y predice sin error
+        latest = self.latest_indicators(history)
+        momentum = latest['momentum_5']
+        rsi = latest['rsi']
+        if momentum > 0.002 and rsi < 70:
+            direction = "BUY"
+            confidence = min(90, momentum * 10000)
+        elif momentum < -0.002 and rsi > 30:
+            direction = "SELL"
+            confidence = min(90, abs(momentum) * 10000)
+        else:
+            direction = "HOLD"
+            confidence = 40
+        return self.result(direction, confidence, momentum, rsi)
 
 class VolatilityAgent(BaseAgent):
+    __slots__ = ()
+    stateless = True
+    details = ("volatility", "atr")
     def __init__(self, pair, timeframe):
         super().__init__("VolatilityAgent", pair, timeframe)
-        self.model = xgb.XGBRegressor(n_estimators=100, max_depth=6, learning_rate=0.01)
+    
+    def build_model(self):
+        import xgboost as xgb
+        return xgb.XGBRegressor(n_estimators=100, max_depth=6, learning_rate=0.01)
     
     def predict(self, current_price, history):
         features = self.prepare_features(history)
         if features is None:
-            return {"agent": self.name, "direction": "NEUTRAL", "confidence": 0}
+            return self.neutral("insufficient_data")
         try:
-            df = pd.DataFrame(history)
-            volatility = df['c'].pct_change().std()
-            atr = self.calculate_atr(df).iloc[-1]
-            sma = df['c'].rolling(20).mean().iloc[-1]
-            std = df['c'].rolling(20).std().iloc[-1]
-            upper_band = sma + (2 * std)
-            lower_band = sma - (2 * std)
+            latest = self.latest_indicators(history)
+            volatility = self.feature_store.get_returns_std(self.pair, self.timeframe, history)
+            atr = latest['atr']
+            upper_band = latest['bb_upper']
+            lower_band = latest['bb_lower']
             if current_price <= lower_band and volatility < 0.01:
                 direction = "BUY"
                 confidence = 85
@@ -205,45 +316,33 @@ class VolatilityAgent(BaseAgent):
             else:
                 direction = "HOLD"
                 confidence = 60
-            return {
-                "agent": self.name,
-                "direction": direction,
-                "confidence": confidence,
-                "volatility": volatility,
-                "atr": atr
-            }
-        except Exception:
-            return {"agent": self.name, "direction": "NEUTRAL", "confidence": 0}
+            return self.result(direction, confidence, volatility, atr)
+        except Exception as e:
+            return self.fallback(e)
 
 class PatternAgent(BaseAgent):
+    __slots__ = ()
+    stateless = True
+    details = ("patterns",)
+    # Patrones de modules.patterns en los que se basa la señal del agente
+    patterns = ("DOJI", "HAMMER", "BULLISH_ENGULFING", "BEARISH_ENGULFING")
+    
     def __init__(self, pair, timeframe):
         super().__init__("PatternAgent", pair, timeframe)
-        self.model = MLPRegressor(hidden_layer_sizes=(100, 50), max_iter=1000)
-    
-    def detect_patterns(self, df):
-        patterns = []
-        if abs(df['c'].iloc[-1] - df['o'].iloc[-1]) < (df['h'].iloc[-1] - df['l'].iloc[-1]) * 0.1:
-            patterns.append("DOJI")
-        body = abs(df['c'].iloc[-1] - df['o'].iloc[-1])
-        lower_shadow = min(df['c'].iloc[-1], df['o'].iloc[-1]) - df['l'].iloc[-1]
-        if lower_shadow > body * 2:
-            patterns.append("HAMMER")
-        if len(df) > 1:
-            prev_body = abs(df['c'].iloc[-2] - df['o'].iloc[-2])
-            curr_body = abs(df['c'].iloc[-1] - df['o'].iloc[-1])
-            if curr_body > prev_body * 1.5:
-                if df['c'].iloc[-1] > df['o'].iloc[-1] and df['c'].iloc[-2] < df['o'].iloc[-2]:
-                    patterns.append("BULLISH_ENGULFING")
-                elif df['c'].iloc[-1] < df['o'].iloc[-1] and df['c'].iloc[-2] > df['o'].iloc[-2]:
-                    patterns.append("BEARISH_ENGULFING")
-        return patterns
+    
+    def build_model(self):
+        from sklearn.neural_network import MLPRegressor
+        return MLPRegressor(hidden_layer_sizes=(100, 50), max_iter=1000)
+    
+    def detect_patterns(self, bars):
+        """Patrones de la última vela de bars"""
+        return latest(bars, self.patterns)
     
     def predict(self, current_price, history):
         if len(history) < 20:
-            return {"agent": self.name, "direction": "NEUTRAL", "confidence": 0}
+            return self.neutral("insufficient_data")
         try:
-            df = pd.DataFrame(history)
-            patterns = self.detect_patterns(df)
+            patterns = self.detect_patterns(history[-2:])
             if "BULLISH_ENGULFING" in patterns or "HAMMER" in patterns:
                 direction = "BUY"
                 confidence = 80
@@ -256,27 +355,27 @@ class PatternAgent(BaseAgent):
             else:
                 direction = "NEUTRAL"
                 confidence = 50
-            return {
-                "agent": self.name,
-                "direction": direction,
-                "confidence": confidence,
-                "patterns": patterns
-            }
-        except Exception:
-            return {"agent": self.name, "direction": "NEUTRAL", "confidence": 0}
+            return self.result(direction, confidence, patterns)
+        except Exception as e:
+            return self.fallback(e)
 
 class ScalpingAgent(BaseAgent):
+    __slots__ = ()
+    stateless = True
+    details = ("micro_trend",)
     def __init__(self, pair, timeframe):
         super().__init__("ScalpingAgent", pair, timeframe)
-        self.model = lgb.LGBMRegressor(n_estimators=100, num_leaves=31, learning_rate=0.05)
+    
+    def build_model(self):
+        import lightgbm as lgb
+        return lgb.LGBMRegressor(n_estimators=100, num_leaves=31, learning_rate=0.05)
     
     def predict(self, current_price, history):
         if len(history) < 10:
-            return {"agent": self.name, "direction": "NEUTRAL", "confidence": 0}
+            return self.neutral("insufficient_data")
         try:
-            recent_prices = [h['c'] for h in history[-10:]]
+            recent_prices = closes(history[-10:])
             avg_price = np.mean(recent_prices)
-            price_std = np.std(recent_prices)
             micro_trend = (recent_prices[-1] - recent_prices[-5]) / recent_prices[-5]
             if micro_trend > 0.0005 and current_price < avg_price:
                 direction = "BUY"
@@ -287,34 +386,29 @@ class ScalpingAgent(BaseAgent):
             else:
                 direction = "HOLD"
                 confidence = 55
-            return {
-                "agent": self.name,
-                "direction": direction,
-                "confidence": confidence,
-                "micro_trend": micro_trend
-            }
-        except Exception:
-            return {"agent": self.name, "direction": "NEUTRAL", "confidence": 0}
+            return self.result(direction, confidence, micro_trend)
+        except Exception as e:
+            return self.fallback(e)
 
 class NewsAgent(BaseAgent):
+    __slots__ = ()
+    stateless = True
+    details = ("volatility_signal",)
     def __init__(self, pair, timeframe):
         super().__init__("NewsAgent", pair, timeframe)
     
     def predict(self, current_price, history):
+        if len(history) == 0:
+            return self.neutral("insufficient_data")
         try:
-            df = pd.DataFrame(history)
-            recent_volatility = df['c'].pct_change().tail(10).std()
+            recent = closes(history[-11:])
+            recent_volatility = np.std(recent[1:] / recent[:-1] - 1, ddof=1)
             if recent_volatility > 0.005:
-                direction = "BUY" if df['c'].iloc[-1] > df['c'].iloc[-5] else "SELL"
+                direction = "BUY" if recent[-1] > recent[-5] else "SELL"
                 confidence = 70
             else:
                 direction = "HOLD"
                 confidence = 60
-            return {
-                "agent": self.name,
-                "direction": direction,
-                "confidence": confidence,
-                "volatility_signal": recent_volatility
-            }
-        except Exception:
-            return {"agent": self.name, "direction": "NEUTRAL", "confidence": 0}
+            return self.result(direction, confidence, recent_volatility)
+        except Exception as e:
+            return self.fallback(e)
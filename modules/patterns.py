@@ -0,0 +1,209 @@
+# modules/patterns.py
+# Patrones de velas vectorizados: cada patrón es una función que recibe las
+# columnas de toda la serie y devuelve una máscara booleana con una posición
+# por vela. Con ellos se etiqueta el historial completo de una vez (backtest,
+# gráficos) y se rastrea el mercado entero buscando las últimas coincidencias.
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Velas por bloque al etiquetar series largas (acota la memoria intermedia)
+CHUNK_BARS = 1 << 20
+
+
+class Pattern:
+    __slots__ = ("name", "bias", "bars", "detect")
+
+    def __init__(self, name, bias, bars, detect):
+        self.name = name
+        self.bias = bias
+        self.bars = bars
+        self.detect = detect
+
+
+# Patrones registrados, en el orden en que se listan las coincidencias
+PATTERNS = OrderedDict()
+
+
+def pattern(name, bias, bars=1):
+    """Registra una función de detección; bias es BUY, SELL o HOLD y bars el
+    número de velas que mira (la actual y las bars - 1 anteriores)"""
+    def register(fn):
+        PATTERNS[name] = Pattern(name, bias, bars, fn)
+        return fn
+    return register
+
+
+def max_span(names=None):
+    return max(PATTERNS[name].bars for name in (names or PATTERNS))
+
+
+class Candles:
+    """Columnas o/h/l/c como arrays y medidas derivadas que comparten los patrones"""
+    def __init__(self, o, h, l, c):
+        self.o, self.h, self.l, self.c = o, h, l, c
+        self.body = np.abs(c - o)
+        self.range = h - l
+        self.top = np.maximum(c, o)
+        self.bottom = np.minimum(c, o)
+        self.upper_shadow = h - self.top
+        self.lower_shadow = self.bottom - l
+        self.bullish = c > o
+        self.bearish = c < o
+
+    @staticmethod
+    def prev(values, n=1):
+        """values desplazado n velas (la vela i ve la i - n); sin vela previa,
+        NaN o False, para que ninguna comparación se cumpla"""
+        out = np.empty_like(values)
+        out[:n] = False if values.dtype == bool else np.nan
+        out[n:] = values[:-n]
+        return out
+
+
+@pattern("DOJI", "HOLD")
+def _doji(k):
+    return k.body < k.range * 0.1
+
+
+@pattern("HAMMER", "BUY")
+def _hammer(k):
+    return k.lower_shadow > k.body * 2
+
+
+@pattern("BULLISH_ENGULFING", "BUY", bars=2)
+def _bullish_engulfing(k):
+    return (k.body > k.prev(k.body) * 1.5) & k.bullish & k.prev(k.bearish)
+
+
+@pattern("BEARISH_ENGULFING", "SELL", bars=2)
+def _bearish_engulfing(k):
+    return (k.body > k.prev(k.body) * 1.5) & k.bearish & k.prev(k.bullish)
+
+
+@pattern("SHOOTING_STAR", "SELL")
+def _shooting_star(k):
+    return (k.upper_shadow > k.body * 2) & (k.lower_shadow < k.body)
+
+
+@pattern("BULLISH_HARAMI", "BUY", bars=2)
+def _bullish_harami(k):
+    return (k.bullish & k.prev(k.bearish)
+            & (k.top < k.prev(k.top)) & (k.bottom > k.prev(k.bottom)))
+
+
+@pattern("BEARISH_HARAMI", "SELL", bars=2)
+def _bearish_harami(k):
+    return (k.bearish & k.prev(k.bullish)
+            & (k.top < k.prev(k.top)) & (k.bottom > k.prev(k.bottom)))
+
+
+@pattern("MORNING_STAR", "BUY", bars=3)
+def _morning_star(k):
+    first_body = k.prev(k.body, 2)
+    return (k.prev(k.bearish, 2) & (k.prev(k.body) < first_body * 0.3) & k.bullish
+            & (k.c > (k.prev(k.o, 2) + k.prev(k.c, 2)) / 2))
+
+
+@pattern("EVENING_STAR", "SELL", bars=3)
+def _evening_star(k):
+    first_body = k.prev(k.body, 2)
+    return (k.prev(k.bullish, 2) & (k.prev(k.body) < first_body * 0.3) & k.bearish
+            & (k.c < (k.prev(k.o, 2) + k.prev(k.c, 2)) / 2))
+
+
+@pattern("THREE_WHITE_SOLDIERS", "BUY", bars=3)
+def _three_white_soldiers(k):
+    return (k.bullish & k.prev(k.bullish) & k.prev(k.bullish, 2)
+            & (k.c > k.prev(k.c)) & (k.prev(k.c) > k.prev(k.c, 2)))
+
+
+@pattern("THREE_BLACK_CROWS", "SELL", bars=3)
+def _three_black_crows(k):
+    return (k.bearish & k.prev(k.bearish) & k.prev(k.bearish, 2)
+            & (k.c < k.prev(k.c)) & (k.prev(k.c) < k.prev(k.c, 2)))
+
+
+def _columns(bars):
+    """o, h, l, c como arrays float de una CandleView, un DataFrame o una lista de dicts"""
+    if hasattr(bars, 'columns') and not callable(bars.columns):
+        return tuple(bars[col].to_numpy(dtype=float) for col in 'ohlc')
+    if hasattr(bars, 'o'):
+        return tuple(np.asarray(getattr(bars, col), dtype=float) for col in 'ohlc')
+    return tuple(np.array([bar[col] for bar in bars], dtype=float) for col in 'ohlc')
+
+
+def detect(bars, names=None):
+    """{patrón: máscara booleana} sobre todas las velas de bars"""
+    names = list(names or PATTERNS)
+    o, h, l, c = _columns(bars)
+    n = len(c)
+    masks = OrderedDict((name, np.zeros(n, dtype=bool)) for name in names)
+    overlap = max_span(names) - 1
+    with np.errstate(invalid='ignore'):
+        for a in range(0, n, CHUNK_BARS):
+            start, b = max(0, a - overlap), min(a + CHUNK_BARS, n)
+            k = Candles(o[start:b], h[start:b], l[start:b], c[start:b])
+            for name in names:
+                masks[name][a:b] = PATTERNS[name].detect(k)[a - start:]
+    return masks
+
+
+def labels(masks):
+    """Nombres de los patrones de cada vela, separados por comas ('' si ninguno)"""
+    names = list(masks)
+    if not names:
+        return []
+    matrix = np.column_stack([masks[name] for name in names])
+    return [", ".join(names[j] for j in np.flatnonzero(row)) for row in matrix]
+
+
+def latest(bars, names=None):
+    """Patrones que se cumplen en la última vela de bars"""
+    names = list(names or PATTERNS)
+    tail = bars[-max_span(names):]
+    if len(tail) == 0:
+        return []
+    return [name for name, mask in detect(tail, names).items() if mask[-1]]
+
+
+def scan_market(load, pairs, timeframes, names=None, lookback=1, bias=None, max_workers=8):
+    """Coincidencias en las últimas `lookback` velas de cada (par, timeframe)
+
+    load(pair, timeframe) devuelve el historial (CandleView); bias filtra por
+    BUY, SELL o HOLD. Cada par se procesa en un hilo con todos sus timeframes
+    (así sus descargas se agrupan). Devuelve las coincidencias de la más
+    reciente a la más antigua y los (par, timeframe) sin datos.
+    """
+    names = [name for name in (names or PATTERNS) if bias is None or PATTERNS[name].bias == bias]
+    window = lookback + max_span(names) - 1 if names else 0
+
+    def scan_pair(pair):
+        found, empty = [], []
+        for timeframe in timeframes:
+            history = load(pair, timeframe)
+            if history is None or len(history) == 0:
+                empty.append((pair, timeframe))
+                continue
+            tail = history[-window:]
+            masks = detect(tail, names)
+            for name, mask in masks.items():
+                for i in np.flatnonzero(mask[-lookback:]) + max(len(tail) - lookback, 0):
+                    bar = tail[int(i)]
+                    found.append({
+                        "pair": pair, "timeframe": timeframe, "pattern": name,
+                        "bias": PATTERNS[name].bias, "t": bar['t'], "timestamp": bar['timestamp'],
+                        "bars_ago": len(tail) - 1 - int(i), "close": bar['c']
+                    })
+        return found, empty
+
+    matches, missing = [], []
+    if not names:
+        return matches, missing
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="patterns") as pool:
+        for found, empty in pool.map(scan_pair, pairs):
+            matches.extend(found)
+            missing.extend(empty)
+    matches.sort(key=lambda m: (-m["t"], m["pair"], m["timeframe"]))
+    return matches, missing
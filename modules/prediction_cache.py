@@ -0,0 +1,140 @@
+# modules/prediction_cache.py
+# Consensos ya calculados por (par, timeframe, última vela, tramo de precio).
+# Un consenso no cambia mientras no cierre una vela nueva ni se mueva el
+# precio, así que los espectadores del mismo par comparten un único cálculo.
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Anchura del tramo de precio en puntos básicos (1 pb ~ 1 pip en EURUSD)
+PRICE_BUCKET_BP = float(os.environ.get("SOYTUGUIA_PRICE_BUCKET_BP", "1.0"))
+
+
+def price_bucket(price, width_bp=PRICE_BUCKET_BP):
+    """Tramo logarítmico del precio: mismo tramo = menos de width_bp de diferencia"""
+    if not price or price <= 0 or not math.isfinite(price):
+        return None
+    return int(math.floor(math.log(price) / (width_bp * 1e-4)))
+
+
+def reprice(prediction, price):
+    """Copia del consenso llevada al precio actual (target y stop son
+    proporcionales al precio en MasterCoordinator.combine)"""
+    result = dict(prediction)
+    old = prediction.get('current_price')
+    if old and price and old != price:
+        ratio = price / old
+        result['current_price'] = price
+        for field in ('target_price', 'stop_loss'):
+            if field in result:
+                result[field] = result[field] * ratio
+    return result
+
+
+class PredictionCache:
+    """Caché LRU de consensos con un solo cálculo por clave a la vez
+
+    Cuando llega una vela nueva para un (par, timeframe) se descartan las
+    entradas de velas anteriores. Las peticiones simultáneas de una clave que
+    se está calculando esperan ese cálculo en lugar de repetirlo. Los
+    consensos parciales (agentes fuera de plazo o con error) no se guardan.
+    max_age (segundos) limita además la edad de lo que se sirve.
+    """
+    def __init__(self, maxsize=1024, max_age=None, bucket_bp=None):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.bucket_bp = PRICE_BUCKET_BP if bucket_bp is None else bucket_bp
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.age_total = 0.0
+        self.age_max = 0.0
+        self._entries = OrderedDict()
+        self._latest_bar = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def key(self, pair, timeframe, bar_time, price):
+        return (pair, timeframe, bar_time, price_bucket(price, self.bucket_bp))
+
+    def _invalidate_older(self, pair, timeframe, bar_time):
+        latest = self._latest_bar.get((pair, timeframe))
+        if latest is not None and bar_time is not None and bar_time < latest:
+            return
+        if latest is not None and bar_time != latest:
+            for key in [k for k in self._entries if k[0] == pair and k[1] == timeframe]:
+                del self._entries[key]
+                self.invalidations += 1
+        self._latest_bar[(pair, timeframe)] = bar_time
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created, prediction = entry
+        age = now - created
+        if self.max_age is not None and age > self.max_age:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.age_total += age
+        self.age_max = max(self.age_max, age)
+        return prediction
+
+    def get_or_compute(self, pair, timeframe, bar_time, price, compute):
+        """Consenso cacheado para la clave o compute() si no lo hay"""
+        key = self.key(pair, timeframe, bar_time, price)
+        now = time.monotonic()
+        with self._lock:
+            self._invalidate_older(pair, timeframe, bar_time)
+            prediction = self._lookup(key, now)
+            if prediction is not None:
+                return reprice(prediction, price)
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return reprice(future.result(), price)
+        try:
+            prediction = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+            if not prediction.get('partial') and self._latest_bar.get((pair, timeframe)) == bar_time:
+                self._entries[key] = (time.monotonic(), prediction)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        future.set_result(prediction)
+        return reprice(prediction, price)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._latest_bar.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else None,
+                "invalidations": self.invalidations,
+                "mean_age_s": self.age_total / self.hits if self.hits else None,
+                "max_age_s": self.age_max
+            }
@@ -1,10 +1,32 @@
 # modules/predictor.py
 # Puedes extender esto con lógica adicional de post-procesamiento, backtesting, etc.
 
+def describe_trend(prediction):
+    """Tendencia a partir de los scores del consenso"""
+    scores = prediction.get('scores') or {}
+    buy, sell = scores.get('buy', 0), scores.get('sell', 0)
+    if buy > sell and buy >= 40:
+        return "📈 SUBIDA"
+    if sell > buy and sell >= 40:
+        return "📉 BAJADA"
+    return "➡️ LATERAL"
+
+def recommended_action(prediction):
+    """Acción que muestra el dashboard"""
+    direction = prediction.get('direction', '')
+    if prediction.get('confidence', 0) >= 70:
+        if 'COMPRAR' in direction:
+            return "COMPRAR AHORA"
+        if 'VENDER' in direction:
+            return "VENDER AHORA"
+    return "ESPERAR"
+
 def analyze_prediction(prediction):
     """Función de ejemplo para análisis adicional"""
     risk_level = "LOW" if prediction['confidence'] < 70 else "HIGH"
     return {
         **prediction,
-        "risk_level": risk_level
+        "risk_level": risk_level,
+        "trend": describe_trend(prediction),
+        "action": recommended_action(prediction)
     }
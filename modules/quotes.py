@@ -0,0 +1,130 @@
+# modules/quotes.py
+# Últimos precios con caché de vida corta y agrupación de peticiones: si
+# varios clientes del dashboard piden a la vez los mismos pares, solo uno
+# consulta la API y el resto espera su resultado.
+import math
+import os
+import threading
+import time
+
+from .metrics import swallow
+
+QUOTE_TTL = float(os.environ.get("SOYTUGUIA_QUOTE_TTL", "1.0"))
+
+
+class Prices(dict):
+    """dict par -> precio con los pares sin precio aparte
+
+    missing guarda par -> motivo; esos pares no aparecen como claves, así que
+    nunca llegan a los agentes con un precio 0. as_of guarda par -> tiempo (ms)
+    de la vela de la que sale el precio, si la API lo da.
+    """
+    def __init__(self, prices=None, missing=None, as_of=None):
+        super().__init__(prices or {})
+        self.missing = missing or {}
+        self.as_of = as_of or {}
+
+
+class _Flight:
+    __slots__ = ("done",)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class QuoteCache:
+    """Caché TTL de precios delante de una función de descarga por lotes
+
+    fetch(pairs) devuelve (precios, errores): {par: (precio, t_ms)} y
+    {par: motivo}. Los errores también se recuerdan durante ttl para no
+    insistir contra un par que está fallando en cada refresco.
+    """
+    def __init__(self, fetch, ttl=None, wait_timeout=10.0):
+        self.fetch = fetch
+        self.ttl = QUOTE_TTL if ttl is None else ttl
+        self.wait_timeout = wait_timeout
+        self.hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, pair, now):
+        entry = self._entries.get(pair)
+        return entry is not None and now - entry[0] < self.ttl
+
+    def get(self, pairs):
+        pairs = list(dict.fromkeys(pairs))
+        now = time.monotonic()
+        with self._lock:
+            stale = [p for p in pairs if not self._fresh(p, now)]
+            self.hits += len(pairs) - len(stale)
+            self.misses += len(stale)
+            waits = {self._inflight[p] for p in stale if p in self._inflight}
+            mine = [p for p in stale if p not in self._inflight]
+            self.coalesced += len(stale) - len(mine)
+            flight = None
+            if mine:
+                flight = _Flight()
+                for p in mine:
+                    self._inflight[p] = flight
+                self.upstream_calls += 1
+        if flight is not None:
+            try:
+                self._refresh(mine)
+            finally:
+                with self._lock:
+                    for p in mine:
+                        self._inflight.pop(p, None)
+                flight.done.set()
+        for other in waits:
+            other.done.wait(self.wait_timeout)
+        return self._snapshot(pairs)
+
+    def _refresh(self, pairs):
+        try:
+            prices, errors = self.fetch(pairs)
+        except Exception as e:
+            swallow("quotes", e)
+            prices, errors = {}, {p: repr(e) for p in pairs}
+        stamp = time.monotonic()
+        with self._lock:
+            for pair in pairs:
+                price, t = prices.get(pair, (None, None))
+                if price is None or not math.isfinite(price) or price <= 0:
+                    reason = errors.get(pair) or ("precio no válido" if price is not None else "sin datos")
+                    self._entries[pair] = (stamp, None, None, reason)
+                else:
+                    self._entries[pair] = (stamp, float(price), t, None)
+
+    def _snapshot(self, pairs):
+        prices, missing, as_of = {}, {}, {}
+        with self._lock:
+            for pair in pairs:
+                entry = self._entries.get(pair)
+                if entry is None:
+                    missing[pair] = "sin respuesta"
+                elif entry[1] is None:
+                    missing[pair] = entry[3]
+                else:
+                    prices[pair] = entry[1]
+                    if entry[2] is not None:
+                        as_of[pair] = entry[2]
+        return Prices(prices, missing, as_of)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "upstream_calls": self.upstream_calls,
+                "coalesced": self.coalesced
+            }
@@ -0,0 +1,236 @@
+# modules/registry.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .bundle import BUNDLE_NAME, BundleError, ModelBundle, changed, entry_key
+from .metrics import swallow
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+MODELS_DIR = os.environ.get("SOYTUGUIA_MODELS_DIR", DEFAULT_ROOT)
+MAX_RESIDENT_MB = float(os.environ.get("SOYTUGUIA_MAX_RESIDENT_MB", "512"))
+# Pares (o par:timeframe) a precargar al arrancar, p. ej. "EURUSD,GBPUSD:H1"
+HOT_SET = os.environ.get("SOYTUGUIA_HOT_SET", "")
+# Bundle de modelos (modules.bundle); por defecto <MODELS_DIR>/models.bundle
+BUNDLE_PATH = os.environ.get("SOYTUGUIA_MODELS_BUNDLE")
+# Segundos entre comprobaciones de si el bundle se ha reemplazado
+BUNDLE_CHECK_SECONDS = float(os.environ.get("SOYTUGUIA_BUNDLE_CHECK_SECONDS", "1.0"))
+# "0" no comprueba el crc32 de cada entrada del bundle al cargarla
+BUNDLE_VERIFY = os.environ.get("SOYTUGUIA_BUNDLE_VERIFY", "1") != "0"
+
+
+def parse_hot_set(spec):
+    """'EURUSD,GBPUSD:H1' -> [('EURUSD', None), ('GBPUSD', 'H1')]"""
+    hot = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        pair, _, timeframe = item.partition(":")
+        hot.append((pair, timeframe or None))
+    return hot
+
+
+class ModelRegistry:
+    """Registro de modelos entrenados: carga perezosa y LRU acotada por tamaño
+
+    Cada (par, timeframe, agente) se lee de disco la primera vez que se pide,
+    con los arrays NumPy mapeados en memoria (mmap_mode) para no copiarlos al
+    heap. Los modelos residentes se expulsan por antigüedad de uso cuando su
+    tamaño en disco supera max_bytes.
+
+    Si existe el bundle (un solo fichero con todos los modelos), las entradas
+    que contiene se leen de él y no de los .joblib sueltos. Cuando el fichero
+    se reemplaza (os.replace, sin parar el servidor) se abre el nuevo y se
+    olvidan los modelos residentes del anterior.
+    """
+    def __init__(self, root=None, max_bytes=None, mmap_mode="r", bundle=None):
+        self.root = root or MODELS_DIR
+        self.bundle_path = bundle or BUNDLE_PATH or os.path.join(self.root, BUNDLE_NAME)
+        self.max_bytes = max_bytes if max_bytes is not None else int(MAX_RESIDENT_MB * 1024 * 1024)
+        self.mmap_mode = mmap_mode
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.swaps = 0
+        self.resident_bytes = 0
+        self._resident = OrderedDict()
+        self._missing = set()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._preload_thread = None
+        self._bundle = None
+        self._bundle_checked = None
+        # Cambia con cada bundle nuevo: lo cargado del anterior no se guarda
+        self._generation = 0
+
+    def _check_bundle(self):
+        """Abre el bundle si ha aparecido o se ha reemplazado (como mucho cada
+        BUNDLE_CHECK_SECONDS)"""
+        now = time.monotonic()
+        checked = self._bundle_checked
+        if checked is not None and now - checked < BUNDLE_CHECK_SECONDS:
+            return
+        self._bundle_checked = now
+        current = self._bundle
+        if not changed(self.bundle_path, current.identity if current is not None else None):
+            return
+        try:
+            bundle = ModelBundle(self.bundle_path, copy=self.mmap_mode is None, check=BUNDLE_VERIFY) \
+                if os.path.exists(self.bundle_path) else None
+        except (OSError, BundleError) as e:
+            swallow("model_bundle", e)
+            print(f"⚠️ Bundle de modelos ilegible ({e}), se mantiene el anterior")
+            return
+        with self._lock:
+            if self._bundle is not current:
+                return
+            self._bundle = bundle
+            self._generation += 1
+            self._resident.clear()
+            self._missing.clear()
+            self.resident_bytes = 0
+            if current is not None:
+                self.swaps += 1
+        if bundle is not None:
+            print(f"📦 Bundle de modelos: {len(bundle)} entradas ({bundle.created})")
+
+    def reload(self):
+        """Comprueba ya si el bundle ha cambiado"""
+        self._bundle_checked = None
+        self._check_bundle()
+
+    def path_for(self, pair, timeframe, name):
+        return os.path.join(self.root, pair, f"{name}_{timeframe}.joblib")
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._resident:
+                self._resident.move_to_end(key)
+                self.hits += 1
+                return self._resident[key][0]
+            if key in self._missing:
+                return None
+        return False
+
+    def _store(self, key, entry, size, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                # Cargado de un bundle que ya se ha reemplazado
+                return
+            if key in self._resident:
+                self.resident_bytes -= self._resident[key][1]
+            self._resident[key] = (entry, size)
+            self._resident.move_to_end(key)
+            self.resident_bytes += size
+            self._missing.discard(key)
+            while self.resident_bytes > self.max_bytes and len(self._resident) > 1:
+                _, (_, old_size) = self._resident.popitem(last=False)
+                self.resident_bytes -= old_size
+                self.evictions += 1
+
+    def get(self, pair, timeframe, name):
+        """Devuelve el dict guardado por BaseAgent.save (o None si no existe)"""
+        key = (pair, timeframe, name)
+        self._check_bundle()
+        entry = self._lookup(key)
+        if entry is not False:
+            return entry
+        with self._key_lock(key):
+            entry = self._lookup(key)
+            if entry is not False:
+                return entry
+            with self._lock:
+                self.misses += 1
+                bundle, generation = self._bundle, self._generation
+            entry = None
+            if bundle is not None and entry_key(*key) in bundle:
+                try:
+                    entry = bundle.get(*key)
+                except BundleError as e:
+                    swallow("model_bundle", e)
+                    print(f"⚠️ {e}")
+                    entry = None
+                size = bundle.size(entry_key(*key))
+            else:
+                path = self.path_for(pair, timeframe, name)
+                if os.path.exists(path):
+                    import joblib
+                    entry = joblib.load(path, mmap_mode=self.mmap_mode)
+                    size = os.path.getsize(path)
+            with self._lock:
+                if entry is None:
+                    if generation == self._generation:
+                        self._missing.add(key)
+                    return None
+                self.loads += 1
+            self._store(key, entry, size, generation)
+            return entry
+
+    def put(self, pair, timeframe, name, data):
+        """Guarda en disco (escritura atómica) y deja el modelo residente"""
+        key = (pair, timeframe, name)
+        path = self.path_for(pair, timeframe, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        import joblib
+        joblib.dump(data, tmp_path)
+        os.replace(tmp_path, path)
+        self._store(key, data, os.path.getsize(path))
+        return path
+
+    def evict(self, pair=None, timeframe=None, name=None):
+        """Olvida modelos residentes (todos, o los que coinciden con el filtro)"""
+        with self._lock:
+            for key in list(self._resident):
+                if all(v is None or v == k for v, k in zip((pair, timeframe, name), key)):
+                    self.resident_bytes -= self._resident.pop(key)[1]
+            self._missing.clear()
+
+    def preload(self, keys, background=True):
+        """Carga de antemano un conjunto 'caliente' de (par, timeframe, agente)"""
+        keys = list(keys)
+
+        def run():
+            loaded = 0
+            for key in keys:
+                try:
+                    if self.get(*key) is not None:
+                        loaded += 1
+                except Exception as e:
+                    swallow("model_preload", e)
+                    print(f"⚠️ Error precargando {key}: {e}")
+            print(f"🔥 Precarga de modelos: {loaded}/{len(keys)} en memoria")
+
+        if not background:
+            run()
+            return None
+        self._preload_thread = threading.Thread(target=run, name="model-preload", daemon=True)
+        self._preload_thread.start()
+        return self._preload_thread
+
+    def stats(self):
+        with self._lock:
+            return {
+                "root": self.root,
+                "resident": len(self._resident),
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "missing": len(self._missing),
+                "bundle": self._bundle.stats() if self._bundle is not None else None,
+                "swaps": self.swaps
+            }
+
+
+# Registro compartido por defecto
+model_registry = ModelRegistry()
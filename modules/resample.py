@@ -0,0 +1,63 @@
+# modules/resample.py
+# Velas de timeframes superiores (M5…D1) construidas a partir de las de M1:
+# open = primera, high = máximo, low = mínimo, close = última, volume = suma.
+# Los intervalos se alinean en UTC (H4 en 00/04/08…, D1 a medianoche).
+import numpy as np
+
+from .bar_cache import RECORD
+from .config import TIMEFRAME_MS
+
+BASE_TIMEFRAME = "M1"
+
+
+def bucket_start(t, step):
+    """Inicio (ms) del intervalo de `step` ms al que pertenece cada t"""
+    return t - t % step
+
+
+def resample_records(records, step):
+    """Agrega registros RECORD ordenados por t en velas de `step` ms
+
+    La última vela resultante puede estar incompleta (le faltan minutos que
+    aún no han llegado): se devuelve igual y se revisa en la siguiente pasada.
+    """
+    if len(records) == 0:
+        return np.empty(0, dtype=RECORD)
+    buckets = bucket_start(records['t'], step)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(records)] - 1
+    out = np.empty(len(starts), dtype=RECORD)
+    out['t'] = buckets[starts]
+    out['o'] = records['o'][starts]
+    out['h'] = np.maximum.reduceat(records['h'], starts)
+    out['l'] = np.minimum.reduceat(records['l'], starts)
+    out['c'] = records['c'][ends]
+    out['v'] = np.add.reduceat(records['v'], starts)
+    return out
+
+
+def derive_timeframe(cache, pair, timeframe, base=BASE_TIMEFRAME):
+    """Actualiza en la BarCache las velas de `timeframe` a partir de las de `base`
+
+    Solo se reagrega desde la última vela derivada (que puede estar a medio
+    formar) en adelante, así que cada llamada cuesta lo que ha llegado de
+    nuevo más, como mucho, un intervalo. Si la base tiene historia anterior a
+    lo ya derivado (p. ej. tras ampliar la ventana), se reconstruye entera.
+    Un primer intervalo al que le falta el principio se descarta para no
+    publicar una vela con un open incorrecto. Devuelve las velas escritas.
+    """
+    step = TIMEFRAME_MS[timeframe]
+    source_first = cache.first_time(pair, base)
+    if source_first is None:
+        return 0
+    aligned_first = -(-source_first // step) * step
+    last = cache.last_time(pair, timeframe)
+    first = cache.first_time(pair, timeframe)
+    if last is None or aligned_first < first:
+        source = cache.read(pair, base, start=aligned_first)
+    else:
+        source = cache.read(pair, base, start=last)
+    bars = resample_records(source, step)
+    if len(bars):
+        cache.merge(pair, timeframe, bars)
+    return len(bars)
@@ -0,0 +1,428 @@
+# modules/shared_state.py
+# Estado compartido entre procesos para el modo con varios workers HTTP
+# (python main.py serve --workers N). Un único proceso cargador descarga los
+# datos, tiene los modelos y calcula los consensos; los publica en un fichero
+# mapeado en memoria (en /dev/shm por defecto) y los workers solo leen de él:
+# la RAM de datos y modelos no se multiplica por el número de workers.
+#
+# Fichero: una cabecera con el layout (JSON) y secciones de arrays NumPy
+#   control    listo, pid y latido del cargador
+#   candles    últimas `bars` velas de cada (par, timeframe), registros RECORD
+#   prices     último precio de cada par
+#   consensus  JSON del último consenso de cada (par, timeframe) (la respuesta
+#              de /api/predict y su entrada del escáner), recalculado con
+#              cada vela nueva
+# Cada hueco lleva un contador de secuencia (seqlock): el cargador lo pone
+# impar antes de escribir y par al terminar; un lector copia el hueco y, si
+# el contador ha cambiado o era impar, repite. Solo hay un escritor por hueco.
+#
+# El cargador crea el fichero aparte y lo cambia con os.replace: si se
+# reinicia, los workers ven un fichero nuevo y se vuelven a enlazar a él.
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from .bar_cache import RECORD
+from .candles import COLUMNS, CandleView
+from .chart import CHART_BARS, WARMUP
+from .quotes import Prices
+
+MAGIC = b"SOYTSHM\0"
+VERSION = 1
+PAGE = 4096
+# Velas por (par, timeframe): las del gráfico y su calentamiento, con margen
+SHARED_BARS = int(os.environ.get("SOYTUGUIA_SHARED_BARS", str(CHART_BARS + WARMUP + 50)))
+# KB por consenso publicado
+SLOT_KB = int(os.environ.get("SOYTUGUIA_SHARED_SLOT_KB", "64"))
+# Intentos de lectura de un hueco que se está escribiendo antes de rendirse
+SPINS = 1000
+# Segundos entre comprobaciones de si el cargador ha creado otro fichero
+CHECK_SECONDS = 1.0
+# MAGIC, versión, tamaño del layout, tamaño de la cabecera
+_PREAMBLE = struct.Struct("<8sIIQ")
+_CONTROL = np.dtype([("ready", "<u8"), ("pid", "<u8"), ("started", "<f8"), ("heartbeat", "<f8"),
+                     ("cycles", "<u8")])
+_PRICE = np.dtype([("price", "<f8"), ("t", "<i8")])
+
+
+def default_path(port=None):
+    """Fichero del estado compartido: en /dev/shm si existe (memoria)"""
+    root = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(root, f"soytuguia-{port or os.getpid()}.state")
+
+
+def _layout(pairs, timeframes, bars, slot_bytes):
+    slots = len(pairs) * len(timeframes)
+    sections, offset = {}, 0
+
+    def add(name, dtype, shape):
+        nonlocal offset
+        dtype = np.dtype(dtype)
+        sections[name] = {"offset": offset, "dtype": dtype.descr if dtype.names else dtype.str,
+                          "shape": list(shape)}
+        offset += -(-int(np.prod(shape)) * dtype.itemsize // PAGE) * PAGE
+
+    add("control", _CONTROL, (1,))
+    add("candle_seq", "<u8", (slots,))
+    add("candle_count", "<u8", (slots,))
+    add("candles", RECORD, (slots, bars))
+    add("price_seq", "<u8", (len(pairs),))
+    add("prices", _PRICE, (len(pairs),))
+    add("consensus_seq", "<u8", (slots,))
+    add("consensus_size", "<u8", (slots,))
+    add("consensus", "u1", (slots, slot_bytes))
+    return {"pairs": list(pairs), "timeframes": list(timeframes), "bars": bars,
+            "slot_bytes": slot_bytes, "sections": sections, "size": offset}
+
+
+def _dtype(descr):
+    return np.dtype([tuple(field) for field in descr] if isinstance(descr, list) else descr)
+
+
+class SharedState:
+    """Fichero de estado compartido mapeado en memoria
+
+    SharedState.create() lo crea para escribir (el cargador) y
+    SharedState.open() lo abre para leer (los workers).
+    """
+    def __init__(self, path, buffer, layout, header_size, writable, identity):
+        self.path = path
+        self.layout = layout
+        self.writable = writable
+        self.identity = identity
+        self.pairs = layout["pairs"]
+        self.timeframes = layout["timeframes"]
+        self.bars = layout["bars"]
+        self.slot_bytes = layout["slot_bytes"]
+        self._buffer = buffer
+        self._pair_index = {pair: i for i, pair in enumerate(self.pairs)}
+        self._tf_index = {tf: i for i, tf in enumerate(self.timeframes)}
+        for name, section in layout["sections"].items():
+            view = np.ndarray(tuple(section["shape"]), dtype=_dtype(section["dtype"]), buffer=buffer,
+                              offset=header_size + section["offset"])
+            setattr(self, f"_{name}", view)
+        # Lo último escrito en cada hueco (solo el escritor), para no reescribir
+        self._written = {}
+        # Consensos ya decodificados por hueco: (secuencia, dict) (solo lectores)
+        self._decoded = {}
+
+    @classmethod
+    def create(cls, path, pairs, timeframes, bars=None, slot_bytes=None):
+        layout = _layout(pairs, timeframes, bars or SHARED_BARS, slot_bytes or SLOT_KB * 1024)
+        encoded = json.dumps(layout).encode()
+        header_size = -(-(_PREAMBLE.size + len(encoded)) // PAGE) * PAGE
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w+b") as f:
+            f.truncate(header_size + layout["size"])
+            buffer = mmap.mmap(f.fileno(), 0)
+            identity = _identity(os.fstat(f.fileno()))
+        buffer[:_PREAMBLE.size] = _PREAMBLE.pack(MAGIC, VERSION, len(encoded), header_size)
+        buffer[_PREAMBLE.size:_PREAMBLE.size + len(encoded)] = encoded
+        state = cls(path, buffer, layout, header_size, True, identity)
+        state._control[0] = (0, os.getpid(), time.time(), time.time(), 0)
+        state._prices["price"] = np.nan
+        os.replace(tmp_path, path)
+        return state
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            identity = _identity(os.fstat(f.fileno()))
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, layout_size, header_size = _PREAMBLE.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} no es un estado compartido")
+        if version != VERSION:
+            raise ValueError(f"versión de estado compartido no soportada: {version}")
+        layout = json.loads(buffer[_PREAMBLE.size:_PREAMBLE.size + layout_size])
+        return cls(path, buffer, layout, header_size, False, identity)
+
+    def current(self):
+        """¿Sigue siendo path este fichero? (False si el cargador lo ha cambiado)"""
+        try:
+            return _identity(os.stat(self.path)) == self.identity
+        except FileNotFoundError:
+            return False
+
+    def slot(self, pair, timeframe):
+        return self._pair_index[pair] * len(self.timeframes) + self._tf_index[timeframe]
+
+    # --- Escritura (cargador) -------------------------------------------------
+
+    @staticmethod
+    def _write(seq, index, fill):
+        seq[index] += 1
+        try:
+            fill()
+        finally:
+            seq[index] += 1
+
+    def write_candles(self, pair, timeframe, history):
+        """Publica las últimas `bars` velas (nada si no han cambiado)"""
+        slot = self.slot(pair, timeframe)
+        n = min(len(history), self.bars)
+        tail = history[len(history) - n:]
+        key = (n, int(tail.t[-1]), float(tail.c[-1])) if n else (0,)
+        if self._written.get(("candles", slot)) == key:
+            return False
+
+        def fill():
+            rows = self._candles[slot, :n]
+            for col in COLUMNS:
+                rows[col] = getattr(tail, col)
+            self._candle_count[slot] = n
+
+        self._write(self._candle_seq, slot, fill)
+        self._written[("candles", slot)] = key
+        return True
+
+    def write_prices(self, prices):
+        for pair, index in self._pair_index.items():
+            price = prices.get(pair)
+            value = (float(price), int(prices.as_of.get(pair) or 0)) if price is not None else (np.nan, 0)
+            if self._written.get(("price", index)) != value:
+                self._write(self._price_seq, index, lambda: self._prices.__setitem__(index, value))
+                self._written[("price", index)] = value
+
+    def write_consensus(self, pair, timeframe, payload):
+        """Publica un consenso (dict JSON); False si no cabe en el hueco"""
+        slot = self.slot(pair, timeframe)
+        data = json.dumps(payload, separators=(",", ":")).encode()
+        if len(data) > self.slot_bytes:
+            return False
+        if self._written.get(("consensus", slot)) == data:
+            return True
+
+        def fill():
+            self._consensus[slot, :len(data)] = np.frombuffer(data, dtype=np.uint8)
+            self._consensus_size[slot] = len(data)
+
+        self._write(self._consensus_seq, slot, fill)
+        self._written[("consensus", slot)] = data
+        return True
+
+    def set_ready(self):
+        self._control["ready"] = 1
+
+    def beat(self):
+        """Latido del cargador al final de cada pasada"""
+        self._control["heartbeat"] = time.time()
+        self._control["cycles"] += 1
+
+    # --- Lectura (workers) ----------------------------------------------------
+
+    @staticmethod
+    def _read(seq, index, copy):
+        """(secuencia, copia) de un hueco sin escrituras a medias, o (None, None)"""
+        for attempt in range(SPINS):
+            before = int(seq[index])
+            if not before & 1:
+                value = copy()
+                if int(seq[index]) == before:
+                    return before, value
+            if attempt > 10:
+                time.sleep(0)
+        return None, None
+
+    @property
+    def ready(self):
+        return bool(self._control["ready"][0])
+
+    def candles(self, pair, timeframe):
+        """CandleView con las velas publicadas (vacía si aún no hay)"""
+        slot = self.slot(pair, timeframe)
+
+        def copy():
+            return self._candles[slot, :int(self._candle_count[slot])].copy()
+
+        _, rows = self._read(self._candle_seq, slot, copy)
+        if rows is None:
+            rows = np.empty(0, dtype=RECORD)
+        return CandleView(*(np.ascontiguousarray(rows[col]) for col in COLUMNS))
+
+    def prices(self, pairs):
+        prices, missing, as_of = {}, {}, {}
+        for pair in pairs:
+            index = self._pair_index.get(pair)
+            value = None if index is None else self._read(self._price_seq, index,
+                                                          lambda: self._prices[index].copy())[1]
+            if value is None or np.isnan(value["price"]):
+                missing[pair] = "sin precio publicado"
+                continue
+            prices[pair] = float(value["price"])
+            if value["t"]:
+                as_of[pair] = int(value["t"])
+        return Prices(prices, missing, as_of)
+
+    def consensus(self, pair, timeframe):
+        """Último consenso publicado ({"prediction", "scan"}) o None"""
+        slot = self.slot(pair, timeframe)
+        cached = self._decoded.get(slot)
+        if cached is not None and cached[0] == int(self._consensus_seq[slot]):
+            return cached[1]
+
+        def copy():
+            return self._consensus[slot, :int(self._consensus_size[slot])].tobytes()
+
+        seq, data = self._read(self._consensus_seq, slot, copy)
+        if not data:
+            return None
+        payload = json.loads(data)
+        self._decoded[slot] = (seq, payload)
+        return payload
+
+    def stats(self):
+        control = self._control[0]
+        return {"path": self.path, "pid": int(control["pid"]), "ready": bool(control["ready"]),
+                "cycles": int(control["cycles"]), "heartbeat_age": time.time() - float(control["heartbeat"]),
+                "bytes": len(self._buffer)}
+
+
+def _identity(stat):
+    # Sin mtime: el cargador escribe en el fichero continuamente
+    return (stat.st_dev, stat.st_ino)
+
+
+class SharedMarket:
+    """Lado de los workers: el interfaz de AlpacaRealClient que usa main.py
+    (get_historical_data, get_current_prices) y los consensos publicados,
+    leídos del estado compartido. Si el cargador crea otro fichero (se ha
+    reiniciado), se enlaza al nuevo."""
+    def __init__(self, path):
+        self.path = path
+        self._state = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        now = time.monotonic()
+        if self._state is None or now - self._checked > CHECK_SECONDS:
+            with self._lock:
+                self._checked = now
+                try:
+                    current = _identity(os.stat(self.path))
+                except FileNotFoundError:
+                    current = None
+                if current is not None and (self._state is None or current != self._state.identity):
+                    self._state = SharedState.open(self.path)
+        return self._state
+
+    def wait_ready(self, timeout=None, poll=0.2):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            state = self.state
+            if state is not None and state.ready:
+                return True
+            time.sleep(poll)
+            self._checked = 0.0
+        return False
+
+    @property
+    def pairs(self):
+        return self.state.pairs
+
+    def get_historical_data(self, pair, timeframe="H1", days=None, refresh=True):
+        history = self.state.candles(pair, timeframe)
+        return history if len(history) else []
+
+    def get_current_prices(self, pairs):
+        return self.state.prices(pairs)
+
+    def consensus(self, pair, timeframe):
+        payload = self.state.consensus(pair, timeframe)
+        return payload["prediction"] if payload else None
+
+    def scan_entries(self, pairs, timeframes):
+        """({(par, tf): entrada del escáner}, [(par, tf) sin consenso])"""
+        state = self.state
+        entries, missing = {}, []
+        for pair in pairs:
+            for timeframe in timeframes:
+                payload = state.consensus(pair, timeframe)
+                if payload:
+                    entries[(pair, timeframe)] = payload["scan"]
+                else:
+                    missing.append((pair, timeframe))
+        return entries, missing
+
+    def stats(self):
+        state = self.state
+        return state.stats() if state is not None else {"path": self.path, "ready": False}
+
+    def close(self):
+        pass
+
+
+class Publisher:
+    """Lado del cargador: en cada pasada publica los precios; las velas y el
+    consenso de cada (par, timeframe), calculado como lo calcula /api/predict,
+    solo cuando debería haber cerrado una vela de ese timeframe
+
+    Así las descargas de velas siguen al cierre de velas (unas 28 por minuto
+    de M1) y no al ritmo de las pasadas, y el cargador no agota la cuota de
+    la API ni la reserva LIVE del dashboard (alpaca_client.BarSchedule).
+    """
+    def __init__(self, state, client, system, workers=8):
+        self.state = state
+        self.client = client
+        self.system = system
+        self.workers = workers
+        self.oversized = 0
+        self.fetches = 0
+        from .alpaca_client import BarSchedule
+        self.schedule = BarSchedule(client.clock)
+
+    def _publish_pair(self, pair, prices):
+        for timeframe in self.state.timeframes:
+            if not self.schedule.due(pair, timeframe):
+                continue
+            history = self.client.get_historical_data(pair, timeframe)
+            self.fetches += 1
+            last = int(history[-1]['t']) if len(history) else None
+            self.schedule.fetched(pair, timeframe, last)
+            if last is not None and self.state.write_candles(pair, timeframe, history):
+                self._publish_consensus(pair, timeframe, history, prices)
+
+    def _publish_consensus(self, pair, timeframe, history, prices):
+        from .formatter import to_jsonable
+        from .predictor import analyze_prediction
+        from .system import scan_entry
+        price = prices.get(pair) or history[-1]['c']
+        prediction = self.system.consensus(pair, timeframe, price, history)
+        payload = {
+            "prediction": to_jsonable(analyze_prediction({**prediction, "timeframe": timeframe})),
+            "scan": to_jsonable(scan_entry(pair, timeframe, prediction))
+        }
+        if not self.state.write_consensus(pair, timeframe, payload):
+            self.oversized += 1
+            print(f"⚠️ Consenso de {pair} {timeframe} mayor que el hueco compartido")
+
+    def step(self, pool):
+        pairs = self.state.pairs
+        prices = self.client.get_current_prices(pairs)
+        self.state.write_prices(prices)
+        for _ in pool.map(lambda pair: self._publish_pair(pair, prices), pairs):
+            pass
+        self.state.beat()
+
+    def run(self, stop, interval=1.0):
+        """Pasadas cada `interval` segundos hasta que stop (Event) se active"""
+        from concurrent.futures import ThreadPoolExecutor
+        from .metrics import swallow
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="publish") as pool:
+            while not stop.is_set():
+                started = time.monotonic()
+                try:
+                    self.step(pool)
+                    self.state.set_ready()
+                except Exception as e:
+                    swallow("shared_publish", e)
+                    print(f"⚠️ Error publicando el estado compartido: {e}")
+                stop.wait(max(0.0, interval - (time.monotonic() - started)))
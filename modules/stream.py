@@ -0,0 +1,195 @@
+# modules/stream.py
+# Difusión de predicciones al dashboard: cada (par, timeframe) con al menos un
+# suscriptor se recalcula una vez por vela nueva, sea cual sea el número de
+# clientes conectados, y el resultado se reparte a todos por su conexión.
+import asyncio
+import time
+from collections import OrderedDict
+
+from .metrics import swallow
+
+
+class Subscriber:
+    """Cola de salida de una conexión, con fusión de mensajes
+
+    Los mensajes se guardan por clave (tipo, par, timeframe) y uno nuevo
+    sustituye al pendiente de la misma clave: un cliente lento recibe solo el
+    último estado de cada tema y la memoria por cliente queda acotada por el
+    número de temas a los que está suscrito. dropped cuenta los descartados.
+    """
+    def __init__(self):
+        self.topics = set()
+        self.dropped = 0
+        self.sent = 0
+        self._pending = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def offer(self, key, message):
+        if key in self._pending:
+            self.dropped += 1
+            del self._pending[key]
+        self._pending[key] = message
+        self._ready.set()
+
+    async def next_batch(self):
+        """Espera a que haya mensajes y los devuelve todos en orden de llegada"""
+        await self._ready.wait()
+        batch = list(self._pending.values())
+        self._pending.clear()
+        self._ready.clear()
+        self.sent += len(batch)
+        return batch
+
+
+class _Topic:
+    __slots__ = ("last_time", "message", "busy", "updated")
+
+    def __init__(self):
+        self.last_time = None
+        self.message = None
+        self.busy = False
+        self.updated = 0.0
+
+
+class StreamHub:
+    """Reparte predicciones por (par, timeframe) entre suscriptores
+
+    update(pair, timeframe, last_time) es síncrona y se ejecuta en un hilo:
+    devuelve None si la última vela sigue siendo last_time o, si hay vela
+    nueva, (tiempo, payload). prices(pairs) devuelve los precios actuales de
+    todos los pares activos en una sola llamada. El bucle run() hace una
+    pasada cada `interval` segundos, con como mucho `concurrency` cálculos a
+    la vez.
+    """
+    def __init__(self, update, prices=None, interval=1.0, concurrency=4):
+        self.update = update
+        self.prices = prices
+        self.interval = interval
+        self.concurrency = concurrency
+        self.subscribers = set()
+        self.computations = 0
+        self.errors = 0
+        self._topics = {}
+        self._tasks = set()
+        self._semaphore = None
+
+    def connect(self):
+        subscriber = Subscriber()
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def disconnect(self, subscriber):
+        self.subscribers.discard(subscriber)
+        for topic in list(subscriber.topics):
+            self.unsubscribe(subscriber, *topic)
+
+    def subscribe(self, subscriber, pair, timeframe):
+        key = (pair, timeframe)
+        subscriber.topics.add(key)
+        topic = self._topics.get(key)
+        if topic is None:
+            topic = self._topics[key] = _Topic()
+            self._spawn(key)
+        elif topic.message is not None:
+            subscriber.offer(("signal", pair, timeframe), topic.message)
+
+    def unsubscribe(self, subscriber, pair, timeframe):
+        key = (pair, timeframe)
+        subscriber.topics.discard(key)
+        if not any(key in s.topics for s in self.subscribers):
+            self._topics.pop(key, None)
+
+    def active_topics(self):
+        return list(self._topics)
+
+    def publish(self, key, message, topic=None):
+        """Entrega un mensaje a los suscriptores del tema (o del par si topic es None)"""
+        for subscriber in self.subscribers:
+            if topic is not None:
+                if topic in subscriber.topics:
+                    subscriber.offer(key, message)
+            elif any(pair == key[1] for pair, _ in subscriber.topics):
+                subscriber.offer(key, message)
+
+    def _spawn(self, key):
+        """Lanza el recálculo de un tema sin esperarlo (si no hay uno en curso)"""
+        topic = self._topics.get(key)
+        if topic is None or topic.busy:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        topic.busy = True
+        task = loop.create_task(self._refresh_topic(key, topic))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh_topic(self, key, topic):
+        pair, timeframe = key
+        try:
+            async with self._semaphore:
+                result = await asyncio.to_thread(self.update, pair, timeframe, topic.last_time)
+            if result is None:
+                return
+            topic.last_time, payload = result
+            topic.message = {"type": "signal", "pair": pair, "timeframe": timeframe, **payload}
+            topic.updated = time.time()
+            self.computations += 1
+            if key in self._topics:
+                self.publish(("signal", pair, timeframe), topic.message, topic=key)
+        except Exception as e:
+            self.errors += 1
+            swallow("stream_topic", e)
+            self.publish(("error", pair, timeframe),
+                         {"type": "error", "pair": pair, "timeframe": timeframe, "detail": str(e)},
+                         topic=key)
+        finally:
+            topic.busy = False
+
+    async def _refresh_prices(self, pairs):
+        try:
+            prices = await asyncio.to_thread(self.prices, pairs)
+        except Exception as e:
+            swallow("stream_prices", e)
+            print(f"⚠️ Error actualizando precios del stream: {e}")
+            return
+        for pair in pairs:
+            price = prices.get(pair)
+            if price is not None:
+                self.publish(("price", pair), {"type": "price", "pair": pair, "price": price})
+
+    async def step(self):
+        """Una pasada: precios de los pares activos y predicciones con vela nueva
+
+        Los recálculos se lanzan en segundo plano; un tema cuyo cálculo
+        anterior sigue en marcha se salta en esta pasada.
+        """
+        topics = self.active_topics()
+        if not topics:
+            return
+        for key in topics:
+            self._spawn(key)
+        if self.prices is not None:
+            await self._refresh_prices(sorted({pair for pair, _ in topics}))
+
+    async def run(self, ready=None):
+        """Bucle principal; ready (threading.Event) retrasa el inicio hasta que
+        el sistema esté preparado"""
+        while ready is not None and not ready.is_set():
+            await asyncio.sleep(self.interval)
+        while True:
+            started = time.perf_counter()
+            await self.step()
+            await asyncio.sleep(max(self.interval - (time.perf_counter() - started), 0.05))
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "topics": len(self._topics),
+            "computations": self.computations,
+            "errors": self.errors,
+            "dropped": sum(s.dropped for s in self.subscribers)
+        }
@@ -1,34 +1,275 @@
 # modules/system.py
 
+from concurrent.futures import wait
+
+import numpy as np
+
 from .ml_agents import TrendAgent, MomentumAgent, VolatilityAgent, PatternAgent, ScalpingAgent, NewsAgent
-from .coordinator import MasterCoordinator
+from .coordinator import MasterCoordinator, make_executor
+from .feature_store import feature_store
+from .metrics import agent_seconds, batch_seconds, model_batch_seconds, swallow
+from .prediction_cache import PredictionCache
+from .registry import model_registry, parse_hot_set, HOT_SET
+
+AGENT_CLASSES = (TrendAgent, MomentumAgent, VolatilityAgent, PatternAgent, ScalpingAgent, NewsAgent)
+# Peso de cada tipo de agente en el consenso de MasterCoordinator.combine
+AGENT_WEIGHTS = {
+    "TrendAgent": 1.5, "MomentumAgent": 1.3, "VolatilityAgent": 1.2,
+    "PatternAgent": 1.0, "ScalpingAgent": 0.8, "NewsAgent": 0.7
+}
+
+SIGNALS = {"📈 COMPRAR": "BUY", "📉 VENDER": "SELL"}
+
+
+def scan_entry(pair, timeframe, prediction):
+    """Resumen de un consenso para el escáner de mercado"""
+    signal = SIGNALS.get(prediction.get('direction'), "HOLD")
+    scores = prediction.get('scores') or {}
+    individual = prediction.get('individual_predictions') or []
+    return {
+        "pair": pair,
+        "timeframe": timeframe,
+        "signal": signal,
+        "direction": prediction.get('direction'),
+        "confidence": prediction.get('confidence', 0),
+        # Fuerza direccional: score de la señal o, sin señal, el mayor de compra/venta
+        "score": scores.get(signal.lower(), 0) if signal != "HOLD" else max(scores.get('buy', 0), scores.get('sell', 0)),
+        "scores": scores,
+        "agents_agreeing": sum(1 for p in individual if p.direction == signal),
+        "agents_count": prediction.get('agents_count', 0),
+        "current_price": prediction.get('current_price'),
+        "target_price": prediction.get('target_price'),
+        "stop_loss": prediction.get('stop_loss'),
+        "partial": prediction.get('partial', False)
+    }
+
+
+def rank_entries(entries, top=None, direction=None, min_agents=0):
+    """Filtra y ordena entradas de scan_entry como ForexMultiAgentSystem.scan"""
+    entries = [e for e in entries
+               if (direction is None or e["signal"] == direction) and e["agents_agreeing"] >= min_agents]
+    entries.sort(key=lambda e: (e["signal"] != "HOLD", e["score"], e["confidence"]), reverse=True)
+    return entries[:top] if top else entries
+
 
 class ForexMultiAgentSystem:
-    def __init__(self):
+    def __init__(self, executor=None, max_workers=None, latency_budget=None, prediction_cache=None,
+                 journal=None):
+        """executor: None (en serie), 'thread', 'process' o un Executor propio;
+        latency_budget: segundos máximos por consenso o por barrido completo;
+        prediction_cache: PredictionCache para consensus() (False la desactiva);
+        journal: SignalJournal donde se registra cada consenso calculado"""
         self.coordinators = {}
         self.all_pairs = []
+        self.executor = make_executor(executor, max_workers)
+        self.latency_budget = latency_budget
+        self.prediction_cache = PredictionCache() if prediction_cache is None else (prediction_cache or None)
+        self.journal = journal
         
-    def initialize_all_pairs(self, pairs, timeframes):
+    def initialize_all_pairs(self, pairs, timeframes, hot_set=None):
         print(f"🌍 Inicializando sistema para {len(pairs)} pares de divisas")
         for pair in pairs:
-            coordinator = MasterCoordinator(pair)
+            coordinator = MasterCoordinator(pair, executor=self.executor, timeout=self.latency_budget)
+            # Un único agente por par para los tipos sin estado (flyweights)
+            shared = {}
             for tf in timeframes:
-                coordinator.add_agent(TrendAgent(pair, tf), weight=1.5)
-                coordinator.add_agent(MomentumAgent(pair, tf), weight=1.3)
-                coordinator.add_agent(VolatilityAgent(pair, tf), weight=1.2)
-                coordinator.add_agent(PatternAgent(pair, tf), weight=1.0)
-                coordinator.add_agent(ScalpingAgent(pair, tf), weight=0.8)
-                coordinator.add_agent(NewsAgent(pair, tf), weight=0.7)
+                for agent_class in AGENT_CLASSES:
+                    if agent_class.stateless:
+                        agent = shared.get(agent_class) or shared.setdefault(agent_class, agent_class(pair, None))
+                    else:
+                        agent = agent_class(pair, tf)
+                    coordinator.add_agent(agent, weight=AGENT_WEIGHTS[agent_class.__name__], timeframe=tf)
             self.coordinators[pair] = coordinator
             print(f"✅ {pair}: {len(coordinator.agents)} agentes creados")
         self.all_pairs = pairs
         total_agents = sum(len(c.agents) for c in self.coordinators.values())
         print(f"✅ Sistema inicializado: {len(self.coordinators)} pares, {total_agents} agentes totales")
+        # Los modelos se cargan al primer uso; el conjunto caliente, en segundo plano
+        hot_set = parse_hot_set(HOT_SET) if hot_set is None else hot_set
+        if hot_set:
+            self.preload_models(hot_set)
+    
+    def preload_models(self, hot_set, background=True):
+        """Precarga los modelos de [(par, timeframe o None), ...]"""
+        keys = []
+        for pair, timeframe in hot_set:
+            coordinator = self.coordinators.get(pair)
+            if coordinator is None:
+                continue
+            keys.extend(
+                (pair, agent.timeframe, agent.name) for agent in coordinator.agents.values()
+                if agent.uses_model and (timeframe is None or agent.timeframe == timeframe)
+            )
+        return model_registry.preload(keys, background=background)
+    
+    def _ready_pairs(self, current_prices, historical_data):
+        return [
+            (pair, coordinator) for pair, coordinator in self.coordinators.items()
+            if pair in current_prices and pair in historical_data and len(historical_data[pair]) > 0
+        ]
+    
+    def consensus(self, pair, timeframe, current_price, history):
+        """Consenso de un par para el historial de un timeframe, reutilizando
+        el cálculo mientras no haya vela nueva ni cambie el tramo de precio"""
+        coordinator = self.coordinators[pair]
+
+        def compute():
+            prediction = coordinator.get_consensus_prediction(current_price, history)
+            self._record(pair, timeframe, prediction, history)
+            return prediction
+
+        if self.prediction_cache is None or len(history) == 0:
+            return compute()
+        # Los aciertos de la caché no se registran: son la misma señal
+        return self.prediction_cache.get_or_compute(
+            pair, timeframe, int(history[-1]['t']), current_price, compute
+        )
+
+    def _record(self, pair, timeframe, prediction, history):
+        if self.journal is not None:
+            self.journal.record(pair, timeframe, prediction, int(history[-1]['t']) if len(history) else None)
     
-    def predict_all(self, current_prices, historical_data):
+    def predict_all(self, current_prices, historical_data, timeout=None):
         predictions = {}
-        for pair, coordinator in self.coordinators.items():
-            if pair in current_prices and pair in historical_data and len(historical_data[pair]) > 0:
+        ready = self._ready_pairs(current_prices, historical_data)
+        if self.executor is None:
+            for pair, coordinator in ready:
                 pred = coordinator.get_consensus_prediction(current_prices[pair], historical_data[pair])
                 predictions[pair] = pred
+            return predictions
+        
+        # Todos los agentes de todos los pares comparten un único plazo
+        timeout = timeout if timeout is not None else self.latency_budget
+        futures = {
+            pair: coordinator.submit_predictions(current_prices[pair], historical_data[pair])
+            for pair, coordinator in ready
+        }
+        wait([f for pair_futures in futures.values() for f in pair_futures.values()], timeout=timeout)
+        for pair, coordinator in ready:
+            results, failed, timed_out = coordinator.collect_predictions(futures[pair])
+            predictions[pair] = coordinator.combine(current_prices[pair], results, failed, timed_out)
         return predictions
+    
+    def predict_all_batched(self, current_prices, historical_data):
+        """Igual que predict_all, pero agrupa las filas de features de todos los
+        agentes que comparten modelo y escalador y llama a predict una sola vez"""
+        with batch_seconds.time():
+            return self._predict_batched(current_prices, historical_data)
+    
+    def _predict_batched(self, current_prices, historical_data):
+        ready = self._ready_pairs(current_prices, historical_data)
+        # Mismo orden de agentes que en predict_all
+        results = {pair: dict.fromkeys(coordinator.agents) for pair, coordinator in ready}
+        failed = {pair: {} for pair, _ in ready}
+        groups = {}
+        for pair, coordinator in ready:
+            price, history = current_prices[pair], historical_data[pair]
+            pair_results = results[pair]
+            for agent, keys in coordinator.unique_agents():
+                try:
+                    if not agent.uses_model:
+                        with agent_seconds.time(agent.name):
+                            prediction = agent.predict(price, history)
+                        pair_results.update((key, prediction) for key in keys)
+                        continue
+                    features = agent.prepare_features(history)
+                except Exception as e:
+                    failed[pair].update((key, repr(e)) for key in keys)
+                    continue
+                if features is None:
+                    prediction = agent.neutral("insufficient_data")
+                    pair_results.update((key, prediction) for key in keys)
+                    continue
+                # Modelo y escalador se resuelven una vez y el grupo los retiene:
+                # si el registro los expulsa y recarga durante el barrido, sus
+                # id() no se pueden reutilizar para otro objeto
+                model, scaler = agent.model, agent.scaler
+                _, group = groups.setdefault((id(model), id(scaler)), ((model, scaler), []))
+                group.append((pair, keys, agent, features))
+        
+        for (model, scaler), group in groups.values():
+            outputs = self._batch_outputs(group, model, scaler)
+            for (pair, keys, agent, _), output in zip(group, outputs):
+                if isinstance(output, Exception):
+                    prediction = agent.fallback(output)
+                else:
+                    try:
+                        prediction = agent.interpret(current_prices[pair], historical_data[pair], output)
+                    except Exception as e:
+                        prediction = agent.fallback(e)
+                results[pair].update((key, prediction) for key in keys)
+        
+        predictions = {}
+        for pair, coordinator in ready:
+            done = {key: pred for key, pred in results[pair].items() if pred is not None}
+            predictions[pair] = coordinator.combine(current_prices[pair], done, failed[pair])
+        return predictions
+    
+    def scan(self, current_prices, histories, top=None, direction=None, min_agents=0):
+        """Consenso de cada (par, timeframe) de histories ({(par, tf): historial})
+        en un solo barrido, ordenado de la señal más fuerte a la más débil
+
+        Cada timeframe se evalúa con predict_all_batched (una llamada por
+        modelo compartido y los indicadores de cada historial calculados una
+        vez). direction ('BUY', 'SELL' o 'HOLD') y min_agents (agentes que
+        coinciden con la dirección del consenso) filtran; top limita el número
+        de resultados. Primero van las señales de compra o venta y, dentro de
+        cada grupo, por score direccional y confianza.
+        """
+        by_timeframe = {}
+        for (pair, timeframe), history in histories.items():
+            by_timeframe.setdefault(timeframe, {})[pair] = history
+        entries = []
+        for timeframe, timeframe_histories in by_timeframe.items():
+            predictions = self.predict_all_batched(current_prices, timeframe_histories)
+            for pair, prediction in predictions.items():
+                self._record(pair, timeframe, prediction, timeframe_histories[pair])
+            entries.extend(scan_entry(pair, timeframe, prediction) for pair, prediction in predictions.items())
+        return rank_entries(entries, top, direction, min_agents)
+    
+    @staticmethod
+    def _batch_outputs(group, model, scaler):
+        """Salida de model para cada fila del grupo (la excepción si esa fila falla)"""
+        agent = group[0][2]
+        try:
+            with model_batch_seconds.time(agent.name):
+                return list(agent.model_outputs(np.vstack([row[3] for row in group]), model, scaler))
+        except Exception as e:
+            swallow("model_batch", e)
+            # Si falla el lote, se repite fila a fila para aislar la que falla
+            outputs = []
+            for _, _, member, features in group:
+                try:
+                    outputs.append(member.model_outputs(features, model, scaler)[0])
+                except Exception as row_error:
+                    # Sin traceback: la excepción no retiene los frames del lote
+                    outputs.append(row_error.with_traceback(None))
+            return outputs
+    
+    def share_model(self, agent_name, timeframe, model, scaler):
+        """Usa un mismo modelo (entrenado con todos los pares) para un tipo de
+        agente y timeframe; así sus filas se pueden evaluar en un solo lote"""
+        for coordinator in self.coordinators.values():
+            agent = coordinator.agents.get(f"{agent_name}_{timeframe}")
+            if agent is not None:
+                agent.model = model
+                agent.scaler = scaler
+    
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.journal is not None:
+            self.journal.close()
+
+    def model_registry_stats(self):
+        return model_registry.stats()
+
+    def journal_stats(self):
+        return self.journal.stats() if self.journal is not None else None
+
+    def prediction_cache_stats(self):
+        return self.prediction_cache.stats() if self.prediction_cache is not None else None
+
+    def feature_cache_stats(self):
+        """Aciertos/fallos de la caché de indicadores compartida"""
+        return feature_store.stats()
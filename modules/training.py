@@ -0,0 +1,338 @@
+# modules/training.py
+# Entrenamiento de todos los (par, timeframe, agente) en un pool de procesos.
+#
+#   python main.py train --pairs EURUSD,GBPUSD --timeframes H1,H4 --workers 4
+#
+# 1. Un trabajo por par descarga (o lee de la caché) sus velas y calcula la
+#    matriz de features de cada timeframe una sola vez, en disco (.npy).
+# 2. Un trabajo por (par, timeframe, agente) abre esa matriz con mmap, ajusta
+#    el modelo con un número de hilos fijo y lo guarda con BaseAgent.save en un
+#    directorio de preparación.
+# 3. Los modelos terminados se publican por lotes en el bundle del directorio
+#    de modelos (modules.bundle: un solo fichero con todos).
+#
+# El progreso se apunta en <work_dir>/state.json después de cada trabajo: si
+# la ejecución se interrumpe, la siguiente retoma desde donde se quedó.
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from . import bundle
+from .config import AGENTS, FOREX_PAIRS, TIMEFRAMES
+from .registry import MODELS_DIR, ModelRegistry
+
+DEFAULT_WORK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "training")
+# Proporción final del historial que se reserva para medir el acierto direccional
+VALIDATION_SPLIT = 0.2
+
+
+def job_id(pair, timeframe, agent=None):
+    return f"{pair}:{timeframe}" if agent is None else f"{pair}:{timeframe}:{agent}"
+
+
+def agent_class(name):
+    from . import ml_agents
+    return getattr(ml_agents, name)
+
+
+def trainable(name):
+    """¿El agente usa un modelo al predecir? (los de reglas fijas no, aunque
+    definan build_model, y no merece la pena entrenarlos)"""
+    return agent_class(name).uses_model
+
+
+class TrainingState:
+    """Trabajos terminados, guardados en JSON con escritura atómica"""
+    def __init__(self, path):
+        self.path = path
+        self.data = {"features": {}, "fitted": {}, "published": []}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data.update(json.load(f))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        self.data = {"features": {}, "fitted": {}, "published": []}
+        self.save()
+
+
+def _limit_threads(threads):
+    """Variables de entorno de OpenMP/BLAS para los procesos del pool"""
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+
+def _features_path(work_dir, pair, timeframe):
+    return os.path.join(work_dir, "features", f"{pair}_{timeframe}")
+
+
+def _data_client(fake, cache_dir):
+    from .alpaca_client import AlpacaRealClient
+    from .bar_cache import BarCache
+    api = None
+    if fake:
+        from .fake_alpaca import FakeREST
+        api = FakeREST()
+    return AlpacaRealClient(api=api, cache=BarCache(cache_dir) if cache_dir else None)
+
+
+def build_features(pair, timeframes, days, work_dir, fake=False, cache_dir=None):
+    """Trabajo de la fase 1: matrices X (features), c (cierre) e y (cierre
+    siguiente) por timeframe
+
+    Devuelve {timeframe: filas} (0 si hay menos de MIN_BARS filas válidas).
+    """
+    from .feature_store import compute_feature_frame
+    from .indicators import FEATURE_COLUMNS, MIN_BARS, VOLUME_COLUMNS
+    client = _data_client(fake, cache_dir)
+    rows = {}
+    for timeframe in timeframes:
+        history = client.read_history(pair, timeframe, days)
+        if len(history) == 0:
+            rows[timeframe] = 0
+            continue
+        df = compute_feature_frame(history)
+        df['target'] = df['c'].shift(-1)
+        columns = list(FEATURE_COLUMNS) + (list(VOLUME_COLUMNS) if 'volume_ratio' in df.columns else [])
+        df = df[columns + ['c', 'target']].replace([np.inf, -np.inf], np.nan).dropna()
+        base = _features_path(work_dir, pair, timeframe)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        for suffix, values in (("X", df[columns].to_numpy(dtype=float)),
+                               ("c", df['c'].to_numpy(dtype=float)),
+                               ("y", df['target'].to_numpy(dtype=float))):
+            tmp_path = f"{base}_{suffix}.tmp-{os.getpid()}.npy"
+            np.save(tmp_path, values)
+            os.replace(tmp_path, f"{base}_{suffix}.npy")
+        rows[timeframe] = len(df) if len(df) >= MIN_BARS else 0
+    return rows
+
+
+def _set_threads(model, threads):
+    params = model.get_params()
+    for name in ("n_jobs", "nthread", "num_threads"):
+        if name in params:
+            model.set_params(**{name: threads})
+    if type(model).__module__.startswith("lightgbm"):
+        model.set_params(verbose=-1)
+
+
+def fit_model(name, pair, timeframe, X, y, threads=1):
+    """Modelo y escalador del agente ajustados a (X, y) con como mucho `threads` hilos"""
+    from sklearn.preprocessing import StandardScaler
+    from threadpoolctl import threadpool_limits
+
+    model = agent_class(name)(pair, timeframe).build_model()
+    _set_threads(model, threads)
+    with threadpool_limits(limits=threads):
+        scaler = StandardScaler().fit(X)
+        model.fit(scaler.transform(X), y)
+    return model, scaler
+
+
+def fit_agent(pair, timeframe, name, work_dir, threads=1):
+    """Trabajo de la fase 2: ajusta un agente y lo guarda en el directorio de preparación"""
+    from threadpoolctl import threadpool_limits
+
+    base = _features_path(work_dir, pair, timeframe)
+    X = np.load(f"{base}_X.npy", mmap_mode="r")
+    close = np.load(f"{base}_c.npy", mmap_mode="r")
+    y = np.load(f"{base}_y.npy", mmap_mode="r")
+    agent = agent_class(name)(pair, timeframe)
+    if agent.build_model() is None:
+        return None
+    started = time.perf_counter()
+    # Acierto direccional en el tramo final: ¿predice bien si el siguiente cierre sube o baja?
+    split = int(len(X) * (1 - VALIDATION_SPLIT))
+    model, scaler = fit_model(name, pair, timeframe, X[:split], y[:split], threads)
+    with threadpool_limits(limits=threads):
+        predicted = model.predict(scaler.transform(X[split:])) if split < len(X) else np.empty(0)
+    hits = np.sign(predicted - close[split:]) == np.sign(y[split:] - close[split:])
+    # Modelo final con todo el historial
+    model, scaler = fit_model(name, pair, timeframe, X, y, threads)
+
+    agent.model, agent.scaler = model, scaler
+    agent.performance = {
+        "wins": int(hits.sum()),
+        "losses": int(len(hits) - hits.sum()),
+        "accuracy": float(hits.mean()) if len(hits) else 0,
+        "samples": int(len(X)),
+        "fit_seconds": time.perf_counter() - started,
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }
+    path = agent.save(ModelRegistry(root=os.path.join(work_dir, "staging"), max_bytes=0))
+    return {"path": path, "performance": agent.performance}
+
+
+def publish(state, work_dir, models_dir, keys, publisher=None):
+    """Añade al bundle de models_dir los modelos preparados de keys y
+    actualiza el manifiesto
+
+    El bundle se reescribe entero y se cambia de forma atómica: un servidor
+    que lo esté leyendo pasa al nuevo sin reiniciarse. publisher(paths), si
+    se indica, recibe después las rutas publicadas (el bundle y el
+    manifiesto, p. ej. para subirlas al repositorio de modelos en un commit).
+    """
+    if not keys:
+        return 0
+    staging = ModelRegistry(root=os.path.join(work_dir, "staging"), max_bytes=0, mmap_mode=None)
+    bundle_path = ModelRegistry(root=models_dir).bundle_path
+    manifest_path = os.path.join(models_dir, "manifest.json")
+    manifest, entries = {}, {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    for key in keys:
+        pair, timeframe, name = key.split(":")
+        entries[(pair, timeframe, name)] = staging.get(pair, timeframe, name)
+        manifest[key] = state.data["fitted"][key]["performance"]
+    bundle.update(bundle_path, entries)
+    tmp_path = f"{manifest_path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    if publisher is not None:
+        publisher([bundle_path, manifest_path])
+    published = set(state.data["published"]) | set(keys)
+    state.data["published"] = sorted(published)
+    state.save()
+    print(f"📦 Publicados {len(keys)} modelos en {models_dir}")
+    return len(keys)
+
+
+def train(pairs, timeframes, agents, days=90, workers=None, threads=1, work_dir=None,
+          models_dir=None, publish_every=20, fake=False, cache_dir=None, max_hours=None,
+          restart=False, publisher=None):
+    """Ejecuta (o retoma) el entrenamiento completo y devuelve un resumen"""
+    work_dir = work_dir or DEFAULT_WORK_DIR
+    models_dir = models_dir or MODELS_DIR
+    agents = [name for name in agents if trainable(name)]
+    state = TrainingState(os.path.join(work_dir, "state.json"))
+    if restart:
+        state.reset()
+    deadline = time.monotonic() + max_hours * 3600 if max_hours else None
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+    started = time.perf_counter()
+    summary = {"features": 0, "fitted": 0, "published": 0, "skipped": 0, "failed": {}}
+
+    def out_of_time():
+        return deadline is not None and time.monotonic() > deadline
+
+    pending_publish = [k for k in state.data["fitted"] if k not in set(state.data["published"])]
+    if pending_publish:
+        summary["published"] += publish(state, work_dir, models_dir, pending_publish, publisher)
+
+    import multiprocessing
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_limit_threads, initargs=(threads,)) as pool:
+        # Fase 1: una matriz de features por (par, timeframe)
+        futures = {}
+        for pair in pairs:
+            todo = [tf for tf in timeframes if job_id(pair, tf) not in state.data["features"]]
+            if todo:
+                futures[pool.submit(build_features, pair, todo, days, work_dir, fake, cache_dir)] = pair
+        for future in _as_done(futures):
+            pair = futures[future]
+            try:
+                for tf, rows in future.result().items():
+                    state.data["features"][job_id(pair, tf)] = rows
+                    summary["features"] += 1
+                state.save()
+            except Exception as e:
+                summary["failed"][pair] = repr(e)
+                print(f"❌ Features de {pair}: {e}")
+
+        # Fase 2: un trabajo por (par, timeframe, agente), sin superar max_hours
+        jobs = [
+            (pair, tf, name) for pair in pairs for tf in timeframes for name in agents
+            if state.data["features"].get(job_id(pair, tf))
+            and job_id(pair, tf, name) not in state.data["fitted"]
+        ]
+        summary["skipped"] = sum(
+            1 for pair in pairs for tf in timeframes if not state.data["features"].get(job_id(pair, tf))
+        ) * len(agents)
+        running, batch = {}, []
+        while jobs or running:
+            while jobs and len(running) < workers * 2 and not out_of_time():
+                pair, tf, name = jobs.pop(0)
+                running[pool.submit(fit_agent, pair, tf, name, work_dir, threads)] = job_id(pair, tf, name)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    summary["failed"][key] = repr(e)
+                    print(f"❌ {key}: {e}")
+                    continue
+                if result is None:
+                    continue
+                state.data["fitted"][key] = result
+                state.save()
+                summary["fitted"] += 1
+                batch.append(key)
+                print(f"✅ {key} ({result['performance']['accuracy']:.1%} acierto direccional)")
+            if len(batch) >= publish_every:
+                summary["published"] += publish(state, work_dir, models_dir, batch, publisher)
+                batch = []
+        if batch:
+            summary["published"] += publish(state, work_dir, models_dir, batch, publisher)
+        if jobs:
+            print(f"⏰ Tiempo agotado: quedan {len(jobs)} trabajos para la próxima ejecución")
+    summary["remaining"] = len(jobs)
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+
+def _as_done(futures):
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        yield from done
+
+
+def _csv(value, default):
+    return [item.strip() for item in value.split(",") if item.strip()] if value else list(default)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py train", description="Entrena los modelos de los agentes")
+    parser.add_argument("--pairs", help="pares separados por comas (todos por defecto)")
+    parser.add_argument("--timeframes", help="timeframes separados por comas (todos por defecto)")
+    parser.add_argument("--agents", help="agentes separados por comas (todos por defecto)")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--workers", type=int, help="procesos (por defecto CPUs / threads)")
+    parser.add_argument("--threads", type=int, default=1, help="hilos por trabajo (XGBoost, LightGBM, BLAS)")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR)
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--publish-every", type=int, default=20, help="modelos por lote publicado")
+    parser.add_argument("--max-hours", type=float, help="no lanzar trabajos nuevos pasado este tiempo")
+    parser.add_argument("--cache-dir", help="caché de velas (por defecto la de la aplicación)")
+    parser.add_argument("--fake", action="store_true", help="datos sintéticos de FakeREST, sin red")
+    parser.add_argument("--restart", action="store_true", help="ignorar el progreso guardado")
+    args = parser.parse_args(argv)
+
+    summary = train(
+        _csv(args.pairs, FOREX_PAIRS), _csv(args.timeframes, TIMEFRAMES), _csv(args.agents, AGENTS),
+        days=args.days, workers=args.workers, threads=args.threads, work_dir=args.work_dir,
+        models_dir=args.models_dir, publish_every=args.publish_every, fake=args.fake,
+        cache_dir=args.cache_dir, max_hours=args.max_hours, restart=args.restart
+    )
+    print(json.dumps(summary, indent=2))
+    return 0 if not summary["failed"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,423 @@
+# modules/tree_ensemble.py
+# Ensembles de árboles ya entrenados (RandomForestRegressor y
+# GradientBoostingRegressor de scikit-learn, XGBRegressor, LGBMRegressor)
+# aplanados en arrays empaquetados: característica, umbral, hijos y valor de
+# cada nodo de todos los árboles. TreeEnsemble.predict los evalúa solo con
+# NumPy, una o muchas filas a la vez y todos los árboles en paralelo (un paso
+# por nivel de profundidad), sin importar la librería que los entrenó.
+#
+# BaseAgent.save guarda en el registro la versión compilada del modelo y del
+# escalador (SOYTUGUIA_COMPILE_MODELS=0 guarda los originales). Los modelos
+# ya publicados se convierten con:
+#
+#   python main.py compile --models-dir models
+import argparse
+import json
+import os
+
+import numpy as np
+
+# "0" guarda en el registro los estimadores de la librería tal cual
+COMPILE_MODELS = os.environ.get("SOYTUGUIA_COMPILE_MODELS", "1") != "0"
+
+
+class TreeEnsemble:
+    """Ensemble de árboles de regresión en arrays planos
+
+    Los nodos de todos los árboles van seguidos; roots tiene el primero de
+    cada árbol. Un nodo interno va a la derecha si x[feature] > threshold, y
+    children[2 * nodo + derecha] es el siguiente. Las hojas apuntan a sí
+    mismas, así que depth pasos llevan cualquier fila a una hoja en todos los
+    árboles. Cada librería compara a su manera (scikit-learn y XGBoost en
+    float32, XGBoost con <); al compilar se ajustan dtype y umbrales para que
+    la comparación sea la misma que la del original. Un NaN sigue nan_left
+    (o es un ValueError, como en el original, si allow_nan es False).
+    predict = base + scale * suma de las hojas.
+    """
+    __slots__ = ("feature", "threshold", "children", "value", "nan_left", "roots", "depth",
+                 "base", "scale", "dtype", "allow_nan", "n_features_in_", "source")
+
+    def __init__(self, feature, threshold, children, value, nan_left, roots, depth,
+                 base=0.0, scale=1.0, dtype=np.float64, allow_nan=True, n_features_in_=None,
+                 source=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.nan_left = nan_left
+        self.roots = roots
+        self.depth = depth
+        self.base = base
+        self.scale = scale
+        self.dtype = np.dtype(dtype)
+        self.allow_nan = allow_nan
+        self.n_features_in_ = n_features_in_
+        self.source = source
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ("feature", "threshold", "children", "value",
+                                                           "nan_left", "roots"))
+
+    def _check(self, X):
+        X = np.asarray(X, dtype=self.dtype)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.n_features_in_ is not None and X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X tiene {X.shape[1]} columnas, el modelo espera {self.n_features_in_}")
+        return np.ascontiguousarray(X)
+
+    def apply(self, X):
+        """Hoja de cada fila en cada árbol (índices globales, forma filas × árboles)"""
+        X = self._check(X)
+        finite = np.isfinite(X)
+        if not finite.all() and (not self.allow_nan or np.isinf(X[~finite]).any()):
+            raise ValueError("X contiene NaN o valores infinitos")
+        flat = X.ravel()
+        offsets = (np.arange(len(X)) * X.shape[1])[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        feature, threshold, children = self.feature, self.threshold, self.children
+        if finite.all():
+            for _ in range(self.depth):
+                x = flat.take(offsets + feature.take(nodes))
+                nodes = children.take(2 * nodes + (x > threshold.take(nodes)))
+            return nodes
+        nan_right = ~self.nan_left
+        for _ in range(self.depth):
+            x = flat.take(offsets + feature.take(nodes))
+            right = np.where(np.isnan(x), nan_right.take(nodes), x > threshold.take(nodes))
+            nodes = children.take(2 * nodes + right)
+        return nodes
+
+    def predict(self, X):
+        return self.base + self.scale * self.value.take(self.apply(X)).sum(axis=1)
+
+    def __repr__(self):
+        return (f"TreeEnsemble(source={self.source!r}, trees={self.n_estimators}, "
+                f"nodes={len(self.feature)}, depth={self.depth})")
+
+
+class Standardizer:
+    """StandardScaler ajustado, sin scikit-learn: (X - mean) / scale"""
+    __slots__ = ("mean", "scale", "n_features_in_")
+
+    def __init__(self, mean, scale, n_features_in_=None):
+        self.mean = mean
+        self.scale = scale
+        self.n_features_in_ = n_features_in_
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def transform(self, X):
+        # Mismas operaciones y en el mismo orden que StandardScaler.transform
+        X = np.array(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.n_features_in_ is not None and X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X tiene {X.shape[1]} columnas, el escalador espera {self.n_features_in_}")
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+    def __repr__(self):
+        return f"Standardizer(features={self.n_features_in_})"
+
+
+# --- Exportación --------------------------------------------------------------
+
+def _float32_at_most(threshold):
+    """Mayor float32 <= threshold (float64): para x en float32,
+    x <= threshold equivale a x <= _float32_at_most(threshold)"""
+    threshold = np.asarray(threshold, dtype=np.float64)
+    rounded = threshold.astype(np.float32)
+    up = rounded.astype(np.float64) > threshold
+    rounded[up] = np.nextafter(rounded[up], np.float32(-np.inf))
+    return rounded
+
+
+def _depth(left, right):
+    """Profundidad máxima de un árbol (nodo 0 raíz, -1 = sin hijo)"""
+    depth, stack = 0, [(0, 0)]
+    while stack:
+        node, level = stack.pop()
+        if left[node] < 0:
+            depth = max(depth, level)
+        else:
+            stack.append((left[node], level + 1))
+            stack.append((right[node], level + 1))
+    return depth
+
+
+def _pack(trees, dtype, **kwargs):
+    """TreeEnsemble a partir de árboles sueltos
+
+    trees: (feature, threshold, left, right, value, nan_left) por árbol, con
+    índices locales y left = right = -1 en las hojas; threshold ya en dtype y
+    con la semántica 'derecha si x > threshold'.
+    """
+    features, thresholds, children, values, nan_lefts, roots = [], [], [], [], [], []
+    depth, offset = 0, 0
+    for feature, threshold, left, right, value, nan_left in trees:
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        n = len(left)
+        leaf = left < 0
+        local = np.arange(n)
+        pair = np.empty((n, 2), dtype=np.int64)
+        pair[:, 0] = np.where(leaf, local, left)
+        pair[:, 1] = np.where(leaf, local, right)
+        features.append(np.where(leaf, 0, feature))
+        thresholds.append(np.where(leaf, 0, threshold).astype(dtype))
+        children.append((pair + offset).ravel())
+        values.append(np.where(leaf, value, 0.0))
+        nan_lefts.append(np.asarray(nan_left, dtype=bool) | leaf)
+        roots.append(offset)
+        depth = max(depth, _depth(left, right))
+        offset += n
+    if not roots:
+        raise ValueError("el ensemble no tiene árboles")
+    index = np.int32 if 2 * offset < np.iinfo(np.int32).max else np.int64
+    return TreeEnsemble(
+        feature=np.concatenate(features).astype(index),
+        threshold=np.concatenate(thresholds).astype(dtype),
+        children=np.concatenate(children).astype(index),
+        value=np.concatenate(values).astype(np.float64),
+        nan_left=np.concatenate(nan_lefts),
+        roots=np.asarray(roots, dtype=index),
+        depth=depth, dtype=dtype, **kwargs
+    )
+
+
+def _sklearn_tree(tree):
+    if tree.n_outputs != 1:
+        raise ValueError("solo árboles de una salida")
+    left, right = tree.children_left, tree.children_right
+    # scikit-learn pasa X a float32 y va a la izquierda si x <= umbral (float64)
+    threshold = _float32_at_most(tree.threshold)
+    missing = getattr(tree, "missing_go_to_left", None)
+    nan_left = np.ones(len(left), dtype=bool) if missing is None else missing.astype(bool)
+    return tree.feature, threshold, left, right, tree.value[:, 0, 0], nan_left
+
+
+def _from_random_forest(model):
+    trees = [_sklearn_tree(estimator.tree_) for estimator in model.estimators_]
+    return _pack(trees, np.float32, scale=1.0 / len(trees), n_features_in_=model.n_features_in_,
+                 source=type(model).__name__)
+
+
+def _from_gradient_boosting(model):
+    from sklearn.dummy import DummyRegressor
+    if model.estimators_.shape[1] != 1:
+        raise ValueError("solo GradientBoosting de regresión")
+    init = model.init_
+    if isinstance(init, str) and init == "zero":
+        base = 0.0
+    elif isinstance(init, DummyRegressor):
+        base = float(np.ravel(init.constant_)[0])
+    else:
+        raise ValueError(f"init no constante: {type(init).__name__}")
+    trees = [_sklearn_tree(estimator.tree_) for estimator in model.estimators_[:, 0]]
+    # GradientBoostingRegressor no admite NaN al predecir
+    return _pack(trees, np.float32, base=base, scale=float(model.learning_rate), allow_nan=False,
+                 n_features_in_=model.n_features_in_, source=type(model).__name__)
+
+
+# Objetivos de XGBoost cuya predicción es el margen sin transformar
+_XGB_IDENTITY = ("reg:squarederror", "reg:absoluteerror", "reg:pseudohubererror", "reg:quantileerror")
+
+
+def _from_xgboost(model):
+    booster = model.get_booster()
+    learner = json.loads(bytes(booster.save_raw(raw_format="json")))["learner"]
+    objective = learner["objective"]["name"]
+    if objective not in _XGB_IDENTITY:
+        raise ValueError(f"objetivo de XGBoost no soportado: {objective}")
+    gbm = learner["gradient_booster"]
+    if gbm["name"] != "gbtree":
+        raise ValueError(f"booster de XGBoost no soportado: {gbm['name']}")
+    # base_score es "5E-1" o, en versiones recientes, "[5E-1]"
+    base = float(str(learner["learner_model_param"]["base_score"]).strip("[]").split(",")[0])
+    trees = []
+    for tree in gbm["model"]["trees"]:
+        left = np.asarray(tree["left_children"])
+        # XGBoost va a la izquierda si x < umbral (los dos en float32)
+        split = np.asarray(tree["split_conditions"], dtype=np.float32)
+        threshold = np.nextafter(split, np.float32(-np.inf))
+        trees.append((tree["split_indices"], threshold, left, tree["right_children"],
+                      split.astype(np.float64), np.asarray(tree["default_left"], dtype=bool)))
+    return _pack(trees, np.float32, base=base, n_features_in_=int(learner["learner_model_param"]["num_feature"]),
+                 source=type(model).__name__)
+
+
+def _lightgbm_tree(structure):
+    feature, threshold, left, right, value, nan_left = [], [], [], [], [], []
+    stack = [(structure, None, None)]
+    while stack:
+        node, parent, side = stack.pop()
+        index = len(left)
+        if parent is not None:
+            (left if side == 0 else right)[parent] = index
+        feature.append(0)
+        threshold.append(0.0)
+        left.append(-1)
+        right.append(-1)
+        nan_left.append(True)
+        if "leaf_value" in node:
+            value.append(node["leaf_value"])
+            continue
+        value.append(0.0)
+        if node.get("decision_type", "<=") != "<=":
+            raise ValueError(f"división de LightGBM no soportada: {node.get('decision_type')}")
+        missing = node.get("missing_type", "None")
+        if missing == "Zero":
+            raise ValueError("LightGBM con zero_as_missing no soportado")
+        feature[index] = node["split_feature"]
+        threshold[index] = node["threshold"]
+        # Con missing_type None, LightGBM trata el NaN como 0
+        nan_left[index] = node["default_left"] if missing == "NaN" else 0.0 <= node["threshold"]
+        stack.append((node["right_child"], index, 1))
+        stack.append((node["left_child"], index, 0))
+    return feature, threshold, left, right, value, nan_left
+
+
+def _from_lightgbm(model):
+    dump = model.booster_.dump_model()
+    if dump.get("num_tree_per_iteration", 1) != 1:
+        raise ValueError("solo LightGBM de regresión")
+    if model.get_params().get("linear_tree"):
+        raise ValueError("LightGBM con linear_tree no soportado")
+    info = dump["tree_info"]
+    best = getattr(model, "best_iteration_", None)
+    if best:
+        info = info[:best]
+    trees = [_lightgbm_tree(tree["tree_structure"]) for tree in info]
+    # LightGBM compara en float64: x <= umbral
+    return _pack(trees, np.float64, scale=1.0 / len(trees) if dump.get("average_output") else 1.0,
+                 n_features_in_=dump["max_feature_idx"] + 1, source=type(model).__name__)
+
+
+_EXPORTERS = {
+    ("sklearn", "RandomForestRegressor"): _from_random_forest,
+    ("sklearn", "ExtraTreesRegressor"): _from_random_forest,
+    ("sklearn", "GradientBoostingRegressor"): _from_gradient_boosting,
+    ("xgboost", "XGBRegressor"): _from_xgboost,
+    ("lightgbm", "LGBMRegressor"): _from_lightgbm,
+}
+
+
+def compile_model(model):
+    """TreeEnsemble equivalente a un ensemble ajustado (ValueError si no se puede)"""
+    if isinstance(model, TreeEnsemble):
+        return model
+    kind = type(model)
+    exporter = _EXPORTERS.get((kind.__module__.split(".")[0], kind.__name__))
+    if exporter is None:
+        raise ValueError(f"modelo no compilable: {kind.__name__}")
+    try:
+        return exporter(model)
+    except AttributeError as e:
+        raise ValueError(f"{kind.__name__} sin ajustar") from e
+
+
+def compile_scaler(scaler):
+    """Standardizer equivalente a un StandardScaler ajustado (ValueError si no se puede)"""
+    if isinstance(scaler, Standardizer):
+        return scaler
+    if type(scaler).__name__ != "StandardScaler" or not hasattr(scaler, "n_features_in_"):
+        raise ValueError(f"escalador no compilable: {type(scaler).__name__}")
+    return Standardizer(scaler.mean_, scaler.scale_, scaler.n_features_in_)
+
+
+def _compiled(model, scaler):
+    try:
+        model = compile_model(model)
+    except ValueError:
+        pass
+    try:
+        scaler = compile_scaler(scaler)
+    except ValueError:
+        pass
+    return model, scaler
+
+
+def for_serving(model, scaler):
+    """(modelo, escalador) a guardar para servir: compilados cuando se puede
+    (y COMPILE_MODELS), los originales si no"""
+    return _compiled(model, scaler) if COMPILE_MODELS else (model, scaler)
+
+
+def compile_registry(root):
+    """Reescribe los modelos de root (el bundle y los .joblib sueltos) con sus
+    versiones compiladas
+
+    Devuelve {"compiled": n, "skipped": n}; los que no se pueden compilar se
+    dejan como estaban.
+    """
+    import joblib
+    from . import bundle
+    from .registry import ModelRegistry
+    registry = ModelRegistry(root=root, max_bytes=0, mmap_mode=None)
+    summary = {"compiled": 0, "skipped": 0}
+
+    def compiled(entry):
+        model, scaler = _compiled(entry.get("model"), entry.get("scaler"))
+        if model is entry.get("model") and scaler is entry.get("scaler"):
+            summary["skipped"] += 1
+            return None
+        summary["compiled"] += 1
+        return {**entry, "model": model, "scaler": scaler}
+
+    if os.path.exists(registry.bundle_path):
+        current, changes = bundle.ModelBundle(registry.bundle_path, copy=True), {}
+        for key in current.keys():
+            pair, timeframe, name = key.split(":")
+            entry = compiled(current.get(pair, timeframe, name))
+            if entry is not None:
+                changes[(pair, timeframe, name)] = entry
+        if changes:
+            bundle.update(registry.bundle_path, changes)
+    for pair in sorted(os.listdir(root)) if os.path.isdir(root) else ():
+        directory = os.path.join(root, pair)
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".joblib"):
+                continue
+            name, _, timeframe = filename[:-len(".joblib")].rpartition("_")
+            entry = compiled(joblib.load(os.path.join(directory, filename)))
+            if entry is not None:
+                registry.put(pair, timeframe, name, entry)
+    return summary
+
+
+def main(argv=None):
+    from .registry import MODELS_DIR
+    parser = argparse.ArgumentParser(prog="main.py compile",
+                                     description="Compila a arrays NumPy los modelos del registro")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    args = parser.parse_args(argv)
+    summary = compile_registry(args.models_dir)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())